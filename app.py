@@ -1,14 +1,22 @@
-from flask import Flask
+from flask import Flask, jsonify
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager
+from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
 from flask_mail import Mail
 from routes.auth import auth_bp
 from routes.exam import exam_bp
 from routes.proctoring import proctoring_bp
 from routes.queries import queries_bp
+from services.job_queue import start_workers
+from services.mail_outbox import start_dispatcher, outbox_stats
 from config import Config
+from db import pool_stats
+from indexes import ensure_indexes
+from services.exam_cache import exam_cache
+from services.frame_ingest import ingest_stats
+from services.model_registry import loaded_models, warm_up
 import logging
 import os
+import threading
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -18,7 +26,7 @@ app = Flask(__name__)
 
 # Configure CORS
 allowed_origins = os.getenv('ALLOWED_ORIGINS', 'http://localhost:4200,https://online-exam-system-nine.vercel.app').split(',')
-CORS(app, resources={r"/api/*": {"origins": allowed_origins}}, supports_credentials=True)
+CORS(app, resources={r"/api/*": {"origins": allowed_origins}}, supports_credentials=True, expose_headers=['X-Next-Cursor'])
 
 # Load configuration
 app.config.from_object(Config)
@@ -32,7 +40,44 @@ app.register_blueprint(exam_bp, url_prefix='/api')
 app.register_blueprint(proctoring_bp, url_prefix='/api')
 app.register_blueprint(queries_bp, url_prefix='/api')
 
+_background_pid = None
+_background_lock = threading.Lock()
+
+def start_background(app):
+    # Run once by each serving process, never on import: spawned pool processes
+    # re-import this module and must not start job workers or a mail dispatcher
+    # of their own. __main__ below and gunicorn.conf.py call it at startup; under
+    # any other server the process's first request does.
+    global _background_pid
+    with _background_lock:
+        if _background_pid == os.getpid():
+            return
+        _background_pid = os.getpid()
+    if Config.MONGO_ENSURE_INDEXES:
+        ensure_indexes()
+    start_workers(app)
+    start_dispatcher(app)
+    # ML models load on first use; MODEL_WARMUP builds the listed ones now instead
+    if Config.MODEL_WARMUP:
+        warm_up(Config.MODEL_WARMUP)
+
+@app.before_request
+def start_background_on_first_request():
+    if _background_pid != os.getpid():
+        start_background(app)
+
+@app.route('/api/stats', methods=['GET'])
+@jwt_required()
+def stats():
+    current_user = get_jwt_identity()
+    if current_user.get('role') == 'student':
+        return jsonify({'message': 'Unauthorized'}), 403
+    return jsonify({'mongo': pool_stats(), 'exam_cache': exam_cache.stats(), 'mail_outbox': outbox_stats(), 'models': loaded_models(), 'frame_ingest': ingest_stats()})
+
 logger.info("Flask application started")
 
 if __name__ == '__main__':
+    # With the reloader only the child process serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background(app)
     app.run(debug=True, port=5000)
\ No newline at end of file
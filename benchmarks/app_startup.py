@@ -0,0 +1,69 @@
+"""Measure how long a worker takes to import the app, and its peak RSS.
+
+Each scenario runs in a fresh interpreter, the way a gunicorn worker starts:
+  lazy     the default; the ML stack is not loaded
+  warm-up  MODEL_WARMUP builds every registered model at startup
+  eager    TensorFlow and OpenCV are imported before the app, which is what
+           every worker paid when they were module-level imports
+
+Index creation is skipped, so no MongoDB server is needed.
+
+    python benchmarks/app_startup.py [runs]
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, resource, sys, time
+started = time.perf_counter()
+for name in {preload!r}:
+    try:
+        __import__(name)
+    except ImportError:
+        pass
+import app
+app.start_background(app.app)
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    'seconds': elapsed,
+    'rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'tensorflow': 'tensorflow' in sys.modules,
+    'cv2': 'cv2' in sys.modules,
+    'models': app.loaded_models()
+}}))
+"""
+
+SCENARIOS = [
+    ('lazy', [], ''),
+    ('warm-up', [], 'malpractice,face_cascade'),
+    ('eager', ['cv2', 'tensorflow'], '')
+]
+
+
+def start(preload, warmup):
+    env = dict(os.environ, MONGO_ENSURE_INDEXES='False', MODEL_WARMUP=warmup, JOB_WORKERS='0')
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD.format(preload=preload)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print(f"{'scenario':>9} {'seconds':>8} {'peak RSS MiB':>13}  loaded")
+    for name, preload, warmup in SCENARIOS:
+        results = [start(preload, warmup) for _ in range(runs)]
+        seconds = sorted(result['seconds'] for result in results)[len(results) // 2]
+        rss = max(result['rss_mib'] for result in results)
+        last = results[-1]
+        loaded = [module for module in ('tensorflow', 'cv2') if last[module]] + last['models']
+        print(f"{name:>9} {seconds:>8.2f} {rss:>13.1f}  {', '.join(loaded) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
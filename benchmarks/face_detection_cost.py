@@ -0,0 +1,101 @@
+"""Compare the per-frame cost of the 'full' and 'fast' face detection modes.
+
+Runs without MongoDB or a webcam. Frames come from a recorded video when one
+is given (a proctoring recording works), otherwise from synthetic noise, which
+has no face in it and so measures the fast mode's worst case: a full search
+every frame.
+
+Besides the timings it replays the no-face events each mode would log. Fast
+mode decides "no face" with the same full search, and only a full-search hit
+ends an event, but a window hit between full searches is taken on trust: when
+the window finds something the full search would not (the face just left and
+a hand or a poster is in the window), the event starts up to
+FACE_FULL_DETECTION_INTERVAL - 1 frames late. The report shows how often and
+by how much. Only a video with real faces in it, coming and going, says
+anything about that; synthetic frames agree trivially.
+
+    python benchmarks/face_detection_cost.py [--video PATH] [--cascade PATH] [--frames N]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+
+from services.face_tracker import FaceTracker, load_face_cascade
+
+
+def load_frames(video, count):
+    if not video:
+        rng = np.random.default_rng(0)
+        return [rng.integers(0, 256, (480, 640), dtype=np.uint8) for _ in range(count)]
+    cap = cv2.VideoCapture(video)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    cap.release()
+    return frames
+
+
+def no_face_events(present):
+    # Frame indexes where a 'No face detected' event would start
+    return [i for i, face in enumerate(present) if not face and (i == 0 or present[i - 1])]
+
+
+def run(tracker, frames):
+    present = []
+    started = time.perf_counter()
+    for gray in frames:
+        present.append(len(tracker.detect(gray)) > 0)
+    return present, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--video')
+    parser.add_argument('--cascade')
+    parser.add_argument('--frames', type=int, default=300)
+    args = parser.parse_args()
+
+    cascade = load_face_cascade(args.cascade)
+    if cascade is None:
+        sys.exit('Face cascade not found; pass --cascade PATH to haarcascade_frontalface_default.xml')
+    frames = load_frames(args.video, args.frames)
+    if not frames:
+        sys.exit(f'No frames read from {args.video}')
+    height, width = frames[0].shape
+
+    print(f"{'mode':>6} {'ms/frame':>9} {'full':>6} {'roi':>6} {'face frames':>12} {'no-face events':>15}")
+    results = {}
+    for mode in ('full', 'fast'):
+        tracker = FaceTracker(cascade, (width, height), mode=mode)
+        present, elapsed = run(tracker, frames)
+        results[mode] = present
+        print(f'{mode:>6} {1000 * elapsed / len(frames):>9.2f} {tracker.full_detections:>6} '
+              f'{tracker.roi_detections:>6} {sum(present):>12} {len(no_face_events(present)):>15}')
+
+    disagreements = sum(a != b for a, b in zip(results['full'], results['fast']))
+    full_events = no_face_events(results['full'])
+    fast_events = no_face_events(results['fast'])
+    print(f'{len(frames)} frames, {disagreements} with a different result, '
+          f'no-face events identical: {full_events == fast_events}')
+    # Pairs each of full mode's events with fast mode's next one, which can only be later
+    delays = [min((fast - full for fast in fast_events if fast >= full), default=None) for full in full_events]
+    late = [delay for delay in delays if delay]
+    if late:
+        print(f'{len(late)} of {len(full_events)} no-face events started late in fast mode, '
+              f'by up to {max(late)} frames')
+    if not args.video:
+        print('Synthetic frames contain no faces; pass --video with webcam footage to check parity')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Load generator for the frame ingestion API.
+
+Simulates many students at once. Each session is a thread that posts batches of
+JPEG frames to /api/proctoring-frames/<exam_id> at the given frame rate. The
+frames are replayed from a recorded video, or from synthetic frames when no
+video is given. Tokens are minted with the app's JWT settings (pass
+--jwt-secret if the server uses a different one).
+
+--seed marks an in-progress submission for every simulated student, so the
+server accepts their frames; it needs the same MongoDB as the server.
+
+    python benchmarks/frame_ingest_load.py --exam-id ID [--sessions 200] [--fps 5]
+        [--batch 10] [--duration 60] [--video PATH] [--url http://localhost:5000/api] [--seed]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+
+from config import Config
+
+
+def load_jpegs(video, count=100):
+    frames = []
+    if video:
+        cap = cv2.VideoCapture(video)
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    if not frames:
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 256, (480, 640, 3), dtype=np.uint8) for _ in range(count)]
+    return [cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 70])[1].tobytes() for frame in frames]
+
+
+def mint_tokens(student_ids, secret):
+    from flask import Flask
+    from flask_jwt_extended import JWTManager, create_access_token
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if secret:
+        app.config['JWT_SECRET_KEY'] = secret
+    JWTManager(app)
+    with app.app_context():
+        return [create_access_token(identity={'email': f'{student_id}@load.test', 'role': 'student',
+                                              'student_id': student_id}) for student_id in student_ids]
+
+
+def seed_submissions(exam_id, student_ids):
+    from pymongo import UpdateOne
+    from db import get_collection
+
+    get_collection('submissions').bulk_write([
+        UpdateOne(
+            {'exam_id': exam_id, 'user_email': f'{student_id}@load.test'},
+            {'$set': {'student_id': student_id, 'status': 'in_progress'}},
+            upsert=True
+        )
+        for student_id in student_ids
+    ])
+
+
+def multipart(jpegs, timestamps):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for i, jpeg in enumerate(jpegs):
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="frames"; filename="{i}.jpg"\r\n'
+                     f'Content-Type: image/jpeg\r\n\r\n'.encode() + jpeg + b'\r\n')
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="timestamps"\r\n\r\n'
+                 f'{json.dumps(timestamps)}\r\n--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class Totals:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.posts = 0
+        self.errors = 0
+        self.frames = 0
+        self.latencies = []
+        self.last_stats = {}
+
+
+def run_session(args, token, jpegs, offset, totals, deadline):
+    url = f'{args.url}/proctoring-frames/{args.exam_id}'
+    interval = args.batch / args.fps
+    position = offset
+    next_post = time.monotonic()
+    while time.monotonic() < deadline:
+        batch = [jpegs[(position + i) % len(jpegs)] for i in range(args.batch)]
+        position += args.batch
+        now_ms = time.time() * 1000
+        body, content_type = multipart(batch, [now_ms - 1000 * (args.batch - 1 - i) / args.fps for i in range(args.batch)])
+        request = urllib.request.Request(url, data=body, method='POST', headers={
+            'Authorization': f'Bearer {token}', 'Content-Type': content_type
+        })
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                stats = json.loads(response.read())
+            error = False
+        except (urllib.error.URLError, OSError, ValueError):
+            stats, error = None, True
+        latency = time.perf_counter() - started
+        with totals.lock:
+            totals.posts += 1
+            totals.errors += error
+            totals.frames += args.batch
+            totals.latencies.append(latency)
+            if stats:
+                totals.last_stats[token] = stats
+        next_post += interval
+        time.sleep(max(0.0, next_post - time.monotonic()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5000/api')
+    parser.add_argument('--exam-id', required=True)
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--fps', type=float, default=5.0)
+    parser.add_argument('--batch', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=60.0)
+    parser.add_argument('--video')
+    parser.add_argument('--jwt-secret')
+    parser.add_argument('--seed', action='store_true')
+    args = parser.parse_args()
+
+    student_ids = [f'load-{i:05d}' for i in range(args.sessions)]
+    if args.seed:
+        seed_submissions(args.exam_id, student_ids)
+    tokens = mint_tokens(student_ids, args.jwt_secret)
+    jpegs = load_jpegs(args.video)
+    print(f'{args.sessions} sessions x {args.fps} fps in batches of {args.batch}, '
+          f'{len(jpegs)} distinct frames of ~{sum(map(len, jpegs)) // len(jpegs) // 1024} KiB')
+
+    totals = Totals()
+    deadline = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(target=run_session, args=(args, token, jpegs, i * 7, totals, deadline), daemon=True)
+        for i, token in enumerate(tokens)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(totals.latencies) or [0.0]
+    server = {}
+    for stats in totals.last_stats.values():
+        for name, value in stats.items():
+            server[name] = server.get(name, 0) + value
+    print(f'{totals.posts} posts ({totals.posts / elapsed:.1f}/s), {totals.errors} errors, '
+          f'{totals.frames / elapsed:.0f} frames/s sent')
+    print(f'latency p50 {1000 * latencies[len(latencies) // 2]:.1f} ms, '
+          f'p95 {1000 * latencies[int(len(latencies) * 0.95)]:.1f} ms, max {1000 * latencies[-1]:.1f} ms')
+    print(f"server: {server.get('analyzed', 0)} analysed, {server.get('dropped', 0)} dropped, "
+          f"{server.get('failed', 0)} failed of {server.get('received', 0)} received "
+          f"(as of each session's last response)")
+
+
+if __name__ == '__main__':
+    main()
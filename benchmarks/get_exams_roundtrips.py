@@ -0,0 +1,116 @@
+"""Count MongoDB round-trips and latency of GET /api/get-exams for a student.
+
+Needs a reachable MongoDB (MONGO_URI). Data is written to a scratch database
+(MONGO_DB_NAME, default online_exam_bench) which is dropped afterwards.
+
+    python benchmarks/get_exams_roundtrips.py [exam counts...]
+"""
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault('MONGO_DB_NAME', 'online_exam_bench')
+os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret-key-benchmark-secret-key')
+os.environ.setdefault('MONGO_ENSURE_INDEXES', 'True')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import monitoring
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self, collections):
+        self.collections = collections
+        self.reset()
+
+    def reset(self):
+        self.queries = 0
+        self.get_mores = 0
+
+    def started(self, event):
+        if event.command_name in ('find', 'aggregate') and event.command.get(event.command_name) in self.collections:
+            self.queries += 1
+        elif event.command_name == 'getMore' and event.command.get('collection') in self.collections:
+            self.get_mores += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+counter = CommandCounter({'exams', 'submissions'})
+monitoring.register(counter)
+
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from app import app
+from db import get_client, get_db
+from config import Config
+
+STUDENT = 'bench.student@example.com'
+
+
+def seed(exam_count):
+    db = get_db()
+    db.exams.delete_many({})
+    db.submissions.delete_many({})
+    now = datetime.utcnow()
+    exams = [{
+        'title': f'Exam {i}',
+        'duration': 60,
+        'questions': [{'question': f'Q{q}', 'options': ['a', 'b', 'c', 'd'], 'correct_option': 1,
+                       'difficulty': 'easy', 'type': 'mcq'} for q in range(20)],
+        'scheduled_for': now - timedelta(days=1, minutes=i),
+        'randomized': False,
+        'difficulty': 'easy',
+        'created_at': now,
+        'created_by': 'bench.teacher@example.com',
+        'status': 'scheduled'
+    } for i in range(exam_count)]
+    exam_ids = db.exams.insert_many(exams).inserted_ids
+    submissions = [{
+        'exam_id': str(exam_id),
+        'user_email': STUDENT,
+        'student_id': STUDENT,
+        'answers': [],
+        'score': 0,
+        'start_time': now,
+        'status': 'completed'
+    } for exam_id in exam_ids[::2]]
+    if submissions:
+        db.submissions.insert_many(submissions)
+
+
+def run(exam_count, repeats=5):
+    seed(exam_count)
+    with app.app_context():
+        token = create_access_token(identity={'email': STUDENT, 'role': 'student', 'student_id': STUDENT})
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    timings = []
+    for _ in range(repeats):
+        counter.reset()
+        started = time.perf_counter()
+        response = client.get('/api/get-exams', headers=headers)
+        timings.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.status_code
+    return counter.queries, counter.get_mores, statistics.median(timings)
+
+
+def main():
+    if not Config.MONGO_DB_NAME.endswith('_bench'):
+        sys.exit(f'Refusing to run against {Config.MONGO_DB_NAME}: MONGO_DB_NAME must end with _bench')
+    counts = [int(arg) for arg in sys.argv[1:]] or [10, 100, 1000]
+    print(f"{'exams':>8} {'queries':>8} {'getMores':>9} {'median ms':>10}")
+    try:
+        for exam_count in counts:
+            queries, get_mores, median = run(exam_count)
+            print(f'{exam_count:>8} {queries:>8} {get_mores:>9} {median * 1000:>10.1f}')
+    finally:
+        get_client().drop_database(Config.MONGO_DB_NAME)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Measure password-check throughput of the bcrypt process pool.
+
+Runs without MongoDB: each simulated login is one check_password call against
+a hash made with BCRYPT_ROUNDS. Concurrent requests are simulated with threads.
+
+    python benchmarks/login_throughput.py [--logins N] [--concurrency C] [worker counts...]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+from config import Config
+from services import password_hashing
+from services.password_hashing import PasswordHasherBusy, check_password
+
+
+def run(workers, logins, concurrency, hashed):
+    Config.BCRYPT_WORKERS = workers
+    Config.BCRYPT_MAX_PENDING = concurrency
+    password_hashing.shutdown()
+    check_password('warm-up', hashed)
+
+    rejected = 0
+
+    def login(_):
+        nonlocal rejected
+        try:
+            return check_password('benchmark-password', hashed)
+        except PasswordHasherBusy:
+            rejected += 1
+            return False
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        accepted = sum(clients.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    return accepted, rejected, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('workers', nargs='*', type=int)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=64)
+    args = parser.parse_args()
+
+    worker_counts = args.workers or sorted({1, 2, 4, os.cpu_count() or 1})
+    hashed = bcrypt.hashpw(b'benchmark-password', bcrypt.gensalt(Config.BCRYPT_ROUNDS))
+    print(f'bcrypt rounds {Config.BCRYPT_ROUNDS}, {args.logins} logins, {args.concurrency} concurrent clients')
+    print(f"{'workers':>8} {'logins/s':>10} {'ms/login':>10} {'rejected':>9}")
+    for workers in worker_counts:
+        accepted, rejected, elapsed = run(workers, args.logins, args.concurrency, hashed)
+        print(f'{workers:>8} {accepted / elapsed:>10.1f} {elapsed / args.logins * 1000:>10.2f} {rejected:>9}')
+    password_hashing.shutdown()
+
+
+if __name__ == '__main__':
+    main()
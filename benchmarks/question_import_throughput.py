@@ -0,0 +1,60 @@
+"""Measure throughput and peak memory of the CSV question importer.
+
+Runs without MongoDB. Each run generates a question bank CSV of the given size
+in a temporary file and imports it the way an upload is read.
+
+    python benchmarks/question_import_throughput.py [row counts...]
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.question_import import import_csv_questions, iter_csv_questions
+
+
+def write_bank(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['question', 'type', 'option1', 'option2', 'option3', 'option4', 'correct_option', 'difficulty'])
+        for i in range(rows):
+            if i % 5 == 4:
+                writer.writerow([f'Explain, in your own words, concept {i}.', 'subjective', '', '', '', '', '', 'hard'])
+            else:
+                writer.writerow([f'What is {i} + {i}?', 'mcq', i, 2 * i, 3 * i, 4 * i, 1, 'easy'])
+
+
+def measure(path, parse):
+    tracemalloc.start()
+    started = time.perf_counter()
+    with open(path, 'rb') as f:
+        count = parse(f)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def main():
+    row_counts = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 50000]
+    print(f"{'rows':>8} {'mode':>8} {'rows/s':>10} {'peak MiB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in row_counts:
+            path = os.path.join(tmp, f'bank_{rows}.csv')
+            write_bank(path, rows)
+            # 'validate' only streams the rows; 'import' also keeps the parsed questions
+            for mode, parse in (
+                ('validate', lambda f: sum(1 for _ in iter_csv_questions(f, []))),
+                ('import', lambda f: len(import_csv_questions(f)))
+            ):
+                count, elapsed, peak = measure(path, parse)
+                assert count == rows, f'{mode} returned {count} of {rows} rows'
+                print(f'{rows:>8} {mode:>8} {rows / elapsed:>10.0f} {peak / 2 ** 20:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
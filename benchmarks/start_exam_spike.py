@@ -0,0 +1,139 @@
+"""Reproduce a cohort pressing Start at the same moment.
+
+Needs a reachable MongoDB (MONGO_URI). Data is written to a scratch database
+(MONGO_DB_NAME, default online_exam_bench) which is dropped afterwards. Each
+student's POST /api/start-exam is fired from a thread pool against the app,
+once cold and once after /api/prewarm-exam, and every student starts twice
+(a double click) to check that no duplicate submissions appear.
+
+    python benchmarks/start_exam_spike.py [--students N] [--concurrency C]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('MONGO_DB_NAME', 'online_exam_bench')
+os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret-key-benchmark-secret-key')
+os.environ.setdefault('MONGO_ENSURE_INDEXES', 'True')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import monitoring
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self, collection):
+        self.collection = collection
+        self.commands = 0
+
+    def started(self, event):
+        if event.command.get(event.command_name) == self.collection:
+            self.commands += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+counter = CommandCounter('submissions')
+monitoring.register(counter)
+
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from app import app
+from db import get_client, get_db
+from config import Config
+
+TEACHER = 'bench.teacher@example.com'
+
+
+def seed(students):
+    db = get_db()
+    for name in ('exams', 'submissions', 'users'):
+        db[name].delete_many({})
+    db.users.insert_many([
+        {'email': f'student{i}@example.com', 'role': 'student', 'student_id': f'student{i}@example.com', 'name': f'Student {i}'}
+        for i in range(students)
+    ])
+    return str(db.exams.insert_one({
+        'title': 'Spike',
+        'duration': 60,
+        'question_ids': [],
+        'scheduled_for': datetime.utcnow() - timedelta(minutes=1),
+        'randomized': False,
+        'difficulty': 'easy',
+        'created_at': datetime.utcnow(),
+        'created_by': TEACHER,
+        'status': 'scheduled'
+    }).inserted_id)
+
+
+def spike(exam_id, tokens, concurrency):
+    client = app.test_client()
+
+    def start(token):
+        started = time.perf_counter()
+        response = client.post(f'/api/start-exam/{exam_id}', headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 200, response.status_code
+        return time.perf_counter() - started
+
+    # Every student presses Start twice
+    requests = tokens + tokens
+    counter.commands = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(start, requests))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(requests),
+        'per_second': len(requests) / elapsed,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'p99': latencies[int(len(latencies) * 0.99) - 1],
+        'commands': counter.commands / len(requests)
+    }
+
+
+def run(students, concurrency, prewarm):
+    exam_id = seed(students)
+    with app.app_context():
+        tokens = [create_access_token(identity={'email': f'student{i}@example.com', 'role': 'student',
+                                                 'student_id': f'student{i}@example.com'}) for i in range(students)]
+        teacher = create_access_token(identity={'email': TEACHER, 'role': 'teacher', 'student_id': None})
+    if prewarm:
+        response = app.test_client().post(f'/api/prewarm-exam/{exam_id}', headers={'Authorization': f'Bearer {teacher}'})
+        assert response.status_code == 200, response.status_code
+    result = spike(exam_id, tokens, concurrency)
+    duplicates = list(get_db().submissions.aggregate([
+        {'$group': {'_id': {'exam_id': '$exam_id', 'user_email': '$user_email'}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}}
+    ]))
+    result['duplicates'] = len(duplicates)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    args = parser.parse_args()
+    if not Config.MONGO_DB_NAME.endswith('_bench'):
+        sys.exit(f'Refusing to run against {Config.MONGO_DB_NAME}: MONGO_DB_NAME must end with _bench')
+
+    print(f'{args.students} students, {args.concurrency} concurrent requests')
+    print(f"{'mode':>9} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'cmds/req':>9} {'dupes':>6}")
+    try:
+        for mode, prewarm in (('cold', False), ('prewarmed', True)):
+            r = run(args.students, args.concurrency, prewarm)
+            print(f"{mode:>9} {r['requests']:>9} {r['per_second']:>8.0f} {r['p50'] * 1000:>8.1f} {r['p95'] * 1000:>8.1f} "
+                  f"{r['p99'] * 1000:>8.1f} {r['commands']:>9.2f} {r['duplicates']:>6}")
+    finally:
+        get_client().drop_database(Config.MONGO_DB_NAME)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,5 +12,78 @@ class Config:
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     MONGO_URI = os.getenv('MONGO_URI')
+    MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'online_exam')
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 20))
+    MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 10000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 20000))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 10000))
+    MONGO_ENSURE_INDEXES = os.getenv('MONGO_ENSURE_INDEXES', 'True') == 'True'
     GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
     GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
+    # Malpractice detection: 0 scores every frame, otherwise frames are sampled at this rate
+    MALPRACTICE_SAMPLE_FPS = float(os.getenv('MALPRACTICE_SAMPLE_FPS', 0))
+    MALPRACTICE_BATCH_SIZE = int(os.getenv('MALPRACTICE_BATCH_SIZE', 64))
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1.0))
+    LOG_FLUSH_SIZE = int(os.getenv('LOG_FLUSH_SIZE', 500))
+    LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', 5.0))
+    LOG_COALESCE_GAP = float(os.getenv('LOG_COALESCE_GAP', 2.0))
+    EXAM_PAGE_SIZE = int(os.getenv('EXAM_PAGE_SIZE', 50))
+    EXAM_PAGE_SIZE_MAX = int(os.getenv('EXAM_PAGE_SIZE_MAX', 200))
+    PROCTORING_LOGS_PAGE_SIZE = int(os.getenv('PROCTORING_LOGS_PAGE_SIZE', 1000))
+    PROCTORING_LOGS_PAGE_SIZE_MAX = int(os.getenv('PROCTORING_LOGS_PAGE_SIZE_MAX', 10000))
+    PROCTORING_LOGS_BATCH_SIZE = int(os.getenv('PROCTORING_LOGS_BATCH_SIZE', 500))
+    EXAM_CACHE_SIZE = int(os.getenv('EXAM_CACHE_SIZE', 256))
+    EXAM_CACHE_TTL = float(os.getenv('EXAM_CACHE_TTL', 60))
+    EXAM_CACHE_VERSION_CHECK_INTERVAL = float(os.getenv('EXAM_CACHE_VERSION_CHECK_INTERVAL', 1.0))
+    ANSWER_KEY_CACHE_SIZE = int(os.getenv('ANSWER_KEY_CACHE_SIZE', 256))
+    REGRADE_BATCH_SIZE = int(os.getenv('REGRADE_BATCH_SIZE', 1000))
+    MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', 50))
+    MAIL_POLL_INTERVAL = float(os.getenv('MAIL_POLL_INTERVAL', 2.0))
+    MAIL_MAX_ATTEMPTS = int(os.getenv('MAIL_MAX_ATTEMPTS', 5))
+    MAIL_RETRY_BACKOFF = float(os.getenv('MAIL_RETRY_BACKOFF', 30))
+    MAIL_RETRY_BACKOFF_MAX = float(os.getenv('MAIL_RETRY_BACKOFF_MAX', 1800))
+    MAIL_CLAIM_TIMEOUT = float(os.getenv('MAIL_CLAIM_TIMEOUT', 300))
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', 2))
+    BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING', 32))
+    BCRYPT_QUEUE_TIMEOUT = float(os.getenv('BCRYPT_QUEUE_TIMEOUT', 5.0))
+    QUESTION_ORDER_CACHE_SIZE = int(os.getenv('QUESTION_ORDER_CACHE_SIZE', 4096))
+    # Number of the first option in correct_option and answers; stored on each exam when its questions are set
+    OPTION_INDEX_BASE = int(os.getenv('OPTION_INDEX_BASE', 0))
+    AUTOSAVE_MAX_CHANGES = int(os.getenv('AUTOSAVE_MAX_CHANGES', 50))
+    PREWARM_BATCH_SIZE = int(os.getenv('PREWARM_BATCH_SIZE', 1000))
+    LEADERBOARD_PAGE_SIZE = int(os.getenv('LEADERBOARD_PAGE_SIZE', 50))
+    LEADERBOARD_PAGE_SIZE_MAX = int(os.getenv('LEADERBOARD_PAGE_SIZE_MAX', 500))
+    REPORT_DIR = os.getenv('REPORT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports'))
+    RECORDING_DIR = os.getenv('RECORDING_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recordings'))
+    RECORDING_SEGMENT_SECONDS = float(os.getenv('RECORDING_SEGMENT_SECONDS', 60))
+    RECORDING_FPS = float(os.getenv('RECORDING_FPS', 20.0))
+    RECORDING_STORAGE = os.getenv('RECORDING_STORAGE', 'drive')
+    RECORDING_UPLOAD_WORKERS = int(os.getenv('RECORDING_UPLOAD_WORKERS', 2))
+    LOCAL_STORAGE_DIR = os.getenv('LOCAL_STORAGE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'storage'))
+    UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+    UPLOAD_MAX_RETRIES = int(os.getenv('UPLOAD_MAX_RETRIES', 5))
+    FACE_DETECTION_MODE = os.getenv('FACE_DETECTION_MODE', 'full')
+    FACE_DETECTION_SCALE = float(os.getenv('FACE_DETECTION_SCALE', 1.0))
+    FACE_FULL_DETECTION_INTERVAL = int(os.getenv('FACE_FULL_DETECTION_INTERVAL', 10))
+    FACE_ROI_MARGIN = float(os.getenv('FACE_ROI_MARGIN', 0.5))
+    FACE_MIN_SIZE_RATIO = float(os.getenv('FACE_MIN_SIZE_RATIO', 0.1))
+    FACE_MAX_SIZE_RATIO = float(os.getenv('FACE_MAX_SIZE_RATIO', 1.0))
+    MODEL_WARMUP = [name.strip() for name in os.getenv('MODEL_WARMUP', '').split(',') if name.strip()]
+    FRAME_ANALYSIS_WORKERS = int(os.getenv('FRAME_ANALYSIS_WORKERS', 0))
+    FRAME_BATCH_MAX = int(os.getenv('FRAME_BATCH_MAX', 30))
+    FRAME_MAX_BYTES = int(os.getenv('FRAME_MAX_BYTES', 512 * 1024))
+    FRAME_SEGMENT_MAX_BYTES = int(os.getenv('FRAME_SEGMENT_MAX_BYTES', 16 * 1024 * 1024))
+    FRAME_SESSION_QUEUE = int(os.getenv('FRAME_SESSION_QUEUE', 2))
+    FRAME_SESSION_CHECK_INTERVAL = float(os.getenv('FRAME_SESSION_CHECK_INTERVAL', 30))
+    FRAME_SESSION_IDLE_TIMEOUT = float(os.getenv('FRAME_SESSION_IDLE_TIMEOUT', 300))
+    JOB_STAGE_THREADS = int(os.getenv('JOB_STAGE_THREADS', 4))
+    # 0 sizes the detection pool to JOB_WORKERS, one process per job that can be detecting
+    DETECTION_WORKERS = int(os.getenv('DETECTION_WORKERS', 0))
+    JOB_CLAIM_TIMEOUT = float(os.getenv('JOB_CLAIM_TIMEOUT', 300))
+    JOB_HEARTBEAT_INTERVAL = float(os.getenv('JOB_HEARTBEAT_INTERVAL', 30))
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+    LEADERBOARD_TOP_N = int(os.getenv('LEADERBOARD_TOP_N', 500))
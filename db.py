@@ -1,5 +1,127 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
 from config import Config
+import logging
+import os
+import threading
 
-client = MongoClient(Config.MONGO_URI)
-db = client['exam_db']
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pools = 0
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.checkout_failed = 0
+
+    def _add(self, name, delta=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    def pool_created(self, event):
+        self._add('pools')
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        self._add('pools', -1)
+
+    def connection_created(self, event):
+        self._add('created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add('closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._add('checkout_failed')
+
+    def connection_checked_out(self, event):
+        self._add('checked_out')
+
+    def connection_checked_in(self, event):
+        self._add('checked_out', -1)
+
+
+pool_stats_listener = PoolStatsListener()
+
+
+def get_client():
+    # The client is created on first use in each process, so gunicorn workers
+    # never inherit sockets or monitor threads from the master
+    global _client, _client_pid
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            pool_stats_listener.reset()
+            _client = MongoClient(
+                Config.MONGO_URI,
+                maxPoolSize=Config.MONGO_MAX_POOL_SIZE,
+                minPoolSize=Config.MONGO_MIN_POOL_SIZE,
+                connectTimeoutMS=Config.MONGO_CONNECT_TIMEOUT_MS,
+                serverSelectionTimeoutMS=Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                socketTimeoutMS=Config.MONGO_SOCKET_TIMEOUT_MS,
+                waitQueueTimeoutMS=Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                event_listeners=[pool_stats_listener]
+            )
+            _client_pid = os.getpid()
+            logger.info(f"MongoDB client created in process {_client_pid} (max pool size {Config.MONGO_MAX_POOL_SIZE})")
+    return _client
+
+
+def get_db():
+    return get_client()[Config.MONGO_DB_NAME]
+
+
+class LazyCollection:
+    # Stands in for a module-level Collection and resolves it on each access
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self.name], attr)
+
+    def __getitem__(self, key):
+        return get_db()[self.name][key]
+
+    def __repr__(self):
+        return f'LazyCollection({self.name!r})'
+
+
+def get_collection(name):
+    return LazyCollection(name)
+
+
+def pool_stats():
+    with pool_stats_listener._lock:
+        return {
+            'pid': os.getpid(),
+            'connected': _client is not None and _client_pid == os.getpid(),
+            'database': Config.MONGO_DB_NAME,
+            'max_pool_size': Config.MONGO_MAX_POOL_SIZE,
+            'pools': pool_stats_listener.pools,
+            'open_connections': pool_stats_listener.created - pool_stats_listener.closed,
+            'checked_out': pool_stats_listener.checked_out,
+            'connections_created': pool_stats_listener.created,
+            'connections_closed': pool_stats_listener.closed,
+            'checkout_failures': pool_stats_listener.checkout_failed
+        }
@@ -1,10 +1,7 @@
-from pymongo import MongoClient
 import bcrypt
-from config import Config
+from db import get_collection
 
-client = MongoClient(Config.MONGO_URI)
-db = client['online_exam']
-users_collection = db['users']
+users_collection = get_collection('users')
 
 for user in users_collection.find({'role': 'student'}):
     stored_password = user['password']
@@ -0,0 +1,7 @@
+# Loaded automatically by gunicorn from the working directory
+
+
+def post_worker_init(worker):
+    # Background threads do not survive a fork, so each worker starts its own
+    from app import app, start_background
+    start_background(app)
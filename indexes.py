@@ -0,0 +1,152 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+from db import get_db
+from config import Config
+import argparse
+import datetime
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+# Indexes required by the query shapes below, per collection
+INDEXES = {
+    'users': [
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+        IndexModel([('student_id', ASCENDING)], name='student_id'),
+        IndexModel([('role', ASCENDING)], name='role')
+    ],
+    'exams': [
+        IndexModel([('created_by', ASCENDING), ('status', ASCENDING), ('scheduled_for', ASCENDING), ('_id', ASCENDING)],
+                   name='created_by_status_scheduled_for_id'),
+        IndexModel([('status', ASCENDING), ('scheduled_for', ASCENDING), ('_id', ASCENDING)],
+                   name='status_scheduled_for_id')
+    ],
+    'question_bank': [
+        IndexModel([('content_hash', ASCENDING)], name='content_hash_unique', unique=True)
+    ],
+    'submissions': [
+        IndexModel([('exam_id', ASCENDING), ('user_email', ASCENDING)], name='exam_id_user_email_unique', unique=True),
+        IndexModel([('exam_id', ASCENDING), ('student_id', ASCENDING)], name='exam_id_student_id'),
+        IndexModel([('exam_id', ASCENDING), ('total_marks', DESCENDING), ('user_email', ASCENDING)],
+                   name='exam_id_total_marks_user_email')
+    ],
+    'proctoring_logs': [
+        IndexModel([('exam_id', ASCENDING), ('student_id', ASCENDING), ('timestamp', ASCENDING)],
+                   name='exam_id_student_id_timestamp'),
+        IndexModel([('exam_id', ASCENDING), ('student_id', ASCENDING), ('_id', ASCENDING)],
+                   name='exam_id_student_id_id'),
+        IndexModel([('timestamp', ASCENDING)], name='timestamp')
+    ],
+    'proctoring_jobs': [
+        IndexModel([('status', ASCENDING), ('created_at', ASCENDING)], name='status_created_at')
+    ],
+    'mail_outbox': [
+        IndexModel([('status', ASCENDING), ('next_attempt_at', ASCENDING)], name='status_next_attempt_at'),
+        IndexModel([('status', ASCENDING), ('claimed_at', ASCENDING)], name='status_claimed_at')
+    ]
+}
+
+# Indexes replaced by one above; dropped before the new ones are built
+RETIRED_INDEXES = {
+    'submissions': ['exam_id_user_email']
+}
+
+
+def query_shapes():
+    # (route, collection, filter, sort) for every query issued on a hot path
+    now = datetime.datetime.utcnow()
+    email = 'audit@example.com'
+    return [
+        ('auth.login', 'users', {'email': email}, None),
+        ('auth.verify_code', 'users', {'email': email, 'reset_code': '000000'}, None),
+        ('exam.get_exams (teacher)', 'exams', {'status': 'scheduled', 'created_by': email},
+         [('scheduled_for', 1), ('_id', 1)]),
+        ('exam.get_exams (student)', 'exams', {'status': 'scheduled', 'scheduled_for': {'$lte': now}},
+         [('scheduled_for', 1), ('_id', 1)]),
+        ('question_bank.store', 'question_bank', {'content_hash': {'$in': ['audit']}}, None),
+        ('leaderboard.ranked submissions', 'submissions', {'exam_id': 'audit', 'total_marks': {'$exists': True}},
+         [('total_marks', -1), ('user_email', 1)]),
+        ('exam.submission lookup', 'submissions', {'exam_id': 'audit', 'user_email': email}, None),
+        ('exam.get_student', 'users', {'email': email, 'role': 'student'}, None),
+        ('proctoring.session lookup', 'submissions', {'exam_id': 'audit', 'student_id': email}, None),
+        ('proctoring.notify (proctor)', 'users', {'role': 'proctor'}, None),
+        ('proctoring.notify (student)', 'users', {'student_id': email}, None),
+        ('proctoring.get_proctoring_logs', 'proctoring_logs', {'exam_id': 'audit', 'student_id': email}, [('_id', 1)]),
+        ('job_queue.claim', 'proctoring_jobs', {'status': 'queued', 'kind': {'$in': ['proctoring']}}, [('created_at', 1)])
+    ]
+
+
+def ensure_indexes():
+    db = get_db()
+    for collection_name, index_names in RETIRED_INDEXES.items():
+        try:
+            existing = db[collection_name].index_information()
+            for name in index_names:
+                if name in existing:
+                    db[collection_name].drop_index(name)
+                    logger.info(f"Dropped retired index {name} on {collection_name}")
+        except PyMongoError as e:
+            logger.error(f"Failed to drop retired indexes on {collection_name}: {str(e)}")
+    for collection_name, indexes in INDEXES.items():
+        try:
+            names = db[collection_name].create_indexes(indexes)
+            logger.info(f"Indexes ensured on {collection_name}: {', '.join(names)}")
+        except PyMongoError as e:
+            logger.error(f"Failed to create indexes on {collection_name}: {str(e)}")
+
+
+def _plan_stages(plan):
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+def audit_queries():
+    db = get_db()
+    report = []
+    for route, collection_name, query, sort in query_shapes():
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()
+        stages = _plan_stages(plan['queryPlanner']['winningPlan'])
+        report.append({
+            'route': route,
+            'collection': collection_name,
+            'stages': stages,
+            'collection_scan': 'COLLSCAN' in stages,
+            'in_memory_sort': 'SORT' in stages
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create MongoDB indexes or audit query plans')
+    parser.add_argument('command', choices=['apply', 'audit'])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'apply':
+        ensure_indexes()
+        return 0
+
+    failures = 0
+    for entry in audit_queries():
+        flags = [flag for flag in ('collection_scan', 'in_memory_sort') if entry[flag]]
+        failures += entry['collection_scan']
+        status = 'FLAG ' + ','.join(flags) if flags else 'ok'
+        print(f"{status:<32} {entry['route']:<32} {entry['collection']:<16} {' > '.join(entry['stages'])}")
+    print(f"Database {Config.MONGO_DB_NAME}: {failures} collection scan(s)")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,16 @@
+from db import get_collection
+from services.question_bank import store_questions
+
+exams_collection = get_collection('exams')
+
+# Moves questions embedded in exam documents into the question bank
+migrated = 0
+for exam in exams_collection.find({'questions': {'$exists': True}, 'question_ids': {'$exists': False}}):
+    question_ids = store_questions(exam['questions'], exam.get('created_by'))
+    exams_collection.update_one(
+        {'_id': exam['_id'], 'question_ids': {'$exists': False}},
+        {'$set': {'question_ids': question_ids}, '$unset': {'questions': ''}}
+    )
+    migrated += 1
+    print(f"Migrated {len(question_ids)} questions for exam: {exam['_id']}")
+print(f"Question bank migration completed, {migrated} exams migrated.")
@@ -1,16 +1,18 @@
 from flask import Blueprint, request, jsonify, make_response
-from pymongo import MongoClient
 from flask_jwt_extended import create_access_token
-from flask_mail import Mail, Message
-import bcrypt
 import random
-from config import Config
+from db import get_collection
+from services.mail_outbox import enqueue_mail
+from services.password_hashing import PasswordHasherBusy, hash_password, check_password, needs_rehash, rehash_password_async
 
 auth_bp = Blueprint('auth', __name__)
-client = MongoClient(Config.MONGO_URI)
-db = client['online_exam']
-users_collection = db['users']
-mail = Mail()
+users_collection = get_collection('users')
+
+@auth_bp.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(e):
+    response = jsonify({'message': 'Server busy, please retry'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
 
 @auth_bp.route('/register', methods=['POST', 'OPTIONS'])
 def register():
@@ -21,17 +23,15 @@ def register():
         response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
         return response, 200
     data = request.get_json()
-    password = data['password'].encode('utf-8')
-    hashed_password = bcrypt.hashpw(password, bcrypt.gensalt())
+    if users_collection.find_one({'email': data['email']}):
+        return jsonify({'message': 'Email already exists'}), 400
     user = {
         'name': data['name'],
         'email': data['email'],
-        'password': hashed_password,
+        'password': hash_password(data['password']),
         'role': data['role'],
         'student_id': data['email'] if data['role'] == 'student' else None
     }
-    if users_collection.find_one({'email': data['email']}):
-        return jsonify({'message': 'Email already exists'}), 400
     result = users_collection.insert_one(user)
     return jsonify({'message': 'User registered successfully'}), 201
 
@@ -45,7 +45,13 @@ def login():
         return response, 200
     data = request.get_json()
     user = users_collection.find_one({'email': data['email']})
-    if user and bcrypt.checkpw(data['password'].encode('utf-8'), user['password']):
+    if user and check_password(data['password'], user['password']):
+        if needs_rehash(user['password']):
+            # Upgrade the hash to the configured work factor without delaying the response
+            rehash_password_async(data['password'], lambda new_hash: users_collection.update_one(
+                {'_id': user['_id'], 'password': user['password']},
+                {'$set': {'password': new_hash}}
+            ))
         token = create_access_token(identity={'email': user['email'], 'role': user['role'], 'student_id': user.get('student_id')})
         return jsonify({
             'token': token,
@@ -71,9 +77,8 @@ def forgot_password():
     if user:
         verification_code = str(random.randint(100000, 999999))
         users_collection.update_one({'email': data['email']}, {'$set': {'reset_code': verification_code}})
-        msg = Message('Password Reset Verification Code', sender=Config.MAIL_USERNAME, recipients=[data['email']])
-        msg.body = f'Your verification code is: {verification_code}\nThis code is valid for 10 minutes.'
-        mail.send(msg)
+        enqueue_mail('Password Reset Verification Code', [data['email']],
+                     f'Your verification code is: {verification_code}\nThis code is valid for 10 minutes.')
         return jsonify({'message': 'Verification code sent to your email'})
     return jsonify({'message': 'User not found'}), 404
 
@@ -102,8 +107,7 @@ def reset_password():
     data = request.get_json()
     user = users_collection.find_one({'email': data['email'], 'reset_code': data['code']})
     if user:
-        new_password = data['newPassword'].encode('utf-8')
-        hashed_password = bcrypt.hashpw(new_password, bcrypt.gensalt())
+        hashed_password = hash_password(data['newPassword'])
         users_collection.update_one(
             {'email': data['email']},
             {'$set': {'password': hashed_password, 'reset_code': None}}
@@ -1,26 +1,40 @@
 from flask import Blueprint, request, jsonify, make_response
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from pymongo import MongoClient
 from datetime import datetime
 from bson import ObjectId
-import csv
-from io import StringIO
-import random
-import json
+from bson.errors import InvalidId
 import logging
 from config import Config
+from db import get_collection
+from services.exam_analytics import get_analytics, record_submission, schedule_rebuild
+from services.exam_cache import exam_cache
+from services.grading import AnswerKey, grade_submission, score_batch
+from services.leaderboard import get_leaderboard, rebuild_leaderboard, record_score, score_key, standings_by_exam
+from services.question_bank import resolve_questions, store_questions
+from services.question_import import QuestionImportError, import_questions
+from services.question_order import present_questions, to_canonical_answers, to_canonical_slot, to_presented_answers
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
 
 exam_bp = Blueprint('exam', __name__)
-client = MongoClient(Config.MONGO_URI)
-db = client['online_exam']
-exams_collection = db['exams']
-submissions_collection = db['submissions']
-users_collection = db['users']
+exams_collection = get_collection('exams')
+submissions_collection = get_collection('submissions')
+users_collection = get_collection('users')
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Fields the exam listing can return; questions are only sent when asked for
+EXAM_LIST_FIELDS = ['title', 'duration', 'scheduled_for', 'randomized', 'difficulty', 'status', 'questions']
+
+def encode_exam_cursor(exam):
+    return f"{exam['scheduled_for'].isoformat()}_{exam['_id']}"
+
+def decode_exam_cursor(cursor):
+    scheduled_for, exam_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(scheduled_for), ObjectId(exam_id)
+
 @exam_bp.route('/create-exam', methods=['POST', 'OPTIONS'])
 @jwt_required(optional=True)  # Allow OPTIONS without JWT
 def create_exam():
@@ -48,7 +62,6 @@ def create_exam():
         return jsonify({'message': 'Unauthorized'}), 403
 
     data = request.form.to_dict()
-    questions = []
 
     # Debug: Log received form data
     logger.info(f"Received form data: {dict(request.form)}")
@@ -57,53 +70,12 @@ def create_exam():
     if request.form.getlist('questions[]'):
         logger.info(f"Manual questions received: {request.form.getlist('questions[]')}")
 
-    # Process CSV file if provided
-    if 'csv_file' in request.files:
-        csv_file = request.files['csv_file']
-        if csv_file.filename.endswith('.csv'):
-            stream = StringIO(csv_file.stream.read().decode('UTF-8'))
-            csv_reader = csv.DictReader(stream)
-            for row in csv_reader:
-                if row['type'].lower() == 'mcq':
-                    questions.append({
-                        'question': row['question'],
-                        'options': [row['option1'], row['option2'], row['option3'], row['option4']],
-                        'correct_option': int(row['correct_option']),
-                        'difficulty': row['difficulty'],
-                        'type': 'mcq'
-                    })
-                else:
-                    questions.append({
-                        'question': row['question'],
-                        'difficulty': row['difficulty'],
-                        'type': 'subjective'
-                    })
-            logger.info(f"Processed {len(questions)} questions from CSV")
-
-    # If no CSV, process manual questions
-    elif request.form.getlist('questions[]'):
-        question_data = request.form.getlist('questions[]')
-        for q in question_data:
-            try:
-                q_dict = json.loads(q)  # Use json.loads for safe parsing
-                if q_dict['type'] == 'mcq':
-                    questions.append({
-                        'question': q_dict['question'],
-                        'options': q_dict['options'],
-                        'correct_option': q_dict['correct_option'],
-                        'difficulty': q_dict['difficulty'],
-                        'type': 'mcq'
-                    })
-                else:
-                    questions.append({
-                        'question': q_dict['question'],
-                        'difficulty': q_dict['difficulty'],
-                        'type': 'subjective'
-                    })
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse question: {q}, Error: {str(e)}")
-                return jsonify({'message': 'Invalid question format in manual questions'}), 400
-        logger.info(f"Processed {len(questions)} manual questions")
+    try:
+        questions = import_questions(request.files, request.form)
+    except QuestionImportError as e:
+        logger.error(f"Rejected questions for new exam: {str(e)}")
+        return jsonify({'message': 'Invalid questions', 'errors': e.errors}), 400
+    logger.info(f"Processed {len(questions)} questions")
 
     if not questions:
         logger.error("No questions provided after processing")
@@ -112,7 +84,8 @@ def create_exam():
     exam = {
         'title': data['title'],
         'duration': int(data['duration']),
-        'questions': questions,
+        'question_ids': store_questions(questions, current_user['email']),
+        'option_index_base': Config.OPTION_INDEX_BASE,
         'scheduled_for': datetime.strptime(data['scheduled_for'], '%Y-%m-%dT%H:%M:%S.%fZ'),
         'randomized': data.get('randomized') == 'true',
         'difficulty': data['difficulty'],
@@ -120,8 +93,6 @@ def create_exam():
         'created_by': current_user['email'],
         'status': 'scheduled'
     }
-    if exam['randomized']:
-        random.shuffle(exam['questions'])
     result = exams_collection.insert_one(exam)
     logger.info(f"Exam created with ID: {str(result.inserted_id)}")
     return jsonify({'message': 'Exam created successfully', 'exam_id': str(result.inserted_id)}), 201
@@ -164,51 +135,22 @@ def edit_exam(exam_id):
     if 'difficulty' in data:
         update['difficulty'] = data['difficulty']
 
-    questions = []
-    if 'csv_file' in request.files:
-        csv_file = request.files['csv_file']
-        if csv_file.filename.endswith('.csv'):
-            stream = StringIO(csv_file.stream.read().decode('UTF-8'))
-            csv_reader = csv.DictReader(stream)
-            for row in csv_reader:
-                if row['type'].lower() == 'mcq':
-                    questions.append({
-                        'question': row['question'],
-                        'options': [row['option1'], row['option2'], row['option3'], row['option4']],
-                        'correct_option': int(row['correct_option']),
-                        'difficulty': row['difficulty'],
-                        'type': 'mcq'
-                    })
-                else:
-                    questions.append({
-                        'question': row['question'],
-                        'difficulty': row['difficulty'],
-                        'type': 'subjective'
-                    })
-    elif request.form.getlist('questions[]'):
-        for q in request.form.getlist('questions[]'):
-            q_dict = json.loads(q)
-            if q_dict['type'] == 'mcq':
-                questions.append({
-                    'question': q_dict['question'],
-                    'options': q_dict['options'],
-                    'correct_option': q_dict['correct_option'],
-                    'difficulty': q_dict['difficulty'],
-                    'type': 'mcq'
-                })
-            else:
-                questions.append({
-                    'question': q_dict['question'],
-                    'difficulty': q_dict['difficulty'],
-                    'type': 'subjective'
-                })
+    try:
+        questions = import_questions(request.files, request.form)
+    except QuestionImportError as e:
+        logger.error(f"Rejected questions for exam {exam_id}: {str(e)}")
+        return jsonify({'message': 'Invalid questions', 'errors': e.errors}), 400
+    unset = {}
     if questions:
-        update['questions'] = questions
-        if update.get('randomized', exam['randomized']):
-            random.shuffle(update['questions'])
+        # Unchanged questions keep their bank ids; only new ones are inserted
+        update['question_ids'] = store_questions(questions, current_user['email'])
+        update['option_index_base'] = Config.OPTION_INDEX_BASE
+        if 'questions' in exam:
+            unset['questions'] = ''
 
     if update:
-        exams_collection.update_one({'_id': ObjectId(exam_id)}, {'$set': update})
+        exams_collection.update_one({'_id': ObjectId(exam_id)}, {'$set': update, **({'$unset': unset} if unset else {})})
+        exam_cache.invalidate(exam_id)
         return jsonify({'message': 'Exam updated successfully'})
     return jsonify({'message': 'No changes provided'}), 400
 
@@ -234,6 +176,7 @@ def delete_exam(exam_id):
     result = exams_collection.delete_one({'_id': ObjectId(exam_id), 'created_by': current_user['email']})
     if result.deleted_count == 0:
         return jsonify({'message': 'Exam not found or unauthorized'}), 404
+    exam_cache.invalidate(exam_id)
     return jsonify({'message': 'Exam deleted successfully'})
 
 @exam_bp.route('/get-exams', methods=['GET', 'OPTIONS'])
@@ -253,42 +196,96 @@ def get_exams():
     if not current_user:
         return jsonify({'message': 'Missing authorization token'}), 401
 
+    try:
+        limit = min(int(request.args.get('limit', Config.EXAM_PAGE_SIZE)), Config.EXAM_PAGE_SIZE_MAX)
+        after = decode_exam_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except (ValueError, InvalidId):
+        return jsonify({'message': 'Invalid pagination parameters'}), 400
+    if limit < 1:
+        return jsonify({'message': 'Invalid pagination parameters'}), 400
+
+    if request.args.get('fields'):
+        fields = [field for field in request.args['fields'].split(',') if field in EXAM_LIST_FIELDS]
+    else:
+        fields = [field for field in EXAM_LIST_FIELDS if field != 'questions']
+    if request.args.get('include_questions') == 'true' and 'questions' not in fields:
+        fields.append('questions')
+    projection = {field: 1 for field in fields}
+    projection['scheduled_for'] = 1
+    # Students' questions and answers are shown in their own order on randomized exams
+    if 'questions' in fields or current_user.get('role') == 'student':
+        projection['question_ids'] = 1
+        projection['randomized'] = 1
+        projection['option_index_base'] = 1
+
     now = datetime.utcnow()
     query = {'status': 'scheduled'}
     if current_user.get('role') in ['teacher', 'examiner']:
         query['created_by'] = current_user['email']
     else:
         query['scheduled_for'] = {'$lte': now}
+    if after:
+        query['$or'] = [
+            {'scheduled_for': {'$gt': after[0]}},
+            {'scheduled_for': after[0], '_id': {'$gt': after[1]}}
+        ]
+
+    # Keyset pagination on (scheduled_for, _id); one extra document tells us whether another page exists
+    exams = list(exams_collection.find(query, projection).sort([('scheduled_for', 1), ('_id', 1)]).limit(limit + 1))
+    next_cursor = None
+    if len(exams) > limit:
+        exams = exams[:limit]
+        next_cursor = encode_exam_cursor(exams[-1])
+
+    # Fetch the student's submissions for all listed exams in one query
+    submissions = {}
+    if current_user.get('role') == 'student' and exams:
+        for submission in submissions_collection.find({
+            'exam_id': {'$in': [str(exam['_id']) for exam in exams]},
+            'user_email': current_user['email'],
+            'status': {'$ne': 'pending'}
+        }):
+            submissions.setdefault(submission['exam_id'], submission)
+    # Ranks come from the exams' leaderboards, read in one query
+    standings = standings_by_exam(
+        [exam_id for exam_id, submission in submissions.items() if 'total_marks' in submission]
+    ) if submissions else {}
+
+    # Questions for the whole page come from the bank in one query
+    resolve_questions([
+        exam for exam in exams
+        if (current_user.get('role') in ['teacher', 'examiner'] or exam['scheduled_for'] <= now)
+        and ('questions' in fields or (exam.get('randomized') and str(exam['_id']) in submissions))
+    ])
 
-    exams = exams_collection.find(query).sort('scheduled_for', 1)
     result = []
     for exam in exams:
-        submission = submissions_collection.find_one({
-            'exam_id': str(exam['_id']),
-            'user_email': current_user['email']
-        }) if current_user.get('role') == 'student' else None
-        exam_data = {
-            'exam_id': str(exam['_id']),
-            'title': exam['title'],
-            'duration': exam['duration'],
-            'scheduled_for': exam['scheduled_for'].isoformat(),
-            'randomized': exam['randomized'],
-            'difficulty': exam['difficulty'],
-            'questions': exam['questions'] if current_user.get('role') in ['teacher', 'examiner'] or exam['scheduled_for'] <= now else [],
-            'status': exam['status']
-        }
+        submission = submissions.get(str(exam['_id']))
+        exam_data = {'exam_id': str(exam['_id'])}
+        for field in fields:
+            exam_data[field] = exam.get(field)
+        if 'scheduled_for' in exam_data:
+            exam_data['scheduled_for'] = exam['scheduled_for'].isoformat()
+        if 'questions' in exam_data and not (current_user.get('role') in ['teacher', 'examiner'] or exam['scheduled_for'] <= now):
+            exam_data['questions'] = []
+        elif exam_data.get('questions') and current_user.get('role') == 'student':
+            exam_data['questions'] = present_questions(exam, current_user['email'])
         if submission:
             exam_data['submission'] = {
                 'status': submission['status'],
-                'answers': submission['answers'],
+                'answers': to_presented_answers(exam, submission['answers'], current_user['email']) if 'questions' in exam else submission['answers'],
                 'mcq_score': submission['score'],
                 'subjective_marks': submission.get('subjective_marks', 0),
                 'total_marks': submission.get('total_marks', 0),
-                'rank': submission.get('rank', ''),
+                'rank': standings.get(str(exam['_id']), {}).get(score_key(submission['total_marks']), ('',))[0]
+                        if 'total_marks' in submission else '',
                 'start_time': submission.get('start_time', '').isoformat() if submission.get('start_time') else None
             }
         result.append(exam_data)
-    return jsonify(result)
+    response = make_response(jsonify(result))
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
 
 @exam_bp.route('/get-exams/<exam_id>', methods=['GET', 'OPTIONS'])
 @jwt_required(optional=True)
@@ -307,7 +304,7 @@ def get_exam_by_id(exam_id):
     if not current_user:
         return jsonify({'message': 'Missing authorization token'}), 401
     
-    exam = exams_collection.find_one({'_id': ObjectId(exam_id)})
+    exam = exam_cache.get(exam_id)
     if not exam:
         return jsonify({'message': 'Exam not found'}), 404
     
@@ -318,7 +315,9 @@ def get_exam_by_id(exam_id):
         'scheduled_for': exam['scheduled_for'].isoformat(),
         'randomized': exam['randomized'],
         'difficulty': exam['difficulty'],
-        'questions': exam['questions'] if current_user.get('role') in ['teacher', 'examiner'] else [],
+        'questions': [] if current_user.get('role') not in ['teacher', 'examiner'] and exam['scheduled_for'] > datetime.utcnow()
+                     else present_questions(exam, current_user['email']) if current_user.get('role') == 'student'
+                     else exam['questions'],
         'status': exam['status']
     }
     return jsonify(exam_data), 200
@@ -343,7 +342,7 @@ def submit_exam():
         return jsonify({'message': 'Unauthorized'}), 403
 
     data = request.get_json()
-    exam = exams_collection.find_one({'_id': ObjectId(data['exam_id'])})
+    exam = exam_cache.get(data['exam_id'])
     if not exam:
         return jsonify({'message': 'Exam not found'}), 404
     if exam['scheduled_for'] > datetime.utcnow():
@@ -355,17 +354,24 @@ def submit_exam():
     })
     if submission and submission['status'] == 'completed':
         return jsonify({'message': 'Exam already submitted'}), 400
-
-    score = 0
-    answers = data['answers']
-    for i, q in enumerate(exam['questions']):
-        if q['type'] == 'mcq' and answers[i] and answers[i].get('answer') is not None:
-            if isinstance(answers[i].get('answer'), (int, str)) and int(answers[i].get('answer')) == q['correct_option']:
-                score += 1
+    if submission and submission['status'] == 'pending':
+        # Pre-warmed but never started
+        return jsonify({'message': 'Exam not started'}), 400
+
+    # Stored and graded in canonical order. Without an answers array the
+    # submission is finalized from what autosave has stored.
+    if data.get('answers') is not None:
+        answers = to_canonical_answers(exam, data['answers'], current_user['email'])
+    elif submission:
+        answers = submission.get('answers', [])
+    else:
+        return jsonify({'message': 'Exam not started'}), 400
+    score = grade_submission(exam, answers)
 
     if submission:
-        submissions_collection.update_one(
-            {'_id': submission['_id']},
+        # Matches only if no autosave landed since the submission was read
+        result = submissions_collection.update_one(
+            {'_id': submission['_id'], 'status': {'$ne': 'completed'}, 'autosave_seq': submission.get('autosave_seq')},
             {'$set': {
                 'answers': answers,
                 'score': score,
@@ -373,8 +379,10 @@ def submit_exam():
                 'status': 'completed'
             }}
         )
+        if not result.matched_count:
+            return jsonify({'message': 'Submission changed while submitting, please retry'}), 409
     else:
-        submissions_collection.insert_one({
+        submission = {
             'exam_id': data['exam_id'],
             'user_email': current_user['email'],
             'student_id': current_user['student_id'],
@@ -383,7 +391,16 @@ def submit_exam():
             'start_time': data.get('start_time', datetime.utcnow()),
             'submitted_at': datetime.utcnow(),
             'status': 'completed'
-        })
+        }
+        try:
+            submissions_collection.insert_one(submission)
+        except DuplicateKeyError:
+            return jsonify({'message': 'Submission changed while submitting, please retry'}), 409
+
+    try:
+        record_submission(exam, {**submission, 'answers': answers, 'score': score})
+    except Exception as e:
+        logger.error(f"Failed to update analytics for exam {data['exam_id']}: {str(e)}")
     return jsonify({'message': 'Exam submitted successfully'})
 
 @exam_bp.route('/start-exam/<exam_id>', methods=['POST', 'OPTIONS'])
@@ -403,7 +420,7 @@ def start_exam(exam_id):
     if current_user.get('role') != 'student':
         return jsonify({'message': 'Unauthorized'}), 403
 
-    exam = exams_collection.find_one({'_id': ObjectId(exam_id)})
+    exam = exam_cache.get(exam_id)
     if not exam:
         return jsonify({'message': 'Exam not found'}), 404
 
@@ -412,34 +429,249 @@ def start_exam(exam_id):
     if exam['scheduled_for'] > now:
         return jsonify({'message': 'Exam not yet available'}), 400
 
-    # Check if submission already exists
-    submission = submissions_collection.find_one({
-        'exam_id': exam_id,
-        'user_email': current_user['email']
-    })
+    # A pre-warmed (pending) submission is started with one update; otherwise
+    # the submission is upserted on the unique (exam_id, user_email) key, so a
+    # burst of start requests can never create duplicates. Both calls return
+    # the document as it was before, i.e. None when the upsert inserted it.
+    key = {'exam_id': exam_id, 'user_email': current_user['email']}
+    pending = {**key, 'status': 'pending'}
+    start = {'$set': {'status': 'in_progress', 'start_time': now}}
+    submission = None
+    if not submissions_collection.find_one_and_update(pending, start):
+        try:
+            submission = submissions_collection.find_one_and_update(key, {'$setOnInsert': {
+                **key,
+                'student_id': current_user.get('student_id'),
+                'start_time': now,
+                'status': 'in_progress',
+                'answers': [],
+                'score': 0
+            }}, upsert=True)
+        except DuplicateKeyError:
+            submission = submissions_collection.find_one(key)
+        if submission and submission['status'] == 'pending':
+            # Pre-warmed between the two calls above
+            submission = None if submissions_collection.find_one_and_update(pending, start) \
+                else submissions_collection.find_one(key)
+
     if submission:
+        # Lets a reloaded client resume from its autosaved answers
         return jsonify({
             'message': 'Exam already started',
-            'start_time': submission['start_time'].isoformat(),
-            'duration': exam['duration']  # Return duration in minutes
+            'start_time': submission['start_time'].isoformat() if submission.get('start_time') else None,
+            'duration': exam['duration'],  # Return duration in minutes
+            'answers': to_presented_answers(exam, submission.get('answers', []), current_user['email']),
+            'seq': submission.get('autosave_seq', 0)
         }), 200
 
-    # Create new submission
-    submission = {
-        'exam_id': exam_id,
-        'user_email': current_user['email'],
-        'start_time': now,
-        'status': 'in_progress',
-        'answers': [],
-        'score': 0
-    }
-    submissions_collection.insert_one(submission)
     return jsonify({
         'message': 'Exam started successfully',
         'start_time': now.isoformat(),
         'duration': exam['duration']  # Return duration in minutes
     }), 200
 
+@exam_bp.route('/prewarm-exam/<exam_id>', methods=['POST', 'OPTIONS'])
+@jwt_required(optional=True)
+def prewarm_exam(exam_id):
+    logger.info(f"Received {request.method} request to prewarm exam {exam_id}")
+    if request.method == 'OPTIONS':
+        response = make_response()
+        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:4200')
+        response.headers.add('Access-Control-Allow-Methods', 'POST, OPTIONS')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        return response, 200
+
+    current_user = get_jwt_identity()
+    if not current_user:
+        return jsonify({'message': 'Missing authorization token'}), 401
+    if current_user.get('role') not in ['teacher', 'examiner']:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    exam = exams_collection.find_one({'_id': ObjectId(exam_id), 'created_by': current_user['email']}, {'_id': 1})
+    if not exam:
+        return jsonify({'message': 'Exam not found or unauthorized'}), 404
+
+    # Creates a pending submission for every student (or the listed ones) so
+    # that start_exam only has to flip its status when the exam opens
+    data = request.get_json(silent=True) or {}
+    query = {'role': 'student'}
+    if data.get('students'):
+        query['email'] = {'$in': list(data['students'])}
+    now = datetime.utcnow()
+
+    students = 0
+    created = 0
+
+    def flush(operations):
+        # A student starting the exam meanwhile wins the unique (exam_id,
+        # user_email) key; those duplicate-key errors are expected
+        try:
+            return submissions_collection.bulk_write(operations, ordered=False).upserted_count
+        except BulkWriteError as e:
+            if any(error['code'] != 11000 for error in e.details['writeErrors']):
+                raise
+            return e.details['nUpserted']
+
+    operations = []
+    for student in users_collection.find(query, {'email': 1, 'student_id': 1}).batch_size(Config.PREWARM_BATCH_SIZE):
+        operations.append(UpdateOne(
+            {'exam_id': exam_id, 'user_email': student['email']},
+            {'$setOnInsert': {
+                'exam_id': exam_id,
+                'user_email': student['email'],
+                'student_id': student.get('student_id'),
+                'status': 'pending',
+                'answers': [],
+                'score': 0,
+                'created_at': now
+            }},
+            upsert=True
+        ))
+        students += 1
+        if len(operations) == Config.PREWARM_BATCH_SIZE:
+            created += flush(operations)
+            operations = []
+    if operations:
+        created += flush(operations)
+
+    exams_collection.update_one({'_id': ObjectId(exam_id)}, {'$set': {'prewarmed_at': now}})
+    logger.info(f"Prewarmed exam {exam_id}: {created} pending submissions created for {students} students")
+    return jsonify({'message': 'Exam prewarmed successfully', 'students': students, 'created': created})
+
+@exam_bp.route('/autosave-answers/<exam_id>', methods=['POST', 'OPTIONS'])
+@jwt_required(optional=True)
+def autosave_answers(exam_id):
+    if request.method == 'OPTIONS':
+        response = make_response()
+        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:4200')
+        response.headers.add('Access-Control-Allow-Methods', 'POST, OPTIONS')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization, Idempotency-Key')
+        return response, 200
+
+    current_user = get_jwt_identity()
+    if not current_user:
+        return jsonify({'message': 'Missing authorization token'}), 401
+    if current_user.get('role') != 'student':
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    exam = exam_cache.get(exam_id)
+    if not exam:
+        return jsonify({'message': 'Exam not found'}), 404
+
+    # Body: {"seq": n, "changes": [{"index": i, "answer": ...}]}. seq must grow
+    # with every save; index is the question's position as the student sees it.
+    data = request.get_json(silent=True) or {}
+    seq = data.get('seq')
+    changes = data.get('changes')
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    if not isinstance(seq, int) or seq < 1 or not isinstance(changes, list) or len(changes) > Config.AUTOSAVE_MAX_CHANGES:
+        return jsonify({'message': 'Invalid autosave payload'}), 400
+
+    now = datetime.utcnow()
+    update = {}
+    first_answered = {}
+    for change in changes:
+        if not isinstance(change, dict) or not isinstance(change.get('index'), int) \
+                or not 0 <= change['index'] < len(exam['questions']):
+            return jsonify({'message': 'Invalid autosave payload'}), 400
+        position, slot = to_canonical_slot(exam, change['index'], {'answer': change.get('answer')}, current_user['email'])
+        update[f'answers.{position}'] = slot
+        # When each question was first answered, for time-per-question analytics
+        first_answered[f'answered_at.{position}'] = now
+    update['autosave_seq'] = seq
+    update['autosave_key'] = idempotency_key
+    update['autosaved_at'] = now
+
+    # The seq condition makes a delayed or replayed save a no-op
+    result = submissions_collection.update_one(
+        {
+            'exam_id': exam_id,
+            'user_email': current_user['email'],
+            'status': 'in_progress',
+            '$or': [{'autosave_seq': {'$lt': seq}}, {'autosave_seq': {'$exists': False}}]
+        },
+        {'$set': update, **({'$min': first_answered} if first_answered else {})}
+    )
+    if result.matched_count:
+        return jsonify({'message': 'Answers saved', 'seq': seq})
+
+    submission = submissions_collection.find_one(
+        {'exam_id': exam_id, 'user_email': current_user['email']},
+        {'status': 1, 'autosave_seq': 1, 'autosave_key': 1}
+    )
+    if not submission:
+        return jsonify({'message': 'Exam not started'}), 404
+    if submission['status'] != 'in_progress':
+        return jsonify({'message': 'Exam already submitted'}), 409
+    if idempotency_key and submission.get('autosave_seq') == seq and submission.get('autosave_key') == idempotency_key:
+        return jsonify({'message': 'Answers saved', 'seq': seq})
+    return jsonify({'message': 'Stale autosave', 'seq': submission.get('autosave_seq', 0)}), 409
+
+@exam_bp.route('/regrade-exam/<exam_id>', methods=['POST', 'OPTIONS'])
+@jwt_required(optional=True)
+def regrade_exam(exam_id):
+    logger.info(f"Received {request.method} request to regrade exam {exam_id}")
+    if request.method == 'OPTIONS':
+        response = make_response()
+        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:4200')
+        response.headers.add('Access-Control-Allow-Methods', 'POST, OPTIONS')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        response.headers.add('Access-Control-Max-Age', '86400')
+        return response, 200
+
+    current_user = get_jwt_identity()
+    if not current_user:
+        return jsonify({'message': 'Missing authorization token'}), 401
+
+    if current_user.get('role') not in ['teacher', 'examiner']:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    exam = exams_collection.find_one({'_id': ObjectId(exam_id), 'created_by': current_user['email']},
+                                     {'questions': 1, 'question_ids': 1})
+    if not exam:
+        return jsonify({'message': 'Exam not found or unauthorized'}), 404
+    resolve_questions([exam])
+
+    key = AnswerKey(exam['questions'])
+    submissions = submissions_collection.find(
+        {'exam_id': exam_id, 'status': 'completed'},
+        {'answers': 1, 'score': 1, 'subjective_marks': 1, 'total_marks': 1}
+    ).batch_size(Config.REGRADE_BATCH_SIZE)
+
+    regraded = 0
+    updated = 0
+
+    def flush(batch):
+        scores = score_batch(key, [submission.get('answers') for submission in batch])
+        operations = []
+        for submission, score in zip(batch, scores.tolist()):
+            if score == submission.get('score'):
+                continue
+            update = {'score': score}
+            if 'total_marks' in submission:
+                update['total_marks'] = score + submission.get('subjective_marks', 0)
+            operations.append(UpdateOne({'_id': submission['_id']}, {'$set': update}))
+        if operations:
+            submissions_collection.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    batch = []
+    for submission in submissions:
+        batch.append(submission)
+        if len(batch) == Config.REGRADE_BATCH_SIZE:
+            updated += flush(batch)
+            regraded += len(batch)
+            batch = []
+    if batch:
+        updated += flush(batch)
+        regraded += len(batch)
+
+    if updated:
+        rebuild_leaderboard(exam_id)
+        schedule_rebuild(exam_id)
+    logger.info(f"Regraded {regraded} submissions for exam {exam_id}, {updated} scores changed")
+    return jsonify({'message': 'Exam regraded successfully', 'regraded': regraded, 'updated': updated})
+
 @exam_bp.route('/evaluate-exam', methods=['POST', 'OPTIONS'])
 @jwt_required(optional=True)
 def evaluate_exam():
@@ -469,17 +701,17 @@ def evaluate_exam():
 
     subjective_marks = sum(float(m) for m in data['subjective_marks'] if m is not None)
     total_marks = submission['score'] + subjective_marks
-    rank = data['rank']
 
+    # Rank is no longer taken from the client; it follows from the leaderboard
     submissions_collection.update_one(
         {'_id': submission['_id']},
         {'$set': {
             'subjective_marks': subjective_marks,
             'total_marks': total_marks,
-            'rank': rank,
             'status': 'completed'
-        }}
+        }, '$unset': {'rank': ''}}
     )
+    record_score(data['exam_id'], submission['user_email'], submission.get('student_id'), total_marks)
     return jsonify({'message': 'Exam evaluated successfully'})
 
 @exam_bp.route('/get-submission/<exam_id>/<user_email>', methods=['GET', 'OPTIONS'])
@@ -508,7 +740,7 @@ def get_submission(exam_id, user_email):
     if not submission:
         return jsonify({'message': 'Submission not found'}), 404
 
-    exam = exams_collection.find_one({'_id': ObjectId(exam_id)})
+    exam = exam_cache.get(exam_id)
     if not exam:
         return jsonify({'message': 'Exam not found'}), 404
 
@@ -521,11 +753,71 @@ def get_submission(exam_id, user_email):
         'mcq_score': submission['score'],
         'subjective_marks': submission.get('subjective_marks', 0),
         'total_marks': submission.get('total_marks', 0),
-        'rank': submission.get('rank', ''),
+        'rank': standings_by_exam([exam_id]).get(exam_id, {}).get(score_key(submission['total_marks']), ('',))[0]
+                if 'total_marks' in submission else '',
         'status': submission['status'],
         'start_time': submission.get('start_time', '').isoformat() if submission.get('start_time') else None
     })
 
+@exam_bp.route('/leaderboard/<exam_id>', methods=['GET', 'OPTIONS'])
+@jwt_required(optional=True)
+def leaderboard(exam_id):
+    logger.info(f"Received {request.method} request to get leaderboard for exam {exam_id}")
+    if request.method == 'OPTIONS':
+        response = make_response()
+        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:4200')
+        response.headers.add('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        response.headers.add('Access-Control-Max-Age', '86400')
+        return response, 200
+
+    current_user = get_jwt_identity()
+    if not current_user:
+        return jsonify({'message': 'Missing authorization token'}), 401
+
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = min(int(request.args.get('limit', Config.LEADERBOARD_PAGE_SIZE)), Config.LEADERBOARD_PAGE_SIZE_MAX)
+    except ValueError:
+        return jsonify({'message': 'Invalid pagination parameters'}), 400
+    if offset < 0 or limit < 1:
+        return jsonify({'message': 'Invalid pagination parameters'}), 400
+
+    if current_user.get('role') in ['teacher', 'examiner']:
+        return jsonify(get_leaderboard(exam_id, offset, limit))
+
+    # Students see the distribution and their own standing, not other students
+    submission = submissions_collection.find_one(
+        {'exam_id': exam_id, 'user_email': current_user['email']},
+        {'total_marks': 1}
+    )
+    board = get_leaderboard(exam_id, total_marks=submission.get('total_marks') if submission else None)
+    board.pop('entries')
+    return jsonify(board)
+
+@exam_bp.route('/exam-analytics/<exam_id>', methods=['GET', 'OPTIONS'])
+@jwt_required(optional=True)
+def exam_analytics(exam_id):
+    logger.info(f"Received {request.method} request to get analytics for exam {exam_id}")
+    if request.method == 'OPTIONS':
+        response = make_response()
+        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:4200')
+        response.headers.add('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        response.headers.add('Access-Control-Max-Age', '86400')
+        return response, 200
+
+    current_user = get_jwt_identity()
+    if not current_user:
+        return jsonify({'message': 'Missing authorization token'}), 401
+    if current_user.get('role') not in ['teacher', 'examiner']:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    exam = exam_cache.get(exam_id)
+    if not exam or exam.get('created_by') != current_user['email']:
+        return jsonify({'message': 'Exam not found or unauthorized'}), 404
+    return jsonify(get_analytics(exam))
+
 @exam_bp.route('/get-student/<student_email>', methods=['GET', 'OPTIONS'])
 @jwt_required(optional=True)
 def get_student(student_email):
@@ -1,20 +1,23 @@
-from flask import Blueprint, request, jsonify, make_response
+from flask import Blueprint, Response, request, jsonify, make_response, send_file, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from services.ai_proctoring import start_proctoring, detect_malpractice
-from services.drive_service import upload_video
-from pymongo import MongoClient
+from services.proctoring_jobs import enqueue_proctoring_job
+from services.job_queue import get_job
+from services.mail_outbox import enqueue_mail
+from services.frame_ingest import end_session, get_session, save_segment, submit_batch
+from services.reports import REPORT_FORMATS, get_report
+from db import get_collection
 from config import Config
+from bson import ObjectId
+from bson.errors import InvalidId
 import datetime
-from flask_mail import Mail, Message
+import json
 import logging
+import os
 
 proctoring_bp = Blueprint('proctoring', __name__)
-client = MongoClient(Config.MONGO_URI)
-db = client['online_exam']
-proctoring_logs = db['proctoring_logs']
-submissions_collection = db['submissions']
-users_collection = db['users']
-mail = Mail()
+proctoring_logs = get_collection('proctoring_logs')
+submissions_collection = get_collection('submissions')
+users_collection = get_collection('users')
 
 logger = logging.getLogger(__name__)
 
@@ -38,25 +41,39 @@ def start_proctoring_route():
     if not submission or submission['status'] != 'in_progress':
         return jsonify({'message': 'No active exam session found'}), 400
 
-    file_path = start_proctoring(student_id, exam_id)
-    if not file_path:
-        return jsonify({'message': 'Failed to record proctoring session'}), 500
+    job_id = enqueue_proctoring_job(student_id, exam_id)
+    return jsonify({'message': 'Proctoring job queued', 'job_id': job_id}), 202
 
-    try:
-        file_id = upload_video(file_path, f'proctoring_{student_id}_{exam_id}.avi')
-        malpractice_detected = detect_malpractice(file_path, student_id, exam_id)
-        if malpractice_detected:
-            proctor = users_collection.find_one({'role': 'proctor'})
-            student = users_collection.find_one({'student_id': student_id})
-            if proctor and student:
-                msg = Message('Malpractice Alert', sender=Config.MAIL_USERNAME, recipients=[proctor['email'], student['email']])
-                msg.body = f'Malpractice detected for student {student_id} in exam {exam_id}. Please review.'
-                mail.send(msg)
-                logger.info(f"Malpractice alert sent for student {student_id}")
-        return jsonify({'message': 'Proctoring session recorded and uploaded', 'file_id': file_id})
-    except Exception as e:
-        logger.error(f"Proctoring failed: {str(e)}")
-        return jsonify({'message': 'Proctoring failed'}), 500
+@proctoring_bp.route('/proctoring-status/<job_id>', methods=['GET', 'OPTIONS'])
+@jwt_required()
+def get_proctoring_status(job_id):
+    if request.method == 'OPTIONS':
+        response = make_response()
+        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:4200')
+        response.headers.add('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        return response, 200
+    current_user = get_jwt_identity()
+    if current_user.get('role') != 'proctor':
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    job = get_job(job_id)
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    return jsonify({
+        'job_id': str(job['_id']),
+        'student_id': job['payload']['student_id'],
+        'exam_id': job['payload']['exam_id'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'stages_completed': job['stages_completed'],
+        'progress': job['progress'],
+        'result': {key: value for key, value in job['result'].items() if key != 'file_path'},
+        'timings': job['timings'],
+        'error': job['error'],
+        'created_at': job['created_at'].isoformat(),
+        'finished_at': job['finished_at'].isoformat() if job.get('finished_at') else None
+    }), 200
 
 @proctoring_bp.route('/log-malpractice', methods=['POST', 'OPTIONS'])
 @jwt_required()
@@ -92,7 +109,7 @@ def stop_exam(exam_id, student_id):
         return response, 200
     current_user = get_jwt_identity()
     if current_user.get('role') != 'proctor':
-        return jsonify({'message': 'Unauthorized'}), 谱
+        return jsonify({'message': 'Unauthorized'}), 403
 
     submission = submissions_collection.find_one({'exam_id': exam_id, 'student_id': student_id})
     if not submission or submission['status'] != 'in_progress':
@@ -106,12 +123,10 @@ def stop_exam(exam_id, student_id):
     try:
         student = users_collection.find_one({'student_id': student_id})
         if student:
-            msg = Message('Exam Terminated', sender=Config.MAIL_USERNAME, recipients=[student['email']])
-            msg.body = f'Your exam {exam_id} has been terminated due to malpractice.'
-            mail.send(msg)
-            logger.info(f"Termination email sent to student {student_id}")
+            enqueue_mail('Exam Terminated', [student['email']], f'Your exam {exam_id} has been terminated due to malpractice.')
+            logger.info(f"Termination email queued for student {student_id}")
     except Exception as e:
-        logger.error(f"Failed to send termination email: {str(e)}")
+        logger.error(f"Failed to queue termination email: {str(e)}")
 
     return jsonify({'message': 'Exam terminated successfully'})
 
@@ -129,20 +144,170 @@ def get_proctoring_logs():
     if current_user.get('role') != 'proctor':
         return jsonify({'message': 'Unauthorized'}), 403
 
-    logs = proctoring_logs.find()
-    result = [{
-        'student_id': log['student_id'],
-        'exam_id': log['exam_id'],
-        'event': log['event'],
-        'timestamp': log['timestamp'].isoformat()
-    } for log in logs]
-    return jsonify(result), 200
+    query = {}
+    for field in ('exam_id', 'student_id', 'event'):
+        if request.args.get(field):
+            query[field] = request.args[field]
+    try:
+        if request.args.get('since'):
+            query.setdefault('timestamp', {})['$gte'] = datetime.datetime.fromisoformat(request.args['since'])
+        if request.args.get('until'):
+            query.setdefault('timestamp', {})['$lt'] = datetime.datetime.fromisoformat(request.args['until'])
+        if request.args.get('cursor'):
+            query['_id'] = {'$gt': ObjectId(request.args['cursor'])}
+        limit = min(int(request.args.get('limit', Config.PROCTORING_LOGS_PAGE_SIZE)), Config.PROCTORING_LOGS_PAGE_SIZE_MAX)
+    except (ValueError, InvalidId):
+        return jsonify({'message': 'Invalid filter or pagination parameters'}), 400
+    if limit < 1:
+        return jsonify({'message': 'Invalid filter or pagination parameters'}), 400
+
+    # Logs are ordered by _id; the id of the last log of a page is the cursor
+    # for the next one. The body is streamed, so the page's end is looked up
+    # first (ids only) to send the cursor as a header, and the page is then
+    # bounded by it.
+    next_cursor = None
+    boundary = list(proctoring_logs.find(query, {'_id': 1}).sort('_id', 1).skip(limit - 1).limit(2))
+    if len(boundary) == 2:
+        next_cursor = boundary[0]['_id']
+        query['_id'] = {**query.get('_id', {}), '$lte': next_cursor}
+    logs = proctoring_logs.find(query, {'student_id': 1, 'exam_id': 1, 'event': 1, 'timestamp': 1, 'end': 1, 'count': 1}) \
+        .sort('_id', 1).limit(limit).batch_size(Config.PROCTORING_LOGS_BATCH_SIZE)
+    ndjson = request.args.get('format') == 'ndjson'
+
+    def serialize(log):
+        entry = {
+            'id': str(log['_id']),
+            'student_id': log['student_id'],
+            'exam_id': log['exam_id'],
+            'event': log['event'],
+            'timestamp': log['timestamp'].isoformat()
+        }
+        if 'end' in log:
+            entry['end'] = log['end'].isoformat()
+            entry['count'] = log['count']
+        return json.dumps(entry)
+
+    def generate():
+        if ndjson:
+            for log in logs:
+                yield serialize(log) + '\n'
+            return
+        separator = '['
+        for log in logs:
+            yield separator + serialize(log)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+
+    mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response, 200
+
+@proctoring_bp.route('/proctoring-frames/<exam_id>', methods=['POST', 'OPTIONS'])
+@jwt_required(optional=True)
+def ingest_frames(exam_id):
+    if request.method == 'OPTIONS':
+        response = make_response()
+        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:4200')
+        response.headers.add('Access-Control-Allow-Methods', 'POST, OPTIONS')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        return response, 200
+
+    current_user = get_jwt_identity()
+    if not current_user:
+        return jsonify({'message': 'Missing authorization token'}), 401
+    if current_user.get('role') != 'student':
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    # Multipart body: up to FRAME_BATCH_MAX JPEGs as 'frames', or one short
+    # video as 'segment'. 'timestamps' optionally gives each frame's capture
+    # time in epoch milliseconds, as a JSON list.
+    # The body is sized before it is parsed; the form fields add little
+    max_body = max(Config.FRAME_BATCH_MAX * Config.FRAME_MAX_BYTES, Config.FRAME_SEGMENT_MAX_BYTES) + 64 * 1024
+    if request.content_length is None:
+        return jsonify({'message': 'Content-Length required'}), 411
+    if request.content_length > max_body:
+        return jsonify({'message': f'Request body exceeds {max_body} bytes'}), 413
+    frames = request.files.getlist('frames')
+    segment = request.files.get('segment')
+    if bool(frames) == bool(segment):
+        return jsonify({'message': "Send either 'frames' or 'segment'"}), 400
+    if len(frames) > Config.FRAME_BATCH_MAX:
+        return jsonify({'message': f'At most {Config.FRAME_BATCH_MAX} frames per batch'}), 400
+    payloads = [frame.read(Config.FRAME_MAX_BYTES + 1) for frame in frames]
+    if any(len(payload) > Config.FRAME_MAX_BYTES for payload in payloads):
+        return jsonify({'message': f'Frames must be at most {Config.FRAME_MAX_BYTES} bytes'}), 413
+    if segment:
+        segment.stream.seek(0, os.SEEK_END)
+        if segment.stream.tell() > Config.FRAME_SEGMENT_MAX_BYTES:
+            return jsonify({'message': f'Segments must be at most {Config.FRAME_SEGMENT_MAX_BYTES} bytes'}), 413
+        segment.stream.seek(0)
+    timestamps = None
+    if request.form.get('timestamps'):
+        try:
+            timestamps = [datetime.datetime.fromtimestamp(float(ms) / 1000) for ms in json.loads(request.form['timestamps'])]
+        except (ValueError, TypeError, OverflowError, OSError):
+            return jsonify({'message': 'Invalid timestamps'}), 400
+
+    session = get_session(current_user.get('student_id'), exam_id)
+    if not session:
+        return jsonify({'message': 'No active exam session found'}), 400
+
+    if frames:
+        stats = submit_batch(session, 'frames', payloads, len(frames), timestamps)
+    else:
+        stats = submit_batch(session, 'segment', save_segment(segment), 0, timestamps)
+    # Dropped frames are not an error; a client seeing 'dropped' grow can send fewer
+    return jsonify(stats), 202
+
+@proctoring_bp.route('/proctoring-frames/<exam_id>/end', methods=['POST', 'OPTIONS'])
+@jwt_required(optional=True)
+def end_frame_ingestion(exam_id):
+    if request.method == 'OPTIONS':
+        response = make_response()
+        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:4200')
+        response.headers.add('Access-Control-Allow-Methods', 'POST, OPTIONS')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        return response, 200
+
+    current_user = get_jwt_identity()
+    if not current_user:
+        return jsonify({'message': 'Missing authorization token'}), 401
+    if current_user.get('role') != 'student':
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    stats = end_session(current_user.get('student_id'), exam_id)
+    if stats is None:
+        return jsonify({'message': 'No frame ingestion session found'}), 404
+    return jsonify(stats), 200
 
-@proctoring_bp.route('/download-report/<student_id>/<exam_id>', methods=['GET'])
+@proctoring_bp.route('/download-report/<student_id>/<exam_id>', methods=['GET', 'OPTIONS'])
+@jwt_required(optional=True)
 def download_report(student_id, exam_id):
-    filename = f"proctoring_report_{student_id}_{exam_id}.xml"
-    folder_path = os.path.dirname(os.path.abspath(__file__))  # Same folder as the script
-    try:
-        return send_from_directory(folder_path, filename, as_attachment=True)
-    except FileNotFoundError:
-        return {"error": "Report not found"}, 404
\ No newline at end of file
+    if request.method == 'OPTIONS':
+        response = make_response()
+        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:4200')
+        response.headers.add('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        return response, 200
+
+    current_user = get_jwt_identity()
+    if not current_user:
+        return jsonify({'message': 'Missing authorization token'}), 401
+    # Staff can read any report, a student only their own
+    if current_user.get('role') not in ['proctor', 'teacher', 'examiner'] and \
+            current_user.get('student_id') != student_id:
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    fmt = request.args.get('format', 'xml')
+    if fmt not in REPORT_FORMATS:
+        return jsonify({'message': 'Unsupported report format'}), 400
+    if not submissions_collection.find_one({'exam_id': exam_id, 'student_id': student_id}, {'_id': 1}):
+        return jsonify({'error': 'Report not found'}), 404
+
+    # Regenerated only when the session's logs have changed; send_file answers
+    # If-None-Match / If-Modified-Since with 304 and serves Range requests
+    path, fingerprint = get_report(student_id, exam_id, fmt)
+    return send_file(path, mimetype=REPORT_FORMATS[fmt][0], as_attachment=True,
+                     download_name=os.path.basename(path), etag=f'{fingerprint}-{fmt}', conditional=True)
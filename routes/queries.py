@@ -1,13 +1,10 @@
 from flask import Blueprint, request, jsonify, make_response
-from pymongo import MongoClient
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from config import Config
+from db import get_collection
 import datetime
 
 queries_bp = Blueprint('queries', __name__)
-client = MongoClient(Config.MONGO_URI)
-db = client['online_exam']
-queries_collection = db['queries']
+queries_collection = get_collection('queries')
 
 @queries_bp.route('/raise-query', methods=['POST', 'OPTIONS'])
 @jwt_required()
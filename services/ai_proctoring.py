@@ -1,23 +1,23 @@
-import cv2
 import numpy as np
 import logging
-from pymongo import MongoClient
 from config import Config
+from services.face_tracker import FACE_CASCADE_MODEL, FaceTracker
+from services.log_writer import log_writer
+from services.model_registry import get_model, opencv, register_model
+from services.recording import SegmentedRecorder
+from services.reports import MALPRACTICE_EVENT, generate_report
 import datetime
-import xml.etree.ElementTree as ET
+import time
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# MongoDB setup
-client = MongoClient(Config.MONGO_URI)
-db = client['online_exam']
-proctoring_logs = db['proctoring_logs']
+MALPRACTICE_MODEL = 'malpractice'
 
-# TensorFlow model setup
-model = None
-try:
+
+def _build_malpractice_model():
+    # TensorFlow is only imported here, by the first process that scores a video
     import tensorflow as tf
     logger.info(f"TensorFlow version: {tf.__version__}")
     model = tf.keras.Sequential([
@@ -29,110 +29,149 @@ try:
     ])
     model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
     logger.info("Malpractice detection model initialized successfully")
-except ImportError as e:
-    logger.error(f"Failed to import TensorFlow/Keras: {str(e)}")
-except Exception as e:
-    logger.error(f"Failed to initialize model: {str(e)}")
-
-def generate_proctoring_xml(student_id, exam_id, result, log_entries):
-    root = ET.Element("ProctoringReport")
-    
-    ET.SubElement(root, "StudentID").text = str(student_id)
-    ET.SubElement(root, "ExamID").text = str(exam_id)
-    ET.SubElement(root, "MalpracticeDetected").text = "Yes" if result else "No"
-
-    logs_elem = ET.SubElement(root, "Logs")
-    for entry in log_entries:
-        event_elem = ET.SubElement(logs_elem, "Event")
-        ET.SubElement(event_elem, "Timestamp").text = entry["timestamp"].isoformat()
-        ET.SubElement(event_elem, "Message").text = entry["event"]
-
-    tree = ET.ElementTree(root)
-    filename = f"proctoring_report_{student_id}_{exam_id}.xml"
-    tree.write(filename, encoding='utf-8', xml_declaration=True)
-    logger.info(f"XML report saved as {filename}")
-    return filename
+    return model
+
+
+register_model(MALPRACTICE_MODEL, _build_malpractice_model)
 
 def start_proctoring(student_id, exam_id):
+    # Records in segments that upload while recording continues; returns the
+    # recorder once every segment is closed
+    cv2 = opencv()
+
+    cap = None
+    recorder = None
     try:
         cap = cv2.VideoCapture(0)
         if not cap.isOpened():
             logger.error("Failed to open webcam")
             return None
 
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        out = cv2.VideoWriter(f'proctoring_{student_id}_{exam_id}.avi', fourcc, 20.0, (640, 480))
-
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        if face_cascade.empty():
+        face_cascade = get_model(FACE_CASCADE_MODEL)
+        if face_cascade is None:
             logger.error("Failed to load face cascade classifier")
-            cap.release()
             return None
 
+        recorder = SegmentedRecorder(student_id, exam_id)
+        tracker = FaceTracker(face_cascade, recorder.frame_size)
         while cap.isOpened():
             ret, frame = cap.read()
             if not ret:
                 break
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+            faces = tracker.detect(gray)
             if len(faces) == 0:
-                log = {
-                    'student_id': student_id,
-                    'exam_id': exam_id,
-                    'event': 'No face detected',
-                    'timestamp': datetime.datetime.now()
-                }
-                proctoring_logs.insert_one(log)
-            out.write(frame)
+                log_writer.log(student_id, exam_id, 'No face detected')
+            elif tracker.confirmed:
+                log_writer.end_event(student_id, exam_id, 'No face detected')
+            recorder.write(frame)
 
         cap.release()
-        out.release()
-        logger.info(f"Proctoring video saved for student {student_id}, exam {exam_id}")
-        return f'proctoring_{student_id}_{exam_id}.avi'
+        recorder.close()
+        log_writer.close_session(student_id, exam_id)
+        logger.info(f"Proctoring video saved for student {student_id}, exam {exam_id} "
+                    f"in {len(recorder.segments)} segments")
+        return recorder
     except Exception as e:
         logger.error(f"Proctoring failed: {str(e)}")
         return None
+    finally:
+        # Closing the recorder finishes the open segment, so what was recorded
+        # before a failure still uploads
+        if cap is not None:
+            cap.release()
+        if recorder is not None:
+            try:
+                recorder.close(wait=False)
+            except Exception as e:
+                logger.error(f"Failed to close recording {recorder.recording_id}: {str(e)}")
+
+def _preprocess_frame(frame):
+    cv2 = opencv()
+
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (64, 64))
+
+def detect_malpractice(file_paths, student_id, exam_id, sample_fps=None, batch_size=None):
+    # file_paths is one video or the ordered segments of a recording; frame
+    # indexes run on across segments
+    cv2 = opencv()
 
-def detect_malpractice(file_path, student_id, exam_id):
+    model = get_model(MALPRACTICE_MODEL)
     if not model:
         logger.warning("Malpractice detection model not available, skipping detection")
         return False
 
+    sample_fps = Config.MALPRACTICE_SAMPLE_FPS if sample_fps is None else sample_fps
+    batch_size = max(1, Config.MALPRACTICE_BATCH_SIZE if batch_size is None else batch_size)
+
+    if isinstance(file_paths, str):
+        file_paths = [file_paths]
+
     try:
-        cap = cv2.VideoCapture(file_path)
-        if not cap.isOpened():
-            logger.error(f"Failed to open video file {file_path}")
-            return False
+        detections = 0
+        batch = np.empty((batch_size, 64, 64, 1), dtype=np.float32)
+        batch_frames = []
+        frames_read = 0
+        frames_scored = 0
+        started = time.perf_counter()
+
+        def score_batch():
+            nonlocal detections
+            predictions = model.predict(batch[:len(batch_frames)], batch_size=batch_size, verbose=0)
+            for frame_index, prediction in zip(batch_frames, predictions):
+                if prediction[0] > 0.5:  # Threshold
+                    log_writer.log(student_id, exam_id, MALPRACTICE_EVENT, datetime.datetime.now(), frame=frame_index)
+                    detections += 1
+                else:
+                    log_writer.end_event(student_id, exam_id, MALPRACTICE_EVENT)
+            batch_frames.clear()
+
+        step = 1
+        for file_path in file_paths:
+            cap = cv2.VideoCapture(file_path)
+            if not cap.isOpened():
+                logger.error(f"Failed to open video file {file_path}")
+                return False
+
+            # Score every frame unless a sample rate below the video frame rate is requested
+            video_fps = cap.get(cv2.CAP_PROP_FPS) or 20.0
+            step = max(1, int(round(video_fps / sample_fps))) if sample_fps else 1
+
+            while cap.isOpened():
+                # grab() skips decoding for frames that are not sampled
+                if frames_read % step:
+                    if not cap.grab():
+                        break
+                    frames_read += 1
+                    continue
+                ret, frame = cap.read()
+                if not ret:
+                    break
+
+                batch[len(batch_frames), :, :, 0] = _preprocess_frame(frame) / 255.0
+                batch_frames.append(frames_read)
+                frames_read += 1
+                if len(batch_frames) == batch_size:
+                    frames_scored += batch_size
+                    score_batch()
 
-        malpractice_detected = False
-        logs = []
+            cap.release()
 
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
+        if batch_frames:
+            frames_scored += len(batch_frames)
+            score_batch()
 
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            resized = cv2.resize(gray, (64, 64))
-            input_data = resized.reshape(1, 64, 64, 1) / 255.0
-
-            prediction = model.predict(input_data, verbose=0)
-            if prediction[0][0] > 0.5:  # Threshold
-                log_entry = {
-                    'student_id': student_id,
-                    'exam_id': exam_id,
-                    'event': 'Suspicious activity detected',
-                    'timestamp': datetime.datetime.now()
-                }
-                proctoring_logs.insert_one(log_entry)
-                logs.append(log_entry)
-                malpractice_detected = True
+        log_writer.close_session(student_id, exam_id)
+        elapsed = time.perf_counter() - started
+        fps = frames_scored / elapsed if elapsed else 0.0
+        logger.info(f"Malpractice detection completed for {len(file_paths)} video(s): {frames_scored}/{frames_read} frames scored "
+                    f"in {elapsed:.2f}s ({fps:.1f} fps, batch size {batch_size}, step {step})")
 
-        cap.release()
-        logger.info(f"Malpractice detection completed for {file_path}")
+        malpractice_detected = detections > 0
 
-        # Generate XML report
-        generate_proctoring_xml(student_id, exam_id, malpractice_detected, logs)
+        # Written now so the first download is served from disk
+        generate_report(student_id, exam_id)
 
         return malpractice_detected
     except Exception as e:
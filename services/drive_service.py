@@ -1,7 +1,6 @@
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
 from config import Config
 
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
@@ -21,10 +20,3 @@ def get_drive_service():
         }, SCOPES)
         creds = flow.run_local_server(port=0)
     return build('drive', 'v3', credentials=creds)
-
-def upload_video(file_path, file_name):
-    service = get_drive_service()
-    file_metadata = {'name': file_name, 'parents': ['root']}
-    media = MediaFileUpload(file_path)
-    file = service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-    return file.get('id')
\ No newline at end of file
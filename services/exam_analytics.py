@@ -0,0 +1,250 @@
+from bson import ObjectId
+from config import Config
+from db import get_collection
+from pymongo.errors import DuplicateKeyError
+from flask import current_app
+from services.exam_cache import exam_cache
+from services.grading import NO_ANSWER, answer_matrix, correct_matrix, get_answer_key
+from services.job_queue import enqueue_job, jobs_collection, register_job, start_workers
+from services.question_bank import content_hash
+from services.question_order import option_index_base
+import datetime
+import hashlib
+import logging
+import math
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+analytics_collection = get_collection('exam_analytics')
+submissions_collection = get_collection('submissions')
+
+JOB_KIND = 'analytics'
+MAX_ATTEMPTS = 5
+
+# One document per exam holding running sums over its completed submissions:
+#   n, score_sum, score_sq_sum            over MCQ scores
+#   questions.<i>.attempted / correct     per canonical question
+#   questions.<i>.correct_score_sum       score total of students who got it right
+#   questions.<i>.options.<k>             how often option k was chosen
+#   questions.<i>.time_sum / time_count   seconds spent, from autosave timestamps
+#   questions_version                     the questions the sums are for
+#   version                               changes on every write
+# Every statistic is derived from these on read, so a graded submission is one
+# $inc. When the document is missing, is for other questions, or a regrade
+# changed the scores, a job recomputes it from the submissions and replaces it
+# only if no submission was added meanwhile (compare-and-set on version).
+
+
+def questions_version(exam):
+    digest = hashlib.sha256()
+    for question in exam['questions']:
+        digest.update(content_hash(question).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def answer_times(start_time, answered_at):
+    # Seconds spent per question: from the previous question's first answer
+    # (or the exam start) to this one's
+    events = sorted((time, int(question)) for question, time in (answered_at or {}).items() if time)
+    previous = start_time if isinstance(start_time, datetime.datetime) else None
+    times = {}
+    for time, question in events:
+        if previous is not None:
+            times[question] = max((time - previous).total_seconds(), 0.0)
+        previous = time
+    return times
+
+
+def attempted_matrix(key, answers_list):
+    # Any non-empty answer counts as an attempt, including subjective ones
+    attempted = np.zeros((len(answers_list), key.size), dtype=bool)
+    for row, answers in enumerate(answers_list):
+        for column, slot in enumerate((answers or [])[:key.size]):
+            attempted[row, column] = isinstance(slot, dict) and slot.get('answer') not in (None, '')
+    return attempted
+
+
+def submission_increments(key, submissions):
+    # The $inc that adds these submissions to a build
+    scores = np.array([float(submission.get('score') or 0) for submission in submissions])
+    answers_list = [submission.get('answers') for submission in submissions]
+    matrix = answer_matrix(key, answers_list)
+    right = correct_matrix(key, matrix)
+    attempted = attempted_matrix(key, answers_list).sum(axis=0)
+    correct = right.sum(axis=0)
+    correct_score_sum = (right * scores[:, None]).sum(axis=0)
+    increments = {
+        'n': len(submissions),
+        'score_sum': float(scores.sum()),
+        'score_sq_sum': float((scores * scores).sum())
+    }
+    for question in np.flatnonzero(attempted).tolist():
+        prefix = f'questions.{question}'
+        increments[f'{prefix}.attempted'] = int(attempted[question])
+        if correct[question]:
+            increments[f'{prefix}.correct'] = int(correct[question])
+            increments[f'{prefix}.correct_score_sum'] = float(correct_score_sum[question])
+    for question in np.flatnonzero(key.mcq).tolist():
+        column = matrix[:, question]
+        values, counts = np.unique(column[column != NO_ANSWER], return_counts=True)
+        for value, count in zip(values.tolist(), counts.tolist()):
+            increments[f'questions.{question}.options.{value}'] = count
+    for submission in submissions:
+        for question, seconds in answer_times(submission.get('start_time'), submission.get('answered_at')).items():
+            if question < key.size:
+                prefix = f'questions.{question}'
+                increments[f'{prefix}.time_sum'] = increments.get(f'{prefix}.time_sum', 0.0) + seconds
+                increments[f'{prefix}.time_count'] = increments.get(f'{prefix}.time_count', 0) + 1
+    return increments
+
+
+def record_submission(exam, submission):
+    # submission is the completed submission (answers, score, start_time and
+    # answered_at are used)
+    exam_id = str(exam['_id'])
+    increments = submission_increments(get_answer_key(exam), [submission])
+    result = analytics_collection.update_one(
+        {'_id': exam_id, 'questions_version': questions_version(exam)},
+        {'$inc': increments, '$set': {'version': ObjectId(), 'updated_at': datetime.datetime.utcnow()}}
+    )
+    if not result.matched_count:
+        # Missing or built for other questions: the rebuild includes this submission
+        schedule_rebuild(exam_id)
+
+
+def schedule_rebuild(exam_id):
+    # One queued rebuild per exam is enough; a running one may predate the
+    # change that asked for this, so it does not count
+    if jobs_collection.find_one({'kind': JOB_KIND, 'payload.exam_id': exam_id, 'status': 'queued'}, {'_id': 1}):
+        return None
+    start_workers(current_app._get_current_object())
+    return enqueue_job(JOB_KIND, {'exam_id': exam_id})
+
+
+def _sum_submissions(exam_id, key, submitted_at):
+    # Sums over the completed submissions matching submitted_at, a batch at a time
+    totals = {}
+
+    def add(batch):
+        for field, value in submission_increments(key, batch).items():
+            totals[field] = totals.get(field, 0) + value
+
+    batch = []
+    for submission in submissions_collection.find(
+        {'exam_id': exam_id, 'status': 'completed', 'submitted_at': submitted_at},
+        {'answers': 1, 'score': 1, 'start_time': 1, 'answered_at': 1}
+    ).batch_size(Config.REGRADE_BATCH_SIZE):
+        batch.append(submission)
+        if len(batch) == Config.REGRADE_BATCH_SIZE:
+            add(batch)
+            batch = []
+    if batch:
+        add(batch)
+    return totals
+
+
+def _document(totals):
+    # Dotted $inc paths to the nested document they address
+    doc = {'n': 0, 'score_sum': 0.0, 'score_sq_sum': 0.0, 'questions': {}}
+    for field, value in totals.items():
+        parent = doc
+        *path, name = field.split('.')
+        for part in path:
+            parent = parent.setdefault(part, {})
+        parent[name] = value
+    return doc
+
+
+def rebuild_analytics(exam):
+    # Submissions graded before the rebuild started are summed once; those
+    # graded since (whose $inc the replacement would discard) are summed again
+    # on every attempt, so a busy exam only ever repeats a short scan
+    exam_id = str(exam['_id'])
+    key = get_answer_key(exam)
+    started = datetime.datetime.utcnow()
+    totals = _sum_submissions(exam_id, key, {'$not': {'$gte': started}})
+    for _ in range(MAX_ATTEMPTS):
+        current = analytics_collection.find_one({'_id': exam_id}, {'version': 1})
+        combined = dict(totals)
+        for field, value in _sum_submissions(exam_id, key, {'$gte': started}).items():
+            combined[field] = combined.get(field, 0) + value
+        doc = _document(combined)
+        doc.update({'questions_version': questions_version(exam), 'version': ObjectId(),
+                    'updated_at': datetime.datetime.utcnow()})
+        if current is None:
+            try:
+                analytics_collection.insert_one({'_id': exam_id, **doc})
+            except DuplicateKeyError:
+                continue
+        elif not analytics_collection.replace_one({'_id': exam_id, 'version': current.get('version')}, doc).matched_count:
+            continue
+        logger.info(f"Rebuilt analytics for exam {exam_id} from {doc['n']} submissions")
+        return {'submissions': doc['n']}
+    logger.warning(f"Analytics for exam {exam_id} kept changing during the rebuild, trying again later")
+    schedule_rebuild(exam_id)
+    return {'submissions': None}
+
+
+def rebuild_stage(job):
+    exam = exam_cache.get(job['payload']['exam_id'])
+    if not exam:
+        return {'submissions': None}
+    return rebuild_analytics(exam)
+
+
+register_job(JOB_KIND, [('rebuild', rebuild_stage)])
+
+
+def _discrimination(n, score_sum, score_sq_sum, correct, correct_score_sum):
+    # Point-biserial correlation between getting the item right and the MCQ score
+    if n < 2 or correct in (0, n):
+        return None
+    variance = score_sq_sum / n - (score_sum / n) ** 2
+    if variance <= 1e-12:
+        return None
+    p = correct / n
+    mean_correct = correct_score_sum / correct
+    mean_incorrect = (score_sum - correct_score_sum) / (n - correct)
+    return round((mean_correct - mean_incorrect) / math.sqrt(variance) * math.sqrt(p * (1 - p)), 4)
+
+
+def get_analytics(exam):
+    exam_id = str(exam['_id'])
+    doc = analytics_collection.find_one({'_id': exam_id})
+    rebuilding = not doc or doc.get('questions_version') != questions_version(exam)
+    if rebuilding:
+        schedule_rebuild(exam_id)
+        doc = {}
+    base = option_index_base(exam)
+    n = doc.get('n', 0)
+    questions = []
+    for index, question in enumerate(exam['questions']):
+        stats = doc.get('questions', {}).get(str(index), {})
+        correct = stats.get('correct', 0)
+        item = {
+            'index': index,
+            'question': question['question'],
+            'type': question['type'],
+            'attempted': stats.get('attempted', 0),
+            'avg_time_seconds': round(stats['time_sum'] / stats['time_count'], 2) if stats.get('time_count') else None
+        }
+        if question['type'] == 'mcq':
+            item['correct'] = correct
+            item['correct_rate'] = round(correct / n, 4) if n else None
+            item['option_distribution'] = [
+                stats.get('options', {}).get(str(option + base), 0)
+                for option in range(len(question.get('options') or []))
+            ]
+            item['discrimination'] = _discrimination(
+                n, doc.get('score_sum', 0), doc.get('score_sq_sum', 0), correct, stats.get('correct_score_sum', 0)
+            )
+        questions.append(item)
+    return {
+        'exam_id': exam_id,
+        'submissions': n,
+        'mean_score': round(doc['score_sum'] / n, 4) if n else None,
+        'questions': questions,
+        'rebuilding': rebuilding,
+        'updated_at': doc.get('updated_at').isoformat() if doc.get('updated_at') else None
+    }
@@ -0,0 +1,108 @@
+from bson import ObjectId
+from collections import OrderedDict
+from pymongo.errors import PyMongoError
+from config import Config
+from db import get_collection
+from services.question_bank import resolve_questions
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+exams_collection = get_collection('exams')
+cache_versions = get_collection('cache_versions')
+
+VERSION_KEY = 'exams'
+
+
+class ExamCache:
+    # Bounded LRU of exam documents with a TTL. Edits bump a version stamp in
+    # Mongo; every worker polls it and drops its entries when it changes.
+    # Cached documents are shared between requests and must not be mutated.
+    def __init__(self, max_size=None, ttl=None, version_check_interval=None):
+        self.max_size = max_size or Config.EXAM_CACHE_SIZE
+        self.ttl = ttl or Config.EXAM_CACHE_TTL
+        self.version_check_interval = version_check_interval or Config.EXAM_CACHE_VERSION_CHECK_INTERVAL
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._version = None
+        self._version_checked_at = 0.0
+
+    def get(self, exam_id):
+        exam_id = str(exam_id)
+        self._check_version()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(exam_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(exam_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+        exam = exams_collection.find_one({'_id': ObjectId(exam_id)})
+        if exam:
+            # Cached with its questions resolved from the bank
+            resolve_questions([exam])
+            with self._lock:
+                # Skip the store if an invalidation ran while the document was loading
+                if generation == self._generation:
+                    self._entries[exam_id] = (now + self.ttl, exam)
+                    self._entries.move_to_end(exam_id)
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+        return exam
+
+    def invalidate(self, exam_id):
+        with self._lock:
+            self._entries.pop(str(exam_id), None)
+            self._generation += 1
+            self.invalidations += 1
+        try:
+            cache_versions.update_one({'_id': VERSION_KEY}, {'$inc': {'version': 1}}, upsert=True)
+        except PyMongoError as e:
+            logger.error(f"Failed to publish exam cache invalidation for {exam_id}: {str(e)}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+        try:
+            doc = cache_versions.find_one({'_id': VERSION_KEY})
+        except PyMongoError as e:
+            logger.error(f"Failed to read exam cache version: {str(e)}")
+            return
+        version = doc['version'] if doc else 0
+        if self._version is not None and version != self._version:
+            self.clear()
+        self._version = version
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'version': self._version
+            }
+
+
+exam_cache = ExamCache()
@@ -0,0 +1,112 @@
+from config import Config
+from services.model_registry import opencv, register_model
+import logging
+
+logger = logging.getLogger(__name__)
+
+FACE_CASCADE_MODEL = 'face_cascade'
+CASCADE_FILE = 'haarcascade_frontalface_default.xml'
+SCALE_FACTOR = 1.3
+MIN_NEIGHBORS = 5
+# Smallest window the frontal face cascade was trained on
+CASCADE_WINDOW = 24
+
+MODES = {'full', 'fast'}
+
+
+def load_face_cascade(path=None):
+    cv2 = opencv()
+
+    cascade = cv2.CascadeClassifier(path or cv2.data.haarcascades + CASCADE_FILE)
+    if cascade.empty():
+        return None
+    return cascade
+
+
+register_model(FACE_CASCADE_MODEL, load_face_cascade)
+
+
+class FaceTracker:
+    # Answers "is there a face in this frame" for the proctoring loop.
+    #
+    # 'full' runs the cascade over every full-resolution frame. 'fast' runs that
+    # same full-frame search every FACE_FULL_DETECTION_INTERVAL frames; in
+    # between it only searches a window around the last face found, limited to
+    # face sizes near the last one (and downscaled by FACE_DETECTION_SCALE, if
+    # below 1). If the window comes up empty the full-frame search runs, so "no
+    # face" is always decided by exactly the search 'full' mode does.
+    #
+    # A window hit is provisional (confirmed is False after it): it only keeps
+    # a face that a full search found present until the next full search. Only
+    # a confirmed face ends a no-face event, and the window search never runs
+    # while there is no face, so fast mode can start a no-face event up to
+    # interval - 1 frames late but never ends one early.
+    def __init__(self, cascade, frame_size=(640, 480), mode=None, scale=None, interval=None, margin=None):
+        self.cascade = cascade
+        self.mode = mode or Config.FACE_DETECTION_MODE
+        if self.mode not in MODES:
+            raise ValueError(f'Unknown FACE_DETECTION_MODE {self.mode!r}')
+        self.scale = min(1.0, scale or Config.FACE_DETECTION_SCALE)
+        self.interval = max(1, interval or Config.FACE_FULL_DETECTION_INTERVAL)
+        self.margin = Config.FACE_ROI_MARGIN if margin is None else margin
+        width, height = frame_size
+        # Bounds on the face sizes the window search looks for, in full-frame
+        # pixels, from how much of the frame a face can cover at this camera's
+        # nearest and furthest expected distance
+        self.min_size = int(Config.FACE_MIN_SIZE_RATIO * width)
+        self.max_size = max(self.min_size, int(Config.FACE_MAX_SIZE_RATIO * height))
+        self.last_face = None
+        self.frames_since_full = 0
+        self.confirmed = False
+        self.full_detections = 0
+        self.roi_detections = 0
+
+    def detect(self, gray):
+        # Returns the faces found as (x, y, w, h) in full-frame coordinates
+        faces = ()
+        if self.mode == 'fast' and self.last_face is not None and self.frames_since_full < self.interval:
+            faces = self._detect_roi(gray)
+        if len(faces):
+            self.frames_since_full += 1
+            self.confirmed = False
+        else:
+            faces = self._detect_full(gray)
+            self.frames_since_full = 0
+            self.confirmed = len(faces) > 0
+        self.last_face = tuple(int(v) for v in faces[0]) if len(faces) else None
+        return faces
+
+    def _detect_full(self, gray):
+        self.full_detections += 1
+        return self.cascade.detectMultiScale(gray, SCALE_FACTOR, MIN_NEIGHBORS)
+
+    def _detect_roi(self, gray):
+        cv2 = opencv()
+
+        self.roi_detections += 1
+        x, y, w, h = self.last_face
+        pad_x = int(w * self.margin)
+        pad_y = int(h * self.margin)
+        left = max(0, x - pad_x)
+        top = max(0, y - pad_y)
+        right = min(gray.shape[1], x + w + pad_x)
+        bottom = min(gray.shape[0], y + h + pad_y)
+        # The face can only have moved so far, or grown so much, since the last frame
+        min_size = max(self.min_size, int(min(w, h) / (1 + self.margin)))
+        max_size = min(self.max_size, int(max(w, h) * (1 + self.margin)))
+        if right - left < min_size or bottom - top < min_size or max_size < min_size:
+            return ()
+        # Downscale no further than keeps the smallest face the cascade window's size
+        scale = min(1.0, max(self.scale, CASCADE_WINDOW / max(min_size, 1)))
+        window = gray[top:bottom, left:right]
+        if scale < 1.0:
+            window = cv2.resize(window, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        faces = self.cascade.detectMultiScale(
+            window, SCALE_FACTOR, MIN_NEIGHBORS,
+            minSize=(max(CASCADE_WINDOW, int(min_size * scale)),) * 2,
+            maxSize=(max(CASCADE_WINDOW, int(max_size * scale)),) * 2
+        )
+        return [
+            (left + int(round(fx / scale)), top + int(round(fy / scale)), int(round(fw / scale)), int(round(fh / scale)))
+            for fx, fy, fw, fh in faces
+        ]
@@ -0,0 +1,77 @@
+from config import Config
+from services.face_tracker import FACE_CASCADE_MODEL, FaceTracker
+from services.model_registry import get_model, opencv
+import logging
+import numpy as np
+import os
+
+logger = logging.getLogger(__name__)
+
+# Runs inside the analysis pool processes. Each call receives one batch of a
+# session (JPEG frames or a short video segment) plus that session's tracker
+# state, and returns per-frame results for the parent to log.
+
+
+def _decode_jpegs(payloads):
+    cv2 = opencv()
+
+    frames = []
+    for payload in payloads:
+        frame = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+        frames.append(frame)
+    return frames
+
+
+def _read_segment(path):
+    cv2 = opencv()
+
+    frames = []
+    try:
+        cap = cv2.VideoCapture(path)
+        while cap.isOpened() and len(frames) < Config.FRAME_BATCH_MAX:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    finally:
+        os.remove(path)
+    return frames
+
+
+def analyze_batch(kind, data, tracker_state):
+    # Returns ([(position, face_present, face_confirmed, malpractice)],
+    # tracker_state); frames that fail to decode are left out, positions refer
+    # to the batch as sent
+    cv2 = opencv()
+    from services.ai_proctoring import MALPRACTICE_MODEL, _preprocess_frame
+
+    frames = _decode_jpegs(data) if kind == 'frames' else _read_segment(data)
+    decoded = [(position, frame) for position, frame in enumerate(frames) if frame is not None]
+    if not decoded:
+        return [], tracker_state
+
+    cascade = get_model(FACE_CASCADE_MODEL)
+    if cascade is None:
+        # Without it every frame would pass as having a face; failing counts
+        # the batch's frames as failed instead
+        raise RuntimeError('Face cascade classifier is not available')
+    height, width = decoded[0][1].shape[:2]
+    tracker = FaceTracker(cascade, (width, height))
+    if tracker_state:
+        tracker.last_face, tracker.frames_since_full = tracker_state
+
+    faces = []
+    for _, frame in decoded:
+        found = len(tracker.detect(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))) > 0
+        faces.append((found, tracker.confirmed))
+
+    malpractice = [False] * len(decoded)
+    model = get_model(MALPRACTICE_MODEL)
+    if model:
+        batch = np.stack([_preprocess_frame(frame) for _, frame in decoded])[..., None] / 255.0
+        predictions = model.predict(batch, batch_size=len(decoded), verbose=0)
+        malpractice = [bool(prediction[0] > 0.5) for prediction in predictions]
+
+    results = [(position, *face, flagged) for (position, _), face, flagged in zip(decoded, faces, malpractice)]
+    return results, (tracker.last_face, tracker.frames_since_full)
@@ -0,0 +1,272 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+from db import get_collection
+from services.frame_analysis import analyze_batch
+from services.log_writer import log_writer
+from services.reports import MALPRACTICE_EVENT, generate_report
+import datetime
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+submissions_collection = get_collection('submissions')
+
+NO_FACE_EVENT = 'No face detected'
+
+# Browsers post batches of frames (or short segments) per (student, exam)
+# session. Each session has at most one batch in the analysis pool at a time,
+# so its frames are analysed and logged in order and its face tracker state
+# can be handed from one batch to the next. Batches that arrive meanwhile wait
+# in a short per-session queue; when that is full the oldest waiting batch is
+# dropped, so a session that falls behind skips ahead to its newest frames.
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+_sessions = {}
+_sessions_pid = None
+_sessions_lock = threading.Lock()
+_swept_at = 0.0
+
+
+class IngestSession:
+    def __init__(self, student_id, exam_id):
+        self.student_id = student_id
+        self.exam_id = exam_id
+        # Reentrant: a batch that completes before add_done_callback returns
+        # runs its callback on the submitting thread
+        self.lock = threading.RLock()
+        self.queue = deque()
+        self.busy = False
+        self.closing = False
+        self.tracker_state = None
+        self.batches = 0
+        self.received = 0
+        self.analyzed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.checked_at = time.monotonic()
+        self.last_seen = self.checked_at
+
+    def stats(self):
+        return {
+            'received': self.received,
+            'analyzed': self.analyzed,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'queued': len(self.queue)
+        }
+
+
+def _get_pool():
+    # Spawned rather than forked: the app process runs background threads
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid() or getattr(_pool, '_broken', False):
+            workers = Config.FRAME_ANALYSIS_WORKERS or os.cpu_count() or 1
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+            logger.info(f"Started frame analysis pool with {workers} processes in process {_pool_pid}")
+        return _pool
+
+
+def _session_active(student_id, exam_id):
+    submission = submissions_collection.find_one(
+        {'exam_id': exam_id, 'student_id': student_id}, {'status': 1}
+    )
+    return bool(submission) and submission['status'] == 'in_progress'
+
+
+def _sessions_for_process():
+    global _sessions, _sessions_pid
+    if _sessions_pid != os.getpid():
+        _sessions = {}
+        _sessions_pid = os.getpid()
+    return _sessions
+
+
+def get_session(student_id, exam_id):
+    # Returns None unless the student has an exam in progress; that is checked
+    # again every FRAME_SESSION_CHECK_INTERVAL seconds, so a terminated exam
+    # stops accepting frames
+    now = time.monotonic()
+    _expire_idle(now)
+    key = (student_id, exam_id)
+    with _sessions_lock:
+        session = _sessions_for_process().get(key)
+    if session and now - session.checked_at < Config.FRAME_SESSION_CHECK_INTERVAL:
+        session.last_seen = now
+        return session
+    if not _session_active(student_id, exam_id):
+        if session:
+            end_session(student_id, exam_id)
+        return None
+    with _sessions_lock:
+        session = _sessions_for_process().setdefault(key, session or IngestSession(student_id, exam_id))
+    session.checked_at = now
+    session.last_seen = now
+    return session
+
+
+def submit_batch(session, kind, data, count, timestamps=None):
+    # kind is 'frames' (data: list of JPEG bytes, count their number) or
+    # 'segment' (data: path of a video file this module now owns, count 0).
+    # Returns the session's counters.
+    batch = {
+        'kind': kind,
+        'data': data,
+        'count': count,
+        'timestamps': timestamps,
+        'received_at': datetime.datetime.now()
+    }
+    with session.lock:
+        session.batches += 1
+        batch['seq'] = session.batches
+        session.received += count
+        session.queue.append(batch)
+        while len(session.queue) > Config.FRAME_SESSION_QUEUE:
+            _drop(session, session.queue.popleft())
+        _dispatch(session)
+        return session.stats()
+
+
+def _lost_frames(session, batch):
+    # Counts a batch that will never be analysed as received and returns its
+    # frame count. A segment's frames are only counted once decoded, so until
+    # then it stands for the most analyze_batch would read from it.
+    if batch['kind'] == 'frames':
+        return batch['count']
+    session.received += Config.FRAME_BATCH_MAX
+    return Config.FRAME_BATCH_MAX
+
+
+def _drop(session, batch):
+    session.dropped += _lost_frames(session, batch)
+    if batch['kind'] == 'segment':
+        try:
+            os.remove(batch['data'])
+        except OSError:
+            pass
+
+
+def _dispatch(session):
+    # Called with session.lock held
+    if session.busy or not session.queue:
+        return
+    batch = session.queue.popleft()
+    session.busy = True
+    try:
+        future = _get_pool().submit(analyze_batch, batch['kind'], batch['data'], session.tracker_state)
+    except Exception as e:
+        logger.error(f"Failed to submit frames for {session.student_id}/{session.exam_id}: {str(e)}")
+        session.busy = False
+        session.failed += _lost_frames(session, batch)
+        return
+    future.add_done_callback(lambda done: _complete(session, batch, done))
+
+
+def _timestamp(batch, position):
+    timestamps = batch['timestamps']
+    if timestamps and position < len(timestamps):
+        return timestamps[position]
+    return batch['received_at']
+
+
+def _complete(session, batch, future):
+    try:
+        results, tracker_state = future.result()
+    except Exception as e:
+        logger.error(f"Frame analysis failed for {session.student_id}/{session.exam_id}: {str(e)}")
+        results, tracker_state = None, session.tracker_state
+
+    if results is not None:
+        for position, face, confirmed, malpractice in results:
+            timestamp = _timestamp(batch, position)
+            if not face:
+                log_writer.log(session.student_id, session.exam_id, NO_FACE_EVENT, timestamp)
+            elif confirmed:
+                log_writer.end_event(session.student_id, session.exam_id, NO_FACE_EVENT)
+            if malpractice:
+                log_writer.log(session.student_id, session.exam_id, MALPRACTICE_EVENT, timestamp,
+                               batch=batch['seq'], frame=position)
+            else:
+                log_writer.end_event(session.student_id, session.exam_id, MALPRACTICE_EVENT)
+
+    with session.lock:
+        if results is None:
+            session.failed += _lost_frames(session, batch)
+        else:
+            if batch['kind'] == 'segment':
+                # A segment's frame count is only known once it is decoded
+                session.received += len(results)
+            session.analyzed += len(results)
+            session.failed += max(0, batch['count'] - len(results))
+        session.tracker_state = tracker_state
+        session.busy = False
+        _dispatch(session)
+        finished = session.closing and not session.busy
+    if finished:
+        _finish(session)
+
+
+def _finish(session):
+    log_writer.close_session(session.student_id, session.exam_id)
+    try:
+        generate_report(session.student_id, session.exam_id)
+    except Exception as e:
+        logger.error(f"Failed to write report for {session.student_id}/{session.exam_id}: {str(e)}")
+    logger.info(f"Frame ingestion ended for {session.student_id}/{session.exam_id}: {session.stats()}")
+
+
+def end_session(student_id, exam_id):
+    # Batches already queued are still analysed; the session's open events are
+    # closed and its report written once the last one is done
+    with _sessions_lock:
+        session = _sessions_for_process().pop((student_id, exam_id), None)
+    if not session:
+        return None
+    with session.lock:
+        session.closing = True
+        finished = not session.busy
+        stats = session.stats()
+    if finished:
+        _finish(session)
+    return stats
+
+
+def _expire_idle(now):
+    global _swept_at
+    if now - _swept_at < Config.FRAME_SESSION_IDLE_TIMEOUT / 10:
+        return
+    _swept_at = now
+    with _sessions_lock:
+        idle = [key for key, session in _sessions_for_process().items()
+                if now - session.last_seen > Config.FRAME_SESSION_IDLE_TIMEOUT]
+    for student_id, exam_id in idle:
+        logger.info(f"Ending idle frame ingestion session {student_id}/{exam_id}")
+        end_session(student_id, exam_id)
+
+
+def save_segment(stream):
+    directory = os.path.join(Config.RECORDING_DIR, 'ingest')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{uuid.uuid4().hex}.segment')
+    stream.save(path)
+    return path
+
+
+def ingest_stats():
+    with _sessions_lock:
+        sessions = list(_sessions_for_process().values())
+    totals = {'sessions': len(sessions), 'in_flight': sum(session.busy for session in sessions)}
+    for session in sessions:
+        for name, value in session.stats().items():
+            totals[name] = totals.get(name, 0) + value
+    return totals
@@ -0,0 +1,80 @@
+from collections import OrderedDict
+from config import Config
+import numpy as np
+import threading
+
+# Marks an unanswered or unparseable slot; never equal to a correct option
+NO_ANSWER = np.iinfo(np.int64).min
+MAX_ANSWER = np.iinfo(np.int64).max
+
+_answer_keys = OrderedDict()
+_answer_keys_lock = threading.Lock()
+
+
+class AnswerKey:
+    def __init__(self, questions):
+        self.size = len(questions)
+        self.mcq = np.array([q['type'] == 'mcq' for q in questions], dtype=bool)
+        self.correct = np.array([
+            q['correct_option'] if q['type'] == 'mcq' and isinstance(q.get('correct_option'), int) else NO_ANSWER
+            for q in questions
+        ], dtype=np.int64)
+        self.mcq &= self.correct != NO_ANSWER
+
+
+def parse_answer(slot):
+    # Mirrors the original rule: an int, or a string that int() accepts
+    if not isinstance(slot, dict):
+        return NO_ANSWER
+    answer = slot.get('answer')
+    if isinstance(answer, (int, str)):
+        try:
+            answer = int(answer)
+        except ValueError:
+            return NO_ANSWER
+        # Anything int64 cannot hold is no option either
+        if NO_ANSWER < answer <= MAX_ANSWER:
+            return answer
+    return NO_ANSWER
+
+
+def answer_matrix(key, answers_list):
+    matrix = np.full((len(answers_list), key.size), NO_ANSWER, dtype=np.int64)
+    for row, answers in enumerate(answers_list):
+        for column, slot in enumerate((answers or [])[:key.size]):
+            if slot:
+                matrix[row, column] = parse_answer(slot)
+    return matrix
+
+
+def correct_matrix(key, matrix):
+    return key.mcq & (matrix == key.correct)
+
+
+def score_batch(key, answers_list):
+    if not answers_list:
+        return np.zeros(0, dtype=np.int64)
+    return np.count_nonzero(correct_matrix(key, answer_matrix(key, answers_list)), axis=1)
+
+
+def get_answer_key(exam):
+    # Keys are compiled once per exam document; a new questions list (after an
+    # edit or cache refresh) compiles a new key
+    exam_id = str(exam['_id'])
+    questions = exam['questions']
+    with _answer_keys_lock:
+        entry = _answer_keys.get(exam_id)
+        if entry and entry[0] is questions:
+            _answer_keys.move_to_end(exam_id)
+            return entry[1]
+    key = AnswerKey(questions)
+    with _answer_keys_lock:
+        _answer_keys[exam_id] = (questions, key)
+        _answer_keys.move_to_end(exam_id)
+        while len(_answer_keys) > Config.ANSWER_KEY_CACHE_SIZE:
+            _answer_keys.popitem(last=False)
+    return key
+
+
+def grade_submission(exam, answers):
+    return int(score_batch(get_answer_key(exam), [answers])[0])
@@ -0,0 +1,242 @@
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import ReturnDocument
+from bson import ObjectId
+from config import Config
+from db import get_collection
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+jobs_collection = get_collection('proctoring_jobs')
+
+# Job kind -> ordered list of (stage name, handler). A handler receives the job
+# document and returns a dict that is merged into job['result']; a 'timings'
+# dict in it is merged into job['timings'] instead. In place of a handler a
+# stage can list (name, handler) pairs, which run concurrently and are timed
+# individually as well as together.
+_stages = {}
+_stage_threads = None
+_stage_threads_pid = None
+_stage_threads_lock = threading.Lock()
+_workers = []
+_workers_pid = None
+_workers_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+def register_job(kind, stages):
+    _stages[kind] = list(stages)
+
+
+def enqueue_job(kind, payload):
+    now = datetime.datetime.utcnow()
+    job = {
+        'kind': kind,
+        'payload': payload,
+        'status': 'queued',
+        'stage': None,
+        'stages_completed': [],
+        'progress': 0.0,
+        'result': {},
+        'timings': {},
+        'error': None,
+        'created_at': now,
+        'updated_at': now
+    }
+    job_id = jobs_collection.insert_one(job).inserted_id
+    _wakeup.set()
+    logger.info(f"Queued {kind} job {job_id}")
+    return str(job_id)
+
+
+def get_job(job_id):
+    return jobs_collection.find_one({'_id': ObjectId(job_id)})
+
+
+class StageError(Exception):
+    def __init__(self, name, error, elapsed, result=None, timings=None):
+        super().__init__(f'{name}: {str(error)}')
+        self.name = name
+        self.elapsed = elapsed
+        self.result = result or {}
+        self.timings = timings or {}
+
+
+def _get_stage_threads():
+    global _stage_threads, _stage_threads_pid
+    with _stage_threads_lock:
+        if _stage_threads is None or _stage_threads_pid != os.getpid():
+            _stage_threads = ThreadPoolExecutor(max_workers=Config.JOB_STAGE_THREADS, thread_name_prefix='job-stage')
+            _stage_threads_pid = os.getpid()
+        return _stage_threads
+
+
+def _timed(app, name, handler, job):
+    started = time.perf_counter()
+    try:
+        with app.app_context():
+            result = dict(handler(job) or {})
+    except Exception as e:
+        raise StageError(name, e, time.perf_counter() - started)
+    timings = result.pop('timings', {})
+    timings[name] = time.perf_counter() - started
+    return result, timings
+
+
+def _run_stage(app, name, handler, job):
+    # Returns (result, timings, completed stage names) or raises StageError
+    if not isinstance(handler, (list, tuple)):
+        result, timings = _timed(app, name, handler, job)
+        return result, timings, [name]
+
+    started = time.perf_counter()
+    futures = [(sub_name, _get_stage_threads().submit(_timed, app, sub_name, sub_handler, job))
+               for sub_name, sub_handler in handler]
+    result, timings, completed, errors = {}, {}, [], []
+    for sub_name, future in futures:
+        try:
+            sub_result, sub_timings = future.result()
+        except StageError as e:
+            timings[sub_name] = e.elapsed
+            errors.append(e)
+            continue
+        result.update(sub_result)
+        timings.update(sub_timings)
+        completed.append(sub_name)
+    timings[name] = time.perf_counter() - started
+    if errors:
+        # Substages that succeeded still record their results
+        raise StageError(name, errors[0], timings[name], result, timings)
+    return result, timings, completed + [name]
+
+
+def _claim_job(worker_name):
+    # A running job's worker refreshes updated_at every JOB_HEARTBEAT_INTERVAL;
+    # one whose worker died or was redeployed is picked up again once that
+    # stops for JOB_CLAIM_TIMEOUT
+    now = datetime.datetime.utcnow()
+    stale = now - datetime.timedelta(seconds=Config.JOB_CLAIM_TIMEOUT)
+    return jobs_collection.find_one_and_update(
+        {'kind': {'$in': list(_stages)}, '$or': [
+            {'status': 'queued'},
+            {'status': 'running', 'updated_at': {'$lt': stale}}
+        ]},
+        {'$set': {'status': 'running', 'worker': worker_name, 'started_at': now, 'updated_at': now},
+         '$inc': {'attempts': 1}},
+        sort=[('created_at', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _heartbeat(job_id, worker_name, stop):
+    while not stop.wait(Config.JOB_HEARTBEAT_INTERVAL):
+        try:
+            jobs_collection.update_one(
+                {'_id': job_id, 'status': 'running', 'worker': worker_name},
+                {'$set': {'updated_at': datetime.datetime.utcnow()}}
+            )
+        except Exception as e:
+            logger.error(f"Failed to refresh lease on job {job_id}: {str(e)}")
+
+
+def _fail_job(job, error):
+    jobs_collection.update_one(
+        {'_id': job['_id']},
+        {'$set': {'status': 'failed', 'error': error, 'finished_at': datetime.datetime.utcnow(),
+                  'updated_at': datetime.datetime.utcnow()}}
+    )
+
+
+def _run_job(app, job, worker_name=None):
+    if job.get('attempts', 1) > Config.JOB_MAX_ATTEMPTS:
+        logger.error(f"Job {job['_id']} abandoned after {Config.JOB_MAX_ATTEMPTS} attempts")
+        _fail_job(job, f"abandoned after {Config.JOB_MAX_ATTEMPTS} attempts")
+        return
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(job['_id'], job.get('worker', worker_name), stop),
+                     name=f"job-heartbeat-{job['_id']}", daemon=True).start()
+    try:
+        _run_stages(app, job)
+    finally:
+        stop.set()
+
+
+def _run_stages(app, job):
+    stages = _stages[job['kind']]
+    for index, (name, handler) in enumerate(stages):
+        # A reclaimed job resumes after the last stage it completed
+        if name in job['stages_completed']:
+            continue
+        jobs_collection.update_one(
+            {'_id': job['_id']},
+            {'$set': {'stage': name, 'updated_at': datetime.datetime.utcnow()}}
+        )
+        try:
+            result, timings, completed = _run_stage(app, name, handler, job)
+        except StageError as e:
+            logger.error(f"Job {job['_id']} failed in stage {e}")
+            update = {f'result.{key}': value for key, value in e.result.items()}
+            update.update({f'timings.{key}': value for key, value in e.timings.items()})
+            update.update({
+                'status': 'failed',
+                'error': str(e),
+                f'timings.{name}': e.elapsed,
+                'finished_at': datetime.datetime.utcnow(),
+                'updated_at': datetime.datetime.utcnow()
+            })
+            jobs_collection.update_one({'_id': job['_id']}, {'$set': update})
+            return
+        job['result'].update(result)
+        update = {f'result.{key}': value for key, value in result.items()}
+        update.update({f'timings.{key}': value for key, value in timings.items()})
+        update.update({
+            'progress': (index + 1) / len(stages),
+            'updated_at': datetime.datetime.utcnow()
+        })
+        jobs_collection.update_one(
+            {'_id': job['_id']},
+            {'$set': update, '$push': {'stages_completed': {'$each': completed}}}
+        )
+
+    jobs_collection.update_one(
+        {'_id': job['_id']},
+        {'$set': {'status': 'completed', 'stage': None, 'finished_at': datetime.datetime.utcnow(),
+                  'updated_at': datetime.datetime.utcnow()}}
+    )
+    logger.info(f"Job {job['_id']} completed")
+
+
+def _worker_loop(app, worker_name):
+    while True:
+        try:
+            job = _claim_job(worker_name)
+        except Exception as e:
+            logger.error(f"Job worker {worker_name} failed to poll queue: {str(e)}")
+            job = None
+        if job:
+            _run_job(app, job, worker_name)
+            continue
+        _wakeup.wait(Config.JOB_POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def start_workers(app, count=None):
+    # Threads do not survive a fork, so each worker process starts its own pool
+    global _workers, _workers_pid
+    with _workers_lock:
+        if _workers_pid == os.getpid():
+            return
+        count = Config.JOB_WORKERS if count is None else count
+        _workers = []
+        for i in range(count):
+            worker_name = f'{socket.gethostname()}:{os.getpid()}:{i}'
+            thread = threading.Thread(target=_worker_loop, args=(app, worker_name), name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            _workers.append(thread)
+        _workers_pid = os.getpid()
+        logger.info(f"Started {count} job workers in process {os.getpid()}")
@@ -0,0 +1,190 @@
+from bson import ObjectId
+from config import Config
+from db import get_collection
+from pymongo.errors import DuplicateKeyError
+import datetime
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+leaderboards_collection = get_collection('leaderboards')
+submissions_collection = get_collection('submissions')
+
+# One document per exam:
+#   entries       the top LEADERBOARD_TOP_N evaluated students, sorted by
+#                 total_marks (desc)
+#   scores        every evaluated student's current score, keyed by a digest of
+#                 their email (field names cannot contain '.')
+#   distribution  number of students per score, keyed by score in hundredths
+#   count         number of evaluated students
+#   version       changes on every write; updates are compare-and-set on it
+# Ranks and percentiles are derived from the distribution when read, so an
+# evaluation only rewrites the bounded top list and a few counters, in one
+# update. Pages beyond the top list are read from the submissions.
+
+MAX_ATTEMPTS = 10
+
+
+def score_key(total_marks):
+    return str(int(round(total_marks * 100)))
+
+
+def user_key(user_email):
+    return hashlib.sha1(user_email.encode('utf-8')).hexdigest()
+
+
+def _sort_key(entry):
+    return (-entry['total_marks'], entry['user_email'])
+
+
+def _ranked_submissions(exam_id, skip=0, limit=0, exclude=()):
+    query = {'exam_id': exam_id, 'total_marks': {'$exists': True}}
+    if exclude:
+        query['user_email'] = {'$nin': list(exclude)}
+    cursor = submissions_collection.find(query, {'user_email': 1, 'student_id': 1, 'total_marks': 1}) \
+        .sort([('total_marks', -1), ('user_email', 1)]).skip(skip).limit(limit)
+    return [
+        {'user_email': s['user_email'], 'student_id': s.get('student_id'), 'total_marks': s['total_marks']}
+        for s in cursor
+    ]
+
+
+def record_score(exam_id, user_email, student_id, total_marks):
+    # Replaces the student's previous score (if re-evaluated) in a single
+    # update, retried if another evaluation changed the document in between
+    key = user_key(user_email)
+    entry = {'user_email': user_email, 'student_id': student_id, 'total_marks': total_marks}
+    for _ in range(MAX_ATTEMPTS):
+        doc = leaderboards_collection.find_one({'_id': exam_id}, {'version': 1, 'entries': 1, 'count': 1, f'scores.{key}': 1})
+        if not doc:
+            try:
+                leaderboards_collection.insert_one({
+                    '_id': exam_id,
+                    'entries': [entry],
+                    'scores': {key: total_marks},
+                    'distribution': {score_key(total_marks): 1},
+                    'count': 1,
+                    'version': ObjectId(),
+                    'updated_at': datetime.datetime.utcnow()
+                })
+                return
+            except DuplicateKeyError:
+                continue
+
+        if 'version' not in doc:
+            # Written before scores were tracked per student
+            rebuild_leaderboard(exam_id)
+            continue
+
+        previous = doc.get('scores', {}).get(key)
+        count = doc.get('count', 0) + (previous is None)
+        increments = {f'distribution.{score_key(total_marks)}': 1}
+        if previous is not None:
+            old_key = f'distribution.{score_key(previous)}'
+            increments[old_key] = increments.get(old_key, 0) - 1
+
+        entries = [e for e in doc.get('entries', []) if e['user_email'] != user_email]
+        if len(entries) < len(doc.get('entries', [])) and count > Config.LEADERBOARD_TOP_N:
+            # The student was in a full top list and may now rank below someone
+            # outside it; the best of the rest (this student included, as the
+            # submission already holds the new score) fills the gap
+            entries.extend(_ranked_submissions(
+                exam_id, limit=Config.LEADERBOARD_TOP_N - len(entries), exclude=[e['user_email'] for e in entries]
+            ))
+        else:
+            entries.append(entry)
+        entries.sort(key=_sort_key)
+        entries = entries[:Config.LEADERBOARD_TOP_N]
+
+        result = leaderboards_collection.update_one(
+            {'_id': exam_id, 'version': doc.get('version')},
+            {
+                '$set': {'entries': entries, f'scores.{key}': total_marks, 'count': count,
+                         'version': ObjectId(), 'updated_at': datetime.datetime.utcnow()},
+                '$inc': increments
+            }
+        )
+        if result.matched_count:
+            return
+    logger.warning(f"Leaderboard for exam {exam_id} kept changing, rebuilding it")
+    rebuild_leaderboard(exam_id)
+
+
+def rebuild_leaderboard(exam_id):
+    # Full recompute from the submissions, for when many scores change at once (regrade)
+    scores = {}
+    distribution = {}
+    for submission in submissions_collection.find(
+        {'exam_id': exam_id, 'total_marks': {'$exists': True}},
+        {'user_email': 1, 'total_marks': 1}
+    ):
+        scores[user_key(submission['user_email'])] = submission['total_marks']
+        key = score_key(submission['total_marks'])
+        distribution[key] = distribution.get(key, 0) + 1
+    leaderboards_collection.replace_one(
+        {'_id': exam_id},
+        {
+            'entries': _ranked_submissions(exam_id, limit=Config.LEADERBOARD_TOP_N),
+            'scores': scores,
+            'distribution': distribution,
+            'count': len(scores),
+            'version': ObjectId(),
+            'updated_at': datetime.datetime.utcnow()
+        },
+        upsert=True
+    )
+
+
+def standings(distribution):
+    # score key -> (rank, percentile), competition ranking ("1224"); the
+    # percentile counts students below plus half of those tied
+    scores = sorted(((int(key), count) for key, count in (distribution or {}).items() if count > 0), reverse=True)
+    total = sum(count for _, count in scores)
+    above = 0
+    result = {}
+    for score, count in scores:
+        below = total - above - count
+        result[str(score)] = (above + 1, round(100 * (below + 0.5 * count) / total, 2))
+        above += count
+    return result
+
+
+def standings_by_exam(exam_ids):
+    # One query for all exams; only the score histograms are read
+    return {
+        doc['_id']: standings(doc.get('distribution'))
+        for doc in leaderboards_collection.find({'_id': {'$in': list(exam_ids)}}, {'distribution': 1})
+    }
+
+
+def get_leaderboard(exam_id, offset=0, limit=None, total_marks=None):
+    # Only the requested page of entries leaves the server; without a limit no
+    # entries are read. total_marks adds that score's standing to the result.
+    projection = {'distribution': 1, 'count': 1}
+    in_top = limit and offset + limit <= Config.LEADERBOARD_TOP_N
+    if in_top:
+        projection['entries'] = {'$slice': [offset, limit]}
+    doc = leaderboards_collection.find_one({'_id': exam_id}, projection) or {}
+    page = doc.get('entries', [])
+    if limit and not in_top:
+        page = _ranked_submissions(exam_id, skip=offset, limit=limit)
+    table = standings(doc.get('distribution'))
+    entries = []
+    for entry in page:
+        rank, percentile = table.get(score_key(entry['total_marks']), (None, None))
+        entries.append({**entry, 'rank': rank, 'percentile': percentile})
+    board = {
+        'exam_id': exam_id,
+        'count': doc.get('count', 0),
+        'distribution': [
+            {'score': int(key) / 100, 'count': count}
+            for key, count in sorted(doc.get('distribution', {}).items(), key=lambda item: int(item[0]))
+            if count > 0
+        ],
+        'entries': entries
+    }
+    if total_marks is not None:
+        rank, percentile = table.get(score_key(total_marks), (None, None))
+        board['standing'] = {'total_marks': total_marks, 'rank': rank, 'percentile': percentile}
+    return board
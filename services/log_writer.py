@@ -0,0 +1,112 @@
+from pymongo.errors import BulkWriteError
+from config import Config
+from db import get_collection
+import atexit
+import datetime
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+proctoring_logs = get_collection('proctoring_logs')
+
+
+class ProctoringLogWriter:
+    # Consecutive identical events for a session are merged into one interval
+    # document (start, end, count) and written in batches with insert_many.
+    def __init__(self, collection, flush_size=None, flush_interval=None, coalesce_gap=None):
+        self.collection = collection
+        self.flush_size = flush_size or Config.LOG_FLUSH_SIZE
+        self.flush_interval = flush_interval or Config.LOG_FLUSH_INTERVAL
+        self.coalesce_gap = datetime.timedelta(seconds=coalesce_gap or Config.LOG_COALESCE_GAP)
+        self.events_logged = 0
+        self.documents_written = 0
+        self._open = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher_pid = None
+
+    def log(self, student_id, exam_id, event, timestamp=None, **fields):
+        timestamp = timestamp or datetime.datetime.now()
+        key = (student_id, exam_id, event)
+        with self._lock:
+            self.events_logged += 1
+            current = self._open.get(key)
+            if current and timestamp - current['end'] <= self.coalesce_gap:
+                current['end'] = timestamp
+                current['count'] += 1
+            else:
+                if current:
+                    self._pending.append(current)
+                self._open[key] = dict(fields, student_id=student_id, exam_id=exam_id, event=event,
+                                       timestamp=timestamp, start=timestamp, end=timestamp, count=1)
+            full = len(self._pending) >= self.flush_size
+        self._ensure_flusher()
+        if full:
+            self.flush()
+
+    def end_event(self, student_id, exam_id, event):
+        with self._lock:
+            current = self._open.pop((student_id, exam_id, event), None)
+            if current:
+                self._pending.append(current)
+
+    def close_session(self, student_id, exam_id):
+        with self._lock:
+            for key in [key for key in self._open if key[:2] == (student_id, exam_id)]:
+                self._pending.append(self._open.pop(key))
+        self.flush()
+
+    def flush(self, close_all=False):
+        with self._flush_lock:
+            with self._lock:
+                cutoff = datetime.datetime.now() - self.coalesce_gap
+                for key, interval in list(self._open.items()):
+                    if close_all or interval['end'] < cutoff:
+                        self._pending.append(self._open.pop(key))
+                documents, self._pending = self._pending, []
+            if not documents:
+                return 0
+            # insert_many assigns _id to each document, so a retried batch only
+            # reports duplicate keys for documents that were already stored
+            try:
+                self.collection.insert_many(documents, ordered=False)
+                failed = []
+            except BulkWriteError as e:
+                failed = [documents[error['index']] for error in e.details['writeErrors'] if error['code'] != 11000]
+            except Exception as e:
+                logger.error(f"Failed to flush {len(documents)} proctoring logs: {str(e)}")
+                failed = documents
+            if failed:
+                with self._lock:
+                    self._pending[:0] = failed
+            written = len(documents) - len(failed)
+            self.documents_written += written
+            return written
+
+    def close(self):
+        self._stop.set()
+        self.flush(close_all=True)
+        logger.info(f"Proctoring log writer closed: {self.events_logged} events written as "
+                    f"{self.documents_written} documents")
+
+    def _ensure_flusher(self):
+        # The flush thread does not survive a fork, so start one per process
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='proctoring-log-writer', daemon=True).start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+
+log_writer = ProctoringLogWriter(proctoring_logs)
+atexit.register(log_writer.close)
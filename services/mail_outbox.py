@@ -0,0 +1,152 @@
+from flask import current_app
+from flask_mail import Mail, Message
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from collections import deque
+from config import Config
+from db import get_collection
+import datetime
+import logging
+import os
+import smtplib
+import socket
+import threading
+
+logger = logging.getLogger(__name__)
+
+outbox_collection = get_collection('mail_outbox')
+mail = Mail()
+
+_dispatcher_pid = None
+_dispatcher_lock = threading.Lock()
+_wakeup = threading.Event()
+_latencies = deque(maxlen=1000)
+_delivery_counts = {'sent': 0, 'retried': 0, 'failed': 0}
+
+
+def enqueue_mail(subject, recipients, body, sender=None):
+    now = datetime.datetime.utcnow()
+    message_id = outbox_collection.insert_one({
+        'subject': subject,
+        'recipients': list(recipients),
+        'body': body,
+        'sender': sender or Config.MAIL_USERNAME,
+        'status': 'pending',
+        'attempts': 0,
+        'next_attempt_at': now,
+        'created_at': now
+    }).inserted_id
+    # Whatever server imported the app, the process that queues mail sends it
+    start_dispatcher(current_app._get_current_object())
+    _wakeup.set()
+    return str(message_id)
+
+
+def _claim_batch(worker_name):
+    # Messages left in 'sending' by a worker that died are picked up again
+    now = datetime.datetime.utcnow()
+    stale = now - datetime.timedelta(seconds=Config.MAIL_CLAIM_TIMEOUT)
+    batch = []
+    while len(batch) < Config.MAIL_BATCH_SIZE:
+        message = outbox_collection.find_one_and_update(
+            {'$or': [
+                {'status': 'pending', 'next_attempt_at': {'$lte': now}},
+                {'status': 'sending', 'claimed_at': {'$lt': stale}}
+            ]},
+            {'$set': {'status': 'sending', 'claimed_by': worker_name, 'claimed_at': now}},
+            sort=[('next_attempt_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if not message:
+            break
+        batch.append(message)
+    return batch
+
+
+def _mark_sent(message):
+    now = datetime.datetime.utcnow()
+    outbox_collection.update_one(
+        {'_id': message['_id']},
+        {'$set': {'status': 'sent', 'sent_at': now}, '$inc': {'attempts': 1}, '$unset': {'error': ''}}
+    )
+    _latencies.append((now - message['created_at']).total_seconds())
+    _delivery_counts['sent'] += 1
+
+
+def _mark_failed(message, error):
+    attempts = message['attempts'] + 1
+    update = {'attempts': attempts, 'error': str(error)}
+    if attempts >= Config.MAIL_MAX_ATTEMPTS:
+        update['status'] = 'failed'
+        _delivery_counts['failed'] += 1
+        logger.error(f"Giving up on mail {message['_id']} after {attempts} attempts: {str(error)}")
+    else:
+        delay = min(Config.MAIL_RETRY_BACKOFF * 2 ** (attempts - 1), Config.MAIL_RETRY_BACKOFF_MAX)
+        update['status'] = 'pending'
+        update['next_attempt_at'] = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+        _delivery_counts['retried'] += 1
+        logger.warning(f"Mail {message['_id']} failed, retrying in {delay:.0f}s: {str(error)}")
+    outbox_collection.update_one({'_id': message['_id']}, {'$set': update})
+
+
+def _deliver(batch):
+    # One SMTP connection is reused for the whole batch. A message the server
+    # rejects is retried on its own; any other error retries the rest, which
+    # never includes a message the server already accepted.
+    delivered = 0
+    try:
+        with mail.connect() as connection:
+            for message in batch:
+                msg = Message(message['subject'], sender=message['sender'], recipients=message['recipients'])
+                msg.body = message['body']
+                try:
+                    connection.send(msg)
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                    delivered += 1
+                    _mark_failed(message, e)
+                    continue
+                delivered += 1
+                try:
+                    _mark_sent(message)
+                except PyMongoError as e:
+                    logger.error(f"Mail {message['_id']} was sent but could not be marked sent: {str(e)}")
+    except Exception as e:
+        for message in batch[delivered:]:
+            _mark_failed(message, e)
+
+
+def _dispatch_loop(app, worker_name):
+    while True:
+        try:
+            batch = _claim_batch(worker_name)
+            if batch:
+                with app.app_context():
+                    _deliver(batch)
+                continue
+        except PyMongoError as e:
+            logger.error(f"Mail dispatcher failed to poll outbox: {str(e)}")
+        _wakeup.wait(Config.MAIL_POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def start_dispatcher(app):
+    global _dispatcher_pid
+    with _dispatcher_lock:
+        if _dispatcher_pid == os.getpid():
+            return
+        worker_name = f'{socket.gethostname()}:{os.getpid()}'
+        threading.Thread(target=_dispatch_loop, args=(app, worker_name), name='mail-dispatcher', daemon=True).start()
+        _dispatcher_pid = os.getpid()
+        logger.info(f"Started mail dispatcher in process {os.getpid()}")
+
+
+def outbox_stats():
+    latencies = sorted(_latencies)
+    return {
+        'pending': outbox_collection.count_documents({'status': 'pending'}),
+        'sending': outbox_collection.count_documents({'status': 'sending'}),
+        'failed': outbox_collection.count_documents({'status': 'failed'}),
+        'delivered_by_this_process': dict(_delivery_counts),
+        'latency_avg_seconds': sum(latencies) / len(latencies) if latencies else None,
+        'latency_p95_seconds': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None
+    }
@@ -0,0 +1,69 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Heavy models (TensorFlow, OpenCV classifiers) are registered by name with a
+# loader and built the first time they are asked for, once per process. Workers
+# that never run proctoring code never import the ML stack.
+_loaders = {}
+_models = {}
+_models_pid = None
+_lock = threading.Lock()
+_cv2 = None
+
+
+def opencv():
+    # cv2 is imported on first use like the models, and cached here so per-frame
+    # code does not go through the import machinery every call
+    global _cv2
+    if _cv2 is None:
+        import cv2
+        _cv2 = cv2
+    return _cv2
+
+
+def register_model(name, loader):
+    _loaders[name] = loader
+
+
+def get_model(name):
+    # Returns None if the model cannot be built; the failure is remembered so
+    # each process only tries (and logs) once
+    global _models, _models_pid
+    with _lock:
+        if _models_pid != os.getpid():
+            _models = {}
+            _models_pid = os.getpid()
+        if name not in _models:
+            started = time.perf_counter()
+            try:
+                _models[name] = _loaders[name]()
+            except ImportError as e:
+                logger.error(f"Model {name} unavailable: {str(e)}")
+                _models[name] = None
+            except Exception as e:
+                logger.error(f"Failed to load model {name}: {str(e)}")
+                _models[name] = None
+            if _models[name] is not None:
+                logger.info(f"Loaded model {name} in {time.perf_counter() - started:.2f}s")
+        return _models[name]
+
+
+def warm_up(names=None):
+    # Builds the given models (all registered ones by default) ahead of the
+    # first request that needs them
+    names = list(_loaders) if names is None else names
+    for name in names:
+        if name not in _loaders:
+            logger.warning(f"Cannot warm up unknown model {name}")
+            continue
+        get_model(name)
+
+
+def loaded_models():
+    if _models_pid != os.getpid():
+        return []
+    return sorted(name for name, model in _models.items() if model is not None)
@@ -0,0 +1,100 @@
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+import bcrypt
+import logging
+import multiprocessing
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_slots = None
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _checkpw(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+def _get_executor():
+    # Spawned rather than forked: the app process runs background threads
+    global _executor, _executor_pid, _slots
+    with _executor_lock:
+        # A pool whose worker died is unusable, so it is replaced
+        if _executor is None or _executor_pid != os.getpid() or getattr(_executor, '_broken', False):
+            _executor = ProcessPoolExecutor(max_workers=Config.BCRYPT_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'))
+            _executor_pid = os.getpid()
+            _slots = threading.BoundedSemaphore(Config.BCRYPT_MAX_PENDING)
+            logger.info(f"Started bcrypt pool with {Config.BCRYPT_WORKERS} processes in process {_executor_pid}")
+        return _executor
+
+
+def _submit(fn, *args, wait=True):
+    # At most BCRYPT_MAX_PENDING hashes are queued or running per app process;
+    # callers wait up to BCRYPT_QUEUE_TIMEOUT for a slot before being turned away
+    executor = _get_executor()
+    slots = _slots
+    if not slots.acquire(timeout=Config.BCRYPT_QUEUE_TIMEOUT if wait else 0):
+        raise PasswordHasherBusy()
+    try:
+        future = executor.submit(fn, *args)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+def _to_bytes(value):
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+
+def hash_password(password):
+    return _submit(_hashpw, _to_bytes(password), Config.BCRYPT_ROUNDS).result()
+
+
+def check_password(password, hashed):
+    return _submit(_checkpw, _to_bytes(password), _to_bytes(hashed)).result()
+
+
+def needs_rehash(hashed):
+    try:
+        return int(_to_bytes(hashed).split(b'$')[2]) != Config.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+def rehash_password_async(password, callback):
+    # Best effort: skipped when the pool is saturated, retried on a later login
+    try:
+        future = _submit(_hashpw, _to_bytes(password), Config.BCRYPT_ROUNDS, wait=False)
+    except PasswordHasherBusy:
+        return None
+
+    def done(future):
+        try:
+            callback(future.result())
+        except Exception as e:
+            logger.error(f"Password rehash failed: {str(e)}")
+
+    future.add_done_callback(done)
+    return future
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None and _executor_pid == os.getpid():
+            _executor.shutdown()
+        _executor = None
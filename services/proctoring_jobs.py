@@ -0,0 +1,113 @@
+from services.ai_proctoring import start_proctoring, detect_malpractice
+from services.recording import finish_recording, remove_local_files
+from services.job_queue import register_job, enqueue_job, start_workers
+from services.mail_outbox import enqueue_mail
+from db import get_collection
+from bson import ObjectId
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+from flask import current_app
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+users_collection = get_collection('users')
+
+JOB_KIND = 'proctoring'
+
+# Detection runs in its own processes so model inference is not competing with
+# the app's threads (and the upload running next to it) for the GIL. The model
+# is loaded once per pool process.
+_detection_pool = None
+_detection_pool_pid = None
+_detection_pool_lock = threading.Lock()
+
+
+def _get_detection_pool():
+    # Spawned rather than forked: the app process runs background threads
+    global _detection_pool, _detection_pool_pid
+    with _detection_pool_lock:
+        if _detection_pool is None or _detection_pool_pid != os.getpid() or getattr(_detection_pool, '_broken', False):
+            workers = Config.DETECTION_WORKERS or max(Config.JOB_WORKERS, 1)
+            _detection_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _detection_pool_pid = os.getpid()
+            logger.info(f"Started detection pool with {workers} processes in process {_detection_pool_pid}")
+        return _detection_pool
+
+
+def _timed_detection(paths, student_id, exam_id):
+    started = time.perf_counter()
+    detected = detect_malpractice(paths, student_id, exam_id)
+    return detected, time.perf_counter() - started
+
+
+def record_stage(job):
+    payload = job['payload']
+    recorder = start_proctoring(payload['student_id'], payload['exam_id'])
+    if not recorder:
+        raise RuntimeError('Failed to record proctoring session')
+    return {
+        'recording_id': str(recorder.recording_id),
+        'segment_paths': [segment['file_path'] for segment in recorder.segments]
+    }
+
+
+def upload_stage(job):
+    # Segments were uploaded while recording; this retries any that failed and
+    # uploads the manifest, whose id becomes the job's file_id
+    file_id, segment_file_ids = finish_recording(ObjectId(job['result']['recording_id']))
+    return {'file_id': file_id, 'segment_file_ids': segment_file_ids}
+
+
+def detect_stage(job):
+    payload = job['payload']
+    result = job['result']
+    paths = result.get('segment_paths') or [result['file_path']]
+    started = time.perf_counter()
+    future = _get_detection_pool().submit(_timed_detection, paths, payload['student_id'], payload['exam_id'])
+    malpractice_detected, elapsed = future.result()
+    # Time spent waiting for a free detection process versus detecting
+    return {
+        'malpractice_detected': malpractice_detected,
+        'timings': {'detect_wait': time.perf_counter() - started - elapsed, 'detect_run': elapsed}
+    }
+
+
+def notify_stage(job):
+    if not job['result'].get('malpractice_detected'):
+        return {'notified': False}
+    student_id = job['payload']['student_id']
+    exam_id = job['payload']['exam_id']
+    proctor = users_collection.find_one({'role': 'proctor'})
+    student = users_collection.find_one({'student_id': student_id})
+    if not (proctor and student):
+        return {'notified': False}
+    body = f'Malpractice detected for student {student_id} in exam {exam_id}. Please review.'
+    if job['result'].get('file_id'):
+        body += f"\nRecording: {job['result']['file_id']}"
+    enqueue_mail('Malpractice Alert', [proctor['email'], student['email']], body)
+    logger.info(f"Malpractice alert queued for student {student_id}")
+    return {'notified': True}
+
+
+def cleanup_stage(job):
+    # Detection reads the local segments too, so they go only after both
+    return {'removed_segments': remove_local_files(ObjectId(job['result']['recording_id']))}
+
+
+register_job(JOB_KIND, [
+    ('record', record_stage),
+    # Upload and detection both only read the recorded segments
+    ('process', [('upload', upload_stage), ('detect', detect_stage)]),
+    ('cleanup', cleanup_stage),
+    ('notify', notify_stage)
+])
+
+
+def enqueue_proctoring_job(student_id, exam_id):
+    start_workers(current_app._get_current_object())
+    return enqueue_job(JOB_KIND, {'student_id': student_id, 'exam_id': exam_id})
@@ -0,0 +1,76 @@
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from db import get_collection
+import datetime
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+question_bank_collection = get_collection('question_bank')
+
+# Fields that make up a question's identity; anything else is bookkeeping
+QUESTION_FIELDS = ['question', 'type', 'options', 'correct_option', 'difficulty']
+# Stands in for a bank question that no longer exists; not an mcq, so never graded
+MISSING_QUESTION_TYPE = 'missing'
+
+
+def content_hash(question):
+    content = {field: question[field] for field in QUESTION_FIELDS if field in question}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def store_questions(questions, created_by):
+    # Questions are immutable and keyed by content, so storing a list that was
+    # already stored (in this or another exam) writes nothing new. Returns the
+    # ids in the order given.
+    if not questions:
+        return []
+    now = datetime.datetime.utcnow()
+    hashes = [content_hash(question) for question in questions]
+    operations = []
+    for question, question_hash in zip(questions, hashes):
+        document = {field: question[field] for field in QUESTION_FIELDS if field in question}
+        document.update({'content_hash': question_hash, 'created_by': created_by, 'created_at': now})
+        operations.append(UpdateOne({'content_hash': question_hash}, {'$setOnInsert': document}, upsert=True))
+    try:
+        question_bank_collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # Two uploads inserting the same new question race on the unique index;
+        # the loser's question already exists, which is all we need
+        if any(error['code'] != 11000 for error in e.details['writeErrors']):
+            raise
+    ids = {
+        doc['content_hash']: doc['_id']
+        for doc in question_bank_collection.find({'content_hash': {'$in': list(set(hashes))}}, {'content_hash': 1})
+    }
+    return [ids[question_hash] for question_hash in hashes]
+
+
+def resolve_questions(exams):
+    # Fills exam['questions'] for every exam that references the bank, with one
+    # query for all of them. Exams that still embed their questions are left as is.
+    question_ids = {question_id for exam in exams for question_id in exam.get('question_ids') or []}
+    if not question_ids:
+        return exams
+    questions = {}
+    for doc in question_bank_collection.find({'_id': {'$in': list(question_ids)}}):
+        questions[doc['_id']] = {
+            'question_id': str(doc['_id']),
+            **{field: doc[field] for field in QUESTION_FIELDS if field in doc}
+        }
+    for exam in exams:
+        if exam.get('question_ids') is None:
+            continue
+        missing = [question_id for question_id in exam['question_ids'] if question_id not in questions]
+        if missing:
+            logger.error(f"Exam {exam['_id']} references {len(missing)} missing bank questions")
+        # A missing question keeps its slot, so answers still line up with the
+        # questions after it
+        exam['questions'] = [
+            questions.get(question_id) or
+            {'question_id': str(question_id), 'question': None, 'type': MISSING_QUESTION_TYPE}
+            for question_id in exam['question_ids']
+        ]
+    return exams
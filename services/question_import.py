@@ -0,0 +1,120 @@
+import codecs
+import csv
+import json
+
+REQUIRED_COLUMNS = ['question', 'type', 'difficulty']
+MCQ_OPTION_COLUMNS = ['option1', 'option2', 'option3', 'option4']
+MAX_REPORTED_ERRORS = 50
+
+
+class QuestionImportError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(errors))
+
+
+def _question(fields, options=None):
+    # Same document shape the routes always stored
+    if not isinstance(fields.get('question'), str) or not fields['question'].strip():
+        raise ValueError('question is empty')
+    if not isinstance(fields.get('type'), str) or not fields['type']:
+        raise ValueError('type is missing')
+    if fields['type'].lower() != 'mcq':
+        return {'question': fields['question'], 'difficulty': fields.get('difficulty'), 'type': 'subjective'}
+    if options is None:
+        options = fields.get('options')
+    if not isinstance(options, list) or not options:
+        raise ValueError('mcq question has no options')
+    try:
+        correct_option = int(fields.get('correct_option'))
+    except (TypeError, ValueError):
+        raise ValueError(f"correct_option {fields.get('correct_option')!r} is not a number")
+    return {
+        'question': fields['question'],
+        'options': options,
+        'correct_option': correct_option,
+        'difficulty': fields.get('difficulty'),
+        'type': 'mcq'
+    }
+
+
+def iter_csv_questions(stream, errors):
+    # Decodes and parses the upload line by line, so memory use does not grow
+    # with the file. Bad rows are appended to errors and skipped; reading stops
+    # once MAX_REPORTED_ERRORS have been collected.
+    reader = csv.DictReader(codecs.iterdecode(stream, 'utf-8-sig'))
+    try:
+        fieldnames = reader.fieldnames
+    except (UnicodeDecodeError, csv.Error) as e:
+        errors.append(f'Header: {str(e)}')
+        return
+    if not fieldnames:
+        errors.append('CSV file is empty')
+        return
+    reader.fieldnames = [name.strip().lower() for name in fieldnames]
+    missing = [column for column in REQUIRED_COLUMNS if column not in reader.fieldnames]
+    if missing:
+        errors.append(f"Missing columns: {', '.join(missing)}")
+        return
+    rows = iter(reader)
+    while True:
+        try:
+            row = next(rows)
+        except StopIteration:
+            return
+        except (UnicodeDecodeError, csv.Error) as e:
+            errors.append(f'Row {reader.line_num + 1}: {str(e)}')
+            return
+        if not any(row.values()):
+            continue
+        try:
+            options = None
+            if (row.get('type') or '').lower() == 'mcq':
+                options = [row.get(column) for column in MCQ_OPTION_COLUMNS]
+                if any(option is None for option in options):
+                    raise ValueError(f"mcq question needs {', '.join(MCQ_OPTION_COLUMNS)}")
+            yield _question(row, options)
+        except ValueError as e:
+            errors.append(f'Row {reader.line_num}: {str(e)}')
+            if len(errors) >= MAX_REPORTED_ERRORS:
+                return
+
+
+def import_csv_questions(stream):
+    errors = []
+    questions = []
+    for question in iter_csv_questions(stream, errors):
+        if not errors:
+            questions.append(question)
+    if errors:
+        raise QuestionImportError(errors)
+    return questions
+
+
+def parse_manual_questions(raw_questions):
+    errors = []
+    questions = []
+    for number, raw in enumerate(raw_questions, start=1):
+        try:
+            fields = json.loads(raw)
+            if not isinstance(fields, dict):
+                raise ValueError('expected a JSON object')
+            questions.append(_question(fields))
+        except ValueError as e:
+            # json.JSONDecodeError is a ValueError
+            errors.append(f'Question {number}: {str(e)}')
+            if len(errors) >= MAX_REPORTED_ERRORS:
+                break
+    if errors:
+        raise QuestionImportError(errors)
+    return questions
+
+
+def import_questions(files, form):
+    # A .csv upload wins over manual questions, as before
+    csv_file = files.get('csv_file')
+    if csv_file:
+        if csv_file.filename.endswith('.csv'):
+            return import_csv_questions(csv_file.stream)
+        return []
+    return parse_manual_questions(form.getlist('questions[]'))
@@ -0,0 +1,113 @@
+from functools import lru_cache
+from config import Config
+from services.grading import NO_ANSWER, parse_answer
+import hashlib
+import random
+
+# Randomized exams are shown to each student in their own order: questions and
+# MCQ options are permuted by a generator seeded from (exam_id, student). The
+# permutation is recomputed on demand rather than stored, and submissions are
+# always kept in the exam's canonical order.
+
+
+@lru_cache(maxsize=Config.QUESTION_ORDER_CACHE_SIZE)
+def student_permutation(exam_id, student, option_counts):
+    seed = int.from_bytes(hashlib.sha256(f'{exam_id}:{student}'.encode('utf-8')).digest()[:8], 'big')
+    rng = random.Random(seed)
+    question_order = list(range(len(option_counts)))
+    rng.shuffle(question_order)
+    option_orders = []
+    for count in option_counts:
+        option_order = list(range(count))
+        rng.shuffle(option_order)
+        option_orders.append(tuple(option_order))
+    return tuple(question_order), tuple(option_orders)
+
+
+def _option_counts(questions):
+    return tuple(len(q.get('options') or []) if q.get('type') == 'mcq' else 0 for q in questions)
+
+
+def permutation_for(exam, student):
+    # None when the exam is shown in its canonical order
+    if not exam.get('randomized') or not student:
+        return None
+    return student_permutation(str(exam['_id']), student, _option_counts(exam['questions']))
+
+
+def option_index_base(exam):
+    # Exams stored before the base was recorded number their options from 0
+    return exam.get('option_index_base', 0)
+
+
+def _map_option(option, order, inverse, base):
+    # Translates an option index between presented and canonical positions,
+    # honouring the index base the exam's correct_option values use
+    if option == NO_ANSWER or not 0 <= option - base < len(order):
+        return None
+    position = option - base
+    return (order[position] if not inverse else order.index(position)) + base
+
+
+def present_questions(exam, student):
+    permutation = permutation_for(exam, student)
+    if permutation is None:
+        return exam['questions']
+    question_order, option_orders = permutation
+    presented = []
+    for canonical in question_order:
+        question = exam['questions'][canonical]
+        option_order = option_orders[canonical]
+        if option_order:
+            question = dict(question)
+            question['options'] = [question['options'][i] for i in option_order]
+            if isinstance(question.get('correct_option'), int):
+                question['correct_option'] = _map_option(question['correct_option'], option_order, True,
+                                                          option_index_base(exam))
+        presented.append(question)
+    return presented
+
+
+def _slot(slot, option_order, inverse, base):
+    if not option_order or not isinstance(slot, dict):
+        return slot
+    option = _map_option(parse_answer(slot), option_order, inverse, base)
+    if option is None:
+        return slot
+    return {**slot, 'answer': option}
+
+
+def to_canonical_slot(exam, position, slot, student):
+    # Maps one answer given at a presented position to (canonical position, slot)
+    permutation = permutation_for(exam, student)
+    if permutation is None:
+        return position, slot
+    question_order, option_orders = permutation
+    question = question_order[position]
+    return question, _slot(slot, option_orders[question], False, option_index_base(exam))
+
+
+def to_canonical_answers(exam, answers, student):
+    # answers[i] is the student's answer to the i-th question they were shown
+    permutation = permutation_for(exam, student)
+    if permutation is None or not answers:
+        return answers
+    question_order, option_orders = permutation
+    base = option_index_base(exam)
+    canonical = [None] * len(question_order)
+    for position, slot in enumerate(answers[:len(question_order)]):
+        question = question_order[position]
+        canonical[question] = _slot(slot, option_orders[question], False, base)
+    return canonical
+
+
+def to_presented_answers(exam, answers, student):
+    permutation = permutation_for(exam, student)
+    if permutation is None or not answers:
+        return answers
+    question_order, option_orders = permutation
+    base = option_index_base(exam)
+    return [
+        _slot(answers[question], option_orders[question], True, base) if question < len(answers) else None
+        for question in question_order
+    ]
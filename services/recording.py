@@ -0,0 +1,193 @@
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.utils import secure_filename
+from config import Config
+from db import get_collection
+from services.model_registry import opencv
+from services.storage import get_storage
+import datetime
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+recordings_collection = get_collection('recordings')
+
+# Segments are handed to these threads as soon as they are closed, so uploads
+# overlap with the rest of the recording
+_uploads = None
+_uploads_pid = None
+_uploads_lock = threading.Lock()
+
+
+def _get_uploads():
+    global _uploads, _uploads_pid
+    with _uploads_lock:
+        if _uploads is None or _uploads_pid != os.getpid():
+            _uploads = ThreadPoolExecutor(max_workers=Config.RECORDING_UPLOAD_WORKERS, thread_name_prefix='segment-upload')
+            _uploads_pid = os.getpid()
+        return _uploads
+
+
+def upload_segment(recording_id, segment):
+    # Uploads one segment and records the outcome in the manifest; a failed
+    # segment is retried by finish_recording
+    try:
+        file_id = get_storage().upload(segment['file_path'], segment['name'], mimetype='video/x-msvideo')
+    except Exception as e:
+        logger.error(f"Failed to upload segment {segment['name']}: {str(e)}")
+        recordings_collection.update_one(
+            {'_id': recording_id},
+            {'$set': {f"segments.{segment['index']}.status": 'failed', f"segments.{segment['index']}.error": str(e)}}
+        )
+        return None
+    recordings_collection.update_one(
+        {'_id': recording_id},
+        {'$set': {
+            f"segments.{segment['index']}.status": 'uploaded',
+            f"segments.{segment['index']}.file_id": file_id,
+            f"segments.{segment['index']}.uploaded_at": datetime.datetime.utcnow()
+        }, '$unset': {f"segments.{segment['index']}.error": ''}}
+    )
+    return file_id
+
+
+class SegmentedRecorder:
+    # Writes frames into fixed-length video segments. The manifest (one
+    # document in the recordings collection) lists the segments in order
+    # with their upload status and storage ids.
+    def __init__(self, student_id, exam_id, segment_seconds=None, fps=None, frame_size=(640, 480)):
+        self.student_id = student_id
+        self.exam_id = exam_id
+        self.fps = fps or Config.RECORDING_FPS
+        self.frame_size = frame_size
+        self.segment_frames = max(1, int((segment_seconds or Config.RECORDING_SEGMENT_SECONDS) * self.fps))
+        self.prefix = secure_filename(f'proctoring_{student_id}_{exam_id}')
+        self.directory = os.path.join(Config.RECORDING_DIR, self.prefix)
+        os.makedirs(self.directory, exist_ok=True)
+        self.recording_id = recordings_collection.insert_one({
+            'student_id': student_id,
+            'exam_id': exam_id,
+            'fps': self.fps,
+            'segment_frames': self.segment_frames,
+            'segments': [],
+            'status': 'recording',
+            'created_at': datetime.datetime.utcnow()
+        }).inserted_id
+        self.segments = []
+        self._futures = []
+        self._writer = None
+        self._segment = None
+        self.closed = False
+
+    def write(self, frame):
+        if self._writer is None:
+            self._open_segment()
+        self._writer.write(frame)
+        self._segment['frames'] += 1
+        if self._segment['frames'] >= self.segment_frames:
+            self._close_segment()
+
+    def _open_segment(self):
+        cv2 = opencv()
+
+        index = len(self.segments)
+        name = f'{self.prefix}_{self.recording_id}_{index:04d}.avi'
+        self._segment = {
+            'index': index,
+            'name': name,
+            'file_path': os.path.join(self.directory, name),
+            'frames': 0,
+            'started_at': datetime.datetime.utcnow(),
+            'status': 'recording'
+        }
+        self._writer = cv2.VideoWriter(self._segment['file_path'], cv2.VideoWriter_fourcc(*'XVID'), self.fps, self.frame_size)
+
+    def _close_segment(self):
+        self._writer.release()
+        self._writer = None
+        segment = dict(self._segment, ended_at=datetime.datetime.utcnow(), status='uploading')
+        self._segment = None
+        self.segments.append(segment)
+        recordings_collection.update_one({'_id': self.recording_id}, {'$push': {'segments': segment}})
+        self._futures.append(_get_uploads().submit(upload_segment, self.recording_id, segment))
+
+    def close(self, wait=True):
+        if self.closed:
+            return self.recording_id
+        if self._writer is not None:
+            self._close_segment()
+        recordings_collection.update_one({'_id': self.recording_id}, {'$set': {'status': 'recorded'}})
+        self.closed = True
+        if wait:
+            for future in self._futures:
+                future.result()
+        return self.recording_id
+
+
+def get_recording(recording_id):
+    return recordings_collection.find_one({'_id': recording_id})
+
+
+def finish_recording(recording_id):
+    # Retries segments whose upload failed (resuming where possible), then
+    # stores the manifest itself next to the segments
+    recording = get_recording(recording_id)
+    for segment in recording['segments']:
+        if segment.get('status') != 'uploaded':
+            if not upload_segment(recording_id, segment):
+                raise RuntimeError(f"Segment {segment['name']} could not be uploaded")
+    recording = get_recording(recording_id)
+    manifest = {
+        'recording_id': str(recording_id),
+        'student_id': recording['student_id'],
+        'exam_id': recording['exam_id'],
+        'fps': recording['fps'],
+        'segments': [{
+            'index': segment['index'],
+            'name': segment['name'],
+            'file_id': segment['file_id'],
+            'frames': segment['frames'],
+            'started_at': segment['started_at'].isoformat(),
+            'ended_at': segment['ended_at'].isoformat()
+        } for segment in recording['segments']]
+    }
+    prefix = secure_filename(f"proctoring_{recording['student_id']}_{recording['exam_id']}")
+    manifest_name = f'{prefix}_{recording_id}_manifest.json'
+    manifest_path = os.path.join(Config.RECORDING_DIR, manifest_name)
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+    manifest_file_id = get_storage().upload(manifest_path, manifest_name, mimetype='application/json')
+    _remove(manifest_path, manifest_file_id)
+    recordings_collection.update_one(
+        {'_id': recording_id},
+        {'$set': {'status': 'uploaded', 'manifest_file_id': manifest_file_id, 'uploaded_at': datetime.datetime.utcnow()}}
+    )
+    return manifest_file_id, [segment['file_id'] for segment in recording['segments']]
+
+
+def _remove(path, file_id):
+    # The local backend's file_id is the stored copy's path, which must survive
+    if os.path.abspath(path) == os.path.abspath(str(file_id)):
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def remove_local_files(recording_id):
+    # Deletes the recorded segments once the storage backend holds them all
+    recording = get_recording(recording_id)
+    if not recording or recording.get('status') != 'uploaded':
+        return 0
+    for segment in recording['segments']:
+        _remove(segment['file_path'], segment['file_id'])
+    if recording['segments']:
+        try:
+            os.rmdir(os.path.dirname(recording['segments'][0]['file_path']))
+        except OSError:
+            # Another recording of the same student and exam is still there
+            pass
+    return len(recording['segments'])
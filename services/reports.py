@@ -0,0 +1,133 @@
+from xml.sax.saxutils import XMLGenerator
+from werkzeug.utils import secure_filename
+from config import Config
+from db import get_collection
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+proctoring_logs = get_collection('proctoring_logs')
+
+REPORT_FORMATS = {
+    'xml': ('application/xml', '.xml'),
+    'json': ('application/json', '.json')
+}
+MALPRACTICE_EVENT = 'Suspicious activity detected'
+LOG_FIELDS = {'event': 1, 'timestamp': 1, 'end': 1, 'count': 1}
+
+
+def report_fingerprint(student_id, exam_id):
+    # Proctoring logs are only ever inserted, so the newest id and the count
+    # change whenever a session's logs do. Both are answered from the
+    # (exam_id, student_id, _id) index.
+    query = {'exam_id': exam_id, 'student_id': student_id}
+    latest = proctoring_logs.find_one(query, {'_id': 1}, sort=[('_id', -1)])
+    count = proctoring_logs.count_documents(query)
+    return f"{latest['_id'] if latest else 'none'}-{count}"
+
+
+def report_path(student_id, exam_id, fmt):
+    # secure_filename drops characters such as '@', so a digest of the raw ids
+    # keeps distinct sessions from sharing a file
+    digest = hashlib.sha1(f'{student_id}:{exam_id}'.encode('utf-8')).hexdigest()[:10]
+    filename = secure_filename(f'proctoring_report_{student_id}_{exam_id}_{digest}') + REPORT_FORMATS[fmt][1]
+    return os.path.join(Config.REPORT_DIR, filename)
+
+
+def _session_logs(student_id, exam_id):
+    return proctoring_logs.find({'exam_id': exam_id, 'student_id': student_id}, LOG_FIELDS) \
+        .sort('_id', 1).batch_size(Config.PROCTORING_LOGS_BATCH_SIZE)
+
+
+def _text_element(xml, name, text):
+    xml.startElement(name, {})
+    xml.characters(text)
+    xml.endElement(name)
+
+
+def _write_xml(f, student_id, exam_id, malpractice_detected, logs):
+    xml = XMLGenerator(f, encoding='utf-8', short_empty_elements=True)
+    xml.startDocument()
+    xml.startElement('ProctoringReport', {})
+    _text_element(xml, 'StudentID', str(student_id))
+    _text_element(xml, 'ExamID', str(exam_id))
+    _text_element(xml, 'MalpracticeDetected', 'Yes' if malpractice_detected else 'No')
+    xml.startElement('Logs', {})
+    for log in logs:
+        xml.startElement('Event', {})
+        _text_element(xml, 'Timestamp', log['timestamp'].isoformat())
+        _text_element(xml, 'Message', log['event'])
+        if 'end' in log:
+            _text_element(xml, 'End', log['end'].isoformat())
+            _text_element(xml, 'Count', str(log['count']))
+        xml.endElement('Event')
+    xml.endElement('Logs')
+    xml.endElement('ProctoringReport')
+    xml.endDocument()
+
+
+def _write_json(f, student_id, exam_id, malpractice_detected, logs):
+    header = json.dumps({'student_id': student_id, 'exam_id': exam_id, 'malpractice_detected': malpractice_detected})
+    f.write((header[:-1] + ', "logs": [').encode('utf-8'))
+    separator = ''
+    for log in logs:
+        entry = {'timestamp': log['timestamp'].isoformat(), 'event': log['event']}
+        if 'end' in log:
+            entry['end'] = log['end'].isoformat()
+            entry['count'] = log['count']
+        f.write((separator + json.dumps(entry)).encode('utf-8'))
+        separator = ', '
+    f.write(b']}')
+
+
+WRITERS = {'xml': _write_xml, 'json': _write_json}
+
+
+def _read_fingerprint(path):
+    try:
+        with open(path + '.fingerprint') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _replace(path, write):
+    # Written beside the target and renamed into place, so a download never
+    # sees a half-written report
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def generate_report(student_id, exam_id, fmt='xml', fingerprint=None):
+    # Streams the session's logs from a cursor into the file, so memory use
+    # does not depend on the session length
+    fingerprint = fingerprint or report_fingerprint(student_id, exam_id)
+    path = report_path(student_id, exam_id, fmt)
+    os.makedirs(Config.REPORT_DIR, exist_ok=True)
+    malpractice_detected = proctoring_logs.find_one(
+        {'exam_id': exam_id, 'student_id': student_id, 'event': MALPRACTICE_EVENT}, {'_id': 1}
+    ) is not None
+    _replace(path, lambda f: WRITERS[fmt](f, student_id, exam_id, malpractice_detected, _session_logs(student_id, exam_id)))
+    _replace(path + '.fingerprint', lambda f: f.write(fingerprint.encode('utf-8')))
+    logger.info(f"{fmt.upper()} report saved as {path}")
+    return path
+
+
+def get_report(student_id, exam_id, fmt='xml'):
+    # Returns (path, fingerprint); the stored report is reused until the
+    # session's logs change
+    fingerprint = report_fingerprint(student_id, exam_id)
+    path = report_path(student_id, exam_id, fmt)
+    if not os.path.exists(path) or _read_fingerprint(path) != fingerprint:
+        generate_report(student_id, exam_id, fmt, fingerprint)
+    return path, fingerprint
@@ -0,0 +1,79 @@
+from config import Config
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class LocalStorage:
+    # Copies files under a root directory in chunks. An interrupted upload
+    # leaves a .part file that the next attempt continues from.
+    def __init__(self, root=None, chunk_size=None):
+        self.root = root or Config.LOCAL_STORAGE_DIR
+        self.chunk_size = chunk_size or Config.UPLOAD_CHUNK_SIZE
+
+    def upload(self, file_path, name, mimetype=None, on_progress=None):
+        os.makedirs(self.root, exist_ok=True)
+        target = os.path.join(self.root, name)
+        partial = target + '.part'
+        total = os.path.getsize(file_path)
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        if offset > total:
+            offset = 0
+        with open(file_path, 'rb') as source, open(partial, 'ab' if offset else 'wb') as sink:
+            source.seek(offset)
+            while True:
+                chunk = source.read(self.chunk_size)
+                if not chunk:
+                    break
+                sink.write(chunk)
+                offset += len(chunk)
+                if on_progress:
+                    on_progress(offset, total)
+        os.replace(partial, target)
+        return target
+
+
+class DriveStorage:
+    # Google Drive resumable uploads, sent in UPLOAD_CHUNK_SIZE pieces. A failed
+    # chunk is retried (with backoff) from the last byte Drive acknowledged.
+    def __init__(self, chunk_size=None, max_retries=None, folder_id='root'):
+        # Drive requires chunks in multiples of 256 KiB
+        self.chunk_size = max(256 * 1024, (chunk_size or Config.UPLOAD_CHUNK_SIZE) // (256 * 1024) * 256 * 1024)
+        self.max_retries = Config.UPLOAD_MAX_RETRIES if max_retries is None else max_retries
+        self.folder_id = folder_id
+
+    def upload(self, file_path, name, mimetype=None, on_progress=None):
+        from googleapiclient.http import MediaFileUpload
+        from services.drive_service import get_drive_service
+
+        media = MediaFileUpload(file_path, mimetype=mimetype, chunksize=self.chunk_size, resumable=True)
+        request = get_drive_service().files().create(
+            body={'name': name, 'parents': [self.folder_id]}, media_body=media, fields='id'
+        )
+        response = None
+        while response is None:
+            status, response = request.next_chunk(num_retries=self.max_retries)
+            if status and on_progress:
+                on_progress(status.resumable_progress, status.total_size)
+        return response.get('id')
+
+
+BACKENDS = {
+    'local': LocalStorage,
+    'drive': DriveStorage
+}
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if Config.RECORDING_STORAGE not in BACKENDS:
+                raise ValueError(f'Unknown RECORDING_STORAGE {Config.RECORDING_STORAGE!r}')
+            _storage = BACKENDS[Config.RECORDING_STORAGE]()
+        return _storage
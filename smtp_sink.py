@@ -0,0 +1,70 @@
+import argparse
+import socketserver
+import sys
+
+# Minimal SMTP server that accepts every message and prints it. Point the app
+# at it with MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=False.
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode('utf-8'))
+
+    def handle(self):
+        self.reply('220 smtp-sink ready')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb in ('HELO', 'EHLO'):
+                self.reply('250 smtp-sink')
+            elif verb == 'MAIL':
+                sender, recipients = command[10:].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command[8:].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                body = []
+                for data_line in iter(self.rfile.readline, b''):
+                    if data_line.rstrip(b'\r\n') == b'.':
+                        break
+                    body.append(data_line.decode('utf-8', 'replace'))
+                self.server.messages += 1
+                print(f'--- message {self.server.messages} from {sender} to {", ".join(recipients)}')
+                print(''.join(body), flush=True)
+                self.reply('250 OK: queued')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    messages = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local SMTP sink for testing outgoing mail')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=1025)
+    args = parser.parse_args()
+    with SMTPSink((args.host, args.port), SMTPSinkHandler) as server:
+        print(f'SMTP sink listening on {args.host}:{args.port}', flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
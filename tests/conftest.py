@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    # Module-level collections resolve through db.get_client on each access,
+    # so pointing it at an in-memory client backs them all
+    mongomock = pytest.importorskip('mongomock')
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(db, '_client', client)
+    monkeypatch.setattr(db, '_client_pid', os.getpid())
+    return client[db.Config.MONGO_DB_NAME]
+
+
+@pytest.fixture
+def mcq():
+    def make(correct_option, options=('a', 'b', 'c', 'd'), **fields):
+        return {'question': 'Q', 'type': 'mcq', 'options': list(options), 'correct_option': correct_option,
+                'difficulty': 'easy', **fields}
+    return make
+
+
+@pytest.fixture
+def make_exam():
+    def make(questions, exam_id='exam-1', **fields):
+        return {'_id': exam_id, 'questions': questions, **fields}
+    return make
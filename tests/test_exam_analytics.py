@@ -0,0 +1,114 @@
+import datetime
+
+import pytest
+
+from services import exam_analytics
+
+
+@pytest.fixture
+def exam(make_exam, mcq):
+    return make_exam([mcq(1), mcq(2), {'question': 'Essay', 'type': 'subjective'}])
+
+
+@pytest.fixture
+def scheduled(monkeypatch):
+    # Exam ids a rebuild was scheduled for, instead of queueing a job
+    exam_ids = []
+    monkeypatch.setattr(exam_analytics, 'schedule_rebuild', exam_ids.append)
+    return exam_ids
+
+
+@pytest.fixture
+def submit(mongo, exam):
+    # Stores a completed submission, as submit_exam does, without recording it
+    def submit(*answers, submitted_at=None):
+        submission = {
+            'exam_id': exam['_id'],
+            'status': 'completed',
+            'answers': [{'answer': answer} for answer in answers],
+            'score': sum(answer == question.get('correct_option') for answer, question in zip(answers, exam['questions'])),
+            'submitted_at': submitted_at or datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
+        }
+        mongo.submissions.insert_one(submission)
+        return submission
+    return submit
+
+
+def counters(mongo, exam):
+    doc = mongo.exam_analytics.find_one({'_id': exam['_id']})
+    return {field: doc[field] for field in ('n', 'score_sum', 'score_sq_sum', 'questions')}
+
+
+def test_submission_without_analytics_schedules_a_rebuild(mongo, exam, submit, scheduled):
+    exam_analytics.record_submission(exam, submit(1, 2, 'essay'))
+    assert scheduled == [exam['_id']]
+    assert mongo.exam_analytics.count_documents({}) == 0
+
+
+def test_recorded_submissions_match_a_rebuild(mongo, exam, submit, scheduled):
+    submit(1, 0, 'essay')
+    exam_analytics.rebuild_analytics(exam)
+    for answers in [(1, 2, ''), (0, 2, 'essay'), (3, None, None)]:
+        exam_analytics.record_submission(exam, submit(*answers))
+    recorded = counters(mongo, exam)
+    exam_analytics.rebuild_analytics(exam)
+    assert counters(mongo, exam) == recorded
+    assert recorded['n'] == 4
+    assert scheduled == []
+
+    analytics = exam_analytics.get_analytics(exam)
+    assert analytics['rebuilding'] is False
+    assert [question['attempted'] for question in analytics['questions']] == [4, 3, 2]
+    assert analytics['questions'][0]['option_distribution'] == [1, 2, 0, 1]
+
+
+def test_rebuild_replaces_analytics_for_other_questions(mongo, exam, submit, scheduled, mcq):
+    submit(1, 2)
+    exam_analytics.rebuild_analytics(exam)
+    changed = {**exam, 'questions': [mcq(0)] + exam['questions'][1:]}
+    exam_analytics.record_submission(changed, submit(0, 2))
+    assert scheduled == [exam['_id']]
+    assert counters(mongo, exam)['n'] == 1
+
+    assert exam_analytics.get_analytics(changed)['rebuilding'] is True
+    exam_analytics.rebuild_analytics(changed)
+    analytics = exam_analytics.get_analytics(changed)
+    assert analytics['submissions'] == 2
+    assert analytics['questions'][0]['correct'] == 1
+
+
+def test_submission_recorded_during_a_rebuild_is_counted_once(mongo, exam, submit, scheduled, monkeypatch):
+    exam_analytics.rebuild_analytics(exam)
+    submit(1, 2)
+    sum_submissions = exam_analytics._sum_submissions
+    graded = []
+
+    def sum_and_grade(exam_id, key, submitted_at):
+        # A submission is graded and recorded while the rebuild scans
+        totals = sum_submissions(exam_id, key, submitted_at)
+        if not graded:
+            graded.append(submit(1, 0, submitted_at=datetime.datetime.utcnow()))
+            exam_analytics.record_submission(exam, graded[0])
+        return totals
+
+    monkeypatch.setattr(exam_analytics, '_sum_submissions', sum_and_grade)
+    assert exam_analytics.rebuild_analytics(exam) == {'submissions': 2}
+    assert counters(mongo, exam)['n'] == 2
+    assert counters(mongo, exam)['questions']['0']['correct'] == 2
+    assert scheduled == []
+
+
+def test_rebuild_that_keeps_losing_reschedules(mongo, exam, submit, scheduled, monkeypatch):
+    exam_analytics.rebuild_analytics(exam)
+    sum_submissions = exam_analytics._sum_submissions
+
+    def sum_and_record(exam_id, key, submitted_at):
+        totals = sum_submissions(exam_id, key, submitted_at)
+        exam_analytics.record_submission(exam, submit(1, 2, submitted_at=datetime.datetime.utcnow()))
+        return totals
+
+    monkeypatch.setattr(exam_analytics, '_sum_submissions', sum_and_record)
+    assert exam_analytics.rebuild_analytics(exam) == {'submissions': None}
+    assert scheduled == [exam['_id']]
+    # Every submission is still counted once, by its own $inc
+    assert counters(mongo, exam)['n'] == mongo.submissions.count_documents({})
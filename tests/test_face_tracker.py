@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from services.face_tracker import FaceTracker
+
+FACE = 255
+# Something only the narrower window search mistakes for a face
+LOOKALIKE = 128
+
+
+class FakeCascade:
+    # Finds the bounding box of FACE pixels; the window search (the only one
+    # passing minSize) also accepts LOOKALIKE pixels
+    def detectMultiScale(self, image, scale_factor, min_neighbors, minSize=None, maxSize=None):
+        values = (FACE, LOOKALIKE) if minSize else (FACE,)
+        ys, xs = np.nonzero(np.isin(image, values))
+        if not len(xs):
+            return ()
+        return [(int(xs.min()), int(ys.min()), int(xs.max() - xs.min() + 1), int(ys.max() - ys.min() + 1))]
+
+
+def frame(value=None):
+    gray = np.zeros((480, 640), dtype=np.uint8)
+    if value:
+        gray[200:300, 300:400] = value
+    return gray
+
+
+def replay(tracker, frames):
+    # The no-face events the proctoring loop logs: (frame started, frame ended)
+    events = []
+    for index, gray in enumerate(frames):
+        faces = tracker.detect(gray)
+        if len(faces) == 0:
+            if not events or events[-1][1] is not None:
+                events.append([index, None])
+        elif tracker.confirmed and events and events[-1][1] is None:
+            events[-1][1] = index
+    return [tuple(event) for event in events]
+
+
+def tracker(mode):
+    return FaceTracker(FakeCascade(), mode=mode, scale=1.0, interval=4, margin=0.5)
+
+
+@pytest.mark.parametrize('mode', ['full', 'fast'])
+def test_face_found_and_lost(mode):
+    frames = [frame(FACE)] * 6 + [frame()] * 3 + [frame(FACE)] * 2
+    assert replay(tracker(mode), frames) == [(6, 9)]
+
+
+def test_fast_mode_searches_the_full_frame_every_interval():
+    fast = tracker('fast')
+    replay(fast, [frame(FACE)] * 10)
+    assert (fast.full_detections, fast.roi_detections) == (2, 8)
+
+
+def test_window_hits_are_provisional():
+    fast = tracker('fast')
+    fast.detect(frame(FACE))
+    assert fast.confirmed
+    fast.detect(frame(FACE))
+    assert not fast.confirmed
+
+
+def test_window_hit_delays_a_no_face_event_but_never_ends_one():
+    # The face leaves and a lookalike stays where it was until the face returns
+    frames = [frame(FACE)] * 2 + [frame(LOOKALIKE)] * 6 + [frame(FACE)]
+    assert replay(tracker('full'), frames) == [(2, 8)]
+    # Window hits on frames 2-4 until the full search at the interval
+    assert replay(tracker('fast'), frames) == [(5, 8)]
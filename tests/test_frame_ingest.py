@@ -0,0 +1,64 @@
+from concurrent.futures import Future
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from services import frame_analysis, frame_ingest
+
+
+class HeldPool:
+    # Keeps every submitted batch in flight until the test resolves it
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = HeldPool()
+    monkeypatch.setattr(frame_ingest, '_get_pool', lambda: pool)
+    return pool
+
+
+@pytest.fixture
+def segment(tmp_path):
+    def segment(name):
+        path = tmp_path / name
+        path.write_bytes(b'video')
+        return str(path)
+    return segment
+
+
+def test_dropped_segments_count_as_a_full_batch(pool, segment):
+    session = frame_ingest.IngestSession('s1', 'e1')
+    paths = [segment(f'{index}.segment') for index in range(frame_ingest.Config.FRAME_SESSION_QUEUE + 3)]
+    for path in paths:
+        stats = frame_ingest.submit_batch(session, 'segment', path, 0)
+    batch_max = frame_ingest.Config.FRAME_BATCH_MAX
+    assert stats == {'received': 2 * batch_max, 'analyzed': 0, 'dropped': 2 * batch_max, 'failed': 0,
+                     'queued': frame_ingest.Config.FRAME_SESSION_QUEUE}
+    # The one in flight and the ones still queued are kept
+    kept = [True] + [False] * 2 + [True] * frame_ingest.Config.FRAME_SESSION_QUEUE
+    assert [os.path.exists(path) for path in paths] == kept
+
+
+def test_failed_segment_counts_as_a_full_batch(pool, segment):
+    session = frame_ingest.IngestSession('s1', 'e1')
+    frame_ingest.submit_batch(session, 'segment', segment('a.segment'), 0)
+    pool.futures[0].set_exception(RuntimeError('decode failed'))
+    assert session.stats()['failed'] == frame_ingest.Config.FRAME_BATCH_MAX
+    assert session.stats()['received'] == frame_ingest.Config.FRAME_BATCH_MAX
+    assert not session.busy
+
+
+def test_frames_without_a_face_cascade_fail(monkeypatch):
+    monkeypatch.setattr(frame_analysis, 'get_model', lambda name: None)
+    ok, jpeg = cv2.imencode('.jpg', np.zeros((48, 64, 3), dtype=np.uint8))
+    with pytest.raises(RuntimeError):
+        frame_analysis.analyze_batch('frames', [jpeg.tobytes()], None)
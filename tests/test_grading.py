@@ -0,0 +1,92 @@
+import random
+
+import numpy as np
+import pytest
+
+from services.grading import NO_ANSWER, answer_matrix, correct_matrix, get_answer_key, grade_submission, score_batch
+
+
+@pytest.fixture
+def exam(make_exam, mcq):
+    return make_exam([
+        mcq(1),
+        mcq(3),
+        {'question': 'Essay', 'type': 'subjective'},
+        mcq(2, options=('a', 'b')),
+        mcq(None, options=('a', 'b')),
+    ])
+
+
+def naive_score(exam, answers):
+    # The per-question loop the vectorized grader replaced
+    score = 0
+    for question, slot in zip(exam['questions'], answers or []):
+        if question['type'] != 'mcq' or not isinstance(question.get('correct_option'), int):
+            continue
+        if not isinstance(slot, dict) or not isinstance(slot.get('answer'), (int, str)):
+            continue
+        try:
+            answer = int(slot['answer'])
+        except ValueError:
+            continue
+        if answer == question['correct_option']:
+            score += 1
+    return score
+
+
+def test_answer_matrix_parses_ints_and_numeric_strings(exam):
+    key = get_answer_key(exam)
+    matrix = answer_matrix(key, [[{'answer': 1}, {'answer': '3'}, {'answer': 'essay'}, None, {}]])
+    assert matrix.tolist() == [[1, 3, NO_ANSWER, NO_ANSWER, NO_ANSWER]]
+
+
+def test_answer_matrix_pads_short_and_truncates_long_answer_lists(exam):
+    key = get_answer_key(exam)
+    matrix = answer_matrix(key, [None, [{'answer': 1}], [{'answer': 1}] * 8])
+    assert matrix.shape == (3, 5)
+    assert (matrix[0] == NO_ANSWER).all()
+    assert matrix[1].tolist() == [1] + [NO_ANSWER] * 4
+
+
+def test_correct_matrix_ignores_subjective_and_keyless_questions(exam):
+    key = get_answer_key(exam)
+    matrix = answer_matrix(key, [[{'answer': 1}, {'answer': 3}, {'answer': '1'}, {'answer': 2}, {'answer': 1}]])
+    assert correct_matrix(key, matrix).tolist() == [[True, True, False, True, False]]
+
+
+@pytest.mark.parametrize('answer', ['99999999999999999999', -2 ** 63, 2 ** 64, str(-2 ** 70)])
+def test_answers_beyond_int64_are_unanswered(make_exam, mcq, answer):
+    exam = make_exam([mcq(1), mcq(2)], exam_id='exam-3')
+    key = get_answer_key(exam)
+    assert answer_matrix(key, [[{'answer': answer}]]).tolist() == [[NO_ANSWER, NO_ANSWER]]
+    assert grade_submission(exam, [{'answer': answer}, {'answer': 2}]) == 1
+
+
+def test_grade_submission_matches_per_question_loop(exam):
+    rng = random.Random(0)
+    choices = [0, 1, 2, 3, 4, '1', '3', 'x', '', None, 1.0, [1]]
+    for _ in range(200):
+        answers = [{'answer': rng.choice(choices)} if rng.random() > 0.1 else None
+                   for _ in range(rng.randint(0, 7))]
+        assert grade_submission(exam, answers) == naive_score(exam, answers)
+
+
+def test_score_batch_grades_each_row(exam):
+    answers_list = [
+        [{'answer': 1}, {'answer': 3}, None, {'answer': 2}],
+        [{'answer': 2}],
+        [],
+    ]
+    scores = score_batch(get_answer_key(exam), answers_list)
+    assert scores.tolist() == [naive_score(exam, answers) for answers in answers_list]
+    assert score_batch(get_answer_key(exam), []).shape == (0,)
+
+
+def test_answer_key_is_recompiled_when_questions_change(exam):
+    exam = dict(exam, _id='exam-2')
+    key = get_answer_key(exam)
+    assert get_answer_key(exam) is key
+    edited = dict(exam, questions=[dict(q) for q in exam['questions']])
+    edited['questions'][0]['correct_option'] = 2
+    assert get_answer_key(edited) is not key
+    assert np.array_equal(get_answer_key(edited).correct[:2], [2, 3])
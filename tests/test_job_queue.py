@@ -0,0 +1,160 @@
+import datetime
+import threading
+import time
+
+import pytest
+from bson import ObjectId
+from flask import Flask, current_app
+
+from services import job_queue
+from services.job_queue import StageError, _run_stage
+
+app = Flask(__name__)
+
+
+def test_stage_result_and_timings_are_merged():
+    def handler(job):
+        assert current_app.name == app.name
+        return {'file_id': job['payload'], 'timings': {'upload_wait': 0.5}}
+
+    result, timings, completed = _run_stage(app, 'upload', handler, {'payload': 'f1'})
+    assert result == {'file_id': 'f1'}
+    assert timings['upload_wait'] == 0.5
+    assert timings['upload'] >= 0
+    assert completed == ['upload']
+
+
+def test_stage_returning_nothing_has_empty_result():
+    result, timings, completed = _run_stage(app, 'notify', lambda job: None, {})
+    assert result == {}
+    assert set(timings) == {'notify'}
+    assert completed == ['notify']
+
+
+def test_failed_stage_raises_with_elapsed_time():
+    def handler(job):
+        time.sleep(0.01)
+        raise RuntimeError('boom')
+
+    with pytest.raises(StageError) as error:
+        _run_stage(app, 'record', handler, {})
+    assert str(error.value) == 'record: boom'
+    assert error.value.elapsed >= 0.01
+
+
+def test_substages_run_concurrently_and_are_timed_individually():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def upload(job):
+        barrier.wait()
+        time.sleep(0.05)
+        return {'file_id': 'f1'}
+
+    def detect(job):
+        # Both substages have to be running at once to pass the barrier
+        barrier.wait()
+        # Far longer than upload, so thread start-up jitter cannot reorder them
+        time.sleep(0.3)
+        return {'malpractice_detected': False, 'timings': {'detect_wait': 0.0, 'detect_run': 0.3}}
+
+    result, timings, completed = _run_stage(app, 'process', [('upload', upload), ('detect', detect)], {})
+    assert result == {'file_id': 'f1', 'malpractice_detected': False}
+    assert set(timings) == {'upload', 'detect', 'detect_wait', 'detect_run', 'process'}
+    assert timings['upload'] < timings['detect'] <= timings['process']
+    assert timings['process'] < timings['upload'] + timings['detect']
+    assert completed == ['upload', 'detect', 'process']
+
+
+def test_failed_substage_keeps_the_others_results():
+    def upload(job):
+        return {'file_id': 'f1', 'timings': {'upload_wait': 0.0}}
+
+    def detect(job):
+        raise ValueError('no frames')
+
+    with pytest.raises(StageError) as error:
+        _run_stage(app, 'process', [('upload', upload), ('detect', detect)], {})
+    assert str(error.value) == 'process: detect: no frames'
+    assert error.value.result == {'file_id': 'f1'}
+    assert set(error.value.timings) == {'upload', 'upload_wait', 'detect', 'process'}
+    assert error.value.elapsed == error.value.timings['process']
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    # An isolated job registry; kinds registered by imported services are left out
+    registry = {}
+    monkeypatch.setattr(job_queue, '_stages', registry)
+    return registry
+
+
+def age(mongo, job_id, seconds):
+    updated_at = datetime.datetime.utcnow() - datetime.timedelta(seconds=seconds)
+    mongo.proctoring_jobs.update_one({'_id': ObjectId(job_id)}, {'$set': {'updated_at': updated_at}})
+
+
+def test_running_job_is_not_claimed_twice(mongo, stages):
+    job_queue.register_job('test', [('only', lambda job: None)])
+    job_queue.enqueue_job('test', {})
+    assert job_queue._claim_job('w1')['attempts'] == 1
+    assert job_queue._claim_job('w2') is None
+
+
+def test_job_without_heartbeat_is_reclaimed(mongo, stages):
+    job_queue.register_job('test', [('only', lambda job: None)])
+    job_id = job_queue.enqueue_job('test', {})
+    job_queue._claim_job('w1')
+    age(mongo, job_id, job_queue.Config.JOB_CLAIM_TIMEOUT - 5)
+    assert job_queue._claim_job('w2') is None
+    age(mongo, job_id, job_queue.Config.JOB_CLAIM_TIMEOUT + 5)
+    job = job_queue._claim_job('w2')
+    assert (job['worker'], job['attempts']) == ('w2', 2)
+
+
+def test_heartbeat_keeps_the_lease(mongo, stages, monkeypatch):
+    monkeypatch.setattr(job_queue.Config, 'JOB_HEARTBEAT_INTERVAL', 0.01)
+    job_queue.register_job('test', [('only', lambda job: None)])
+    job_id = job_queue.enqueue_job('test', {})
+    job = job_queue._claim_job('w1')
+    age(mongo, job_id, job_queue.Config.JOB_CLAIM_TIMEOUT + 5)
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=job_queue._heartbeat, args=(job['_id'], 'w1', stop))
+    heartbeat.start()
+    time.sleep(0.1)
+    stop.set()
+    heartbeat.join()
+    assert job_queue._claim_job('w2') is None
+
+
+def test_reclaimed_job_resumes_after_completed_stages(mongo, stages):
+    calls = []
+    job_queue.register_job('test', [
+        ('record', lambda job: calls.append('record') or {'recorded': True}),
+        ('upload', lambda job: calls.append('upload') or {'uploaded': True}),
+    ])
+    job_id = job_queue.enqueue_job('test', {})
+    mongo.proctoring_jobs.update_one({'_id': ObjectId(job_id)},
+                                     {'$set': {'stages_completed': ['record'], 'result': {'recorded': True}}})
+    job_queue._claim_job('w1')
+    age(mongo, job_id, job_queue.Config.JOB_CLAIM_TIMEOUT + 5)
+    job_queue._run_job(app, job_queue._claim_job('w2'), 'w2')
+    job = job_queue.get_job(job_id)
+    assert calls == ['upload']
+    assert job['status'] == 'completed'
+    assert job['stages_completed'] == ['record', 'upload']
+    assert job['result'] == {'recorded': True, 'uploaded': True}
+
+
+def test_job_is_abandoned_after_max_attempts(mongo, stages, monkeypatch):
+    monkeypatch.setattr(job_queue.Config, 'JOB_MAX_ATTEMPTS', 2)
+    calls = []
+    job_queue.register_job('test', [('only', lambda job: calls.append(job['_id']))])
+    job_id = job_queue.enqueue_job('test', {})
+    for worker in ('w1', 'w2'):
+        job_queue._claim_job(worker)
+        age(mongo, job_id, job_queue.Config.JOB_CLAIM_TIMEOUT + 5)
+    job_queue._run_job(app, job_queue._claim_job('w3'), 'w3')
+    job = job_queue.get_job(job_id)
+    assert calls == []
+    assert (job['status'], job['attempts']) == ('failed', 3)
+    assert job_queue._claim_job('w4') is None
@@ -0,0 +1,115 @@
+import pytest
+
+from services import leaderboard
+
+
+@pytest.fixture
+def evaluate(mongo):
+    # Stores the evaluated submission, then records it, as evaluate_exam does
+    def evaluate(user, total_marks, exam_id='exam-1'):
+        mongo.submissions.update_one(
+            {'exam_id': exam_id, 'user_email': f'{user}@x'},
+            {'$set': {'student_id': user, 'total_marks': total_marks}},
+            upsert=True
+        )
+        leaderboard.record_score(exam_id, f'{user}@x', user, total_marks)
+    return evaluate
+
+
+def board(mongo, exam_id='exam-1'):
+    return mongo.leaderboards.find_one({'_id': exam_id})
+
+
+class Interleaved:
+    # Runs action right after the next read, so it lands between record_score's
+    # read and its compare-and-set write
+    def __init__(self, collection, action):
+        self.collection = collection
+        self.action = action
+
+    def find_one(self, *args, **kwargs):
+        doc = self.collection.find_one(*args, **kwargs)
+        if self.action:
+            action, self.action = self.action, None
+            action()
+        return doc
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+def test_scores_are_counted_and_ranked(mongo, evaluate):
+    for user, marks in [('a', 70), ('b', 90), ('c', 70), ('d', 50.5)]:
+        evaluate(user, marks)
+    doc = board(mongo)
+    assert doc['count'] == 4
+    assert doc['distribution'] == {'9000': 1, '7000': 2, '5050': 1}
+    assert [entry['user_email'] for entry in doc['entries']] == ['b@x', 'a@x', 'c@x', 'd@x']
+    assert leaderboard.standings(doc['distribution']) == {
+        '9000': (1, 87.5), '7000': (2, 50.0), '5050': (4, 12.5)
+    }
+
+
+def test_reevaluation_replaces_the_previous_score(mongo, evaluate):
+    evaluate('a', 70)
+    evaluate('b', 80)
+    evaluate('a', 95)
+    doc = board(mongo)
+    assert doc['count'] == 2
+    assert {key: count for key, count in doc['distribution'].items() if count} == {'9500': 1, '8000': 1}
+    assert [(entry['user_email'], entry['total_marks']) for entry in doc['entries']] == [('a@x', 95), ('b@x', 80)]
+
+
+def test_concurrent_evaluation_is_not_lost(mongo, evaluate, monkeypatch):
+    evaluate('a', 70)
+    monkeypatch.setattr(leaderboard, 'leaderboards_collection',
+                        Interleaved(leaderboard.leaderboards_collection, lambda: evaluate('b', 60)))
+    version = board(mongo)['version']
+    evaluate('c', 80)
+    doc = board(mongo)
+    assert doc['version'] != version
+    assert doc['count'] == 3
+    assert doc['distribution'] == {'8000': 1, '7000': 1, '6000': 1}
+    assert [entry['user_email'] for entry in doc['entries']] == ['c@x', 'a@x', 'b@x']
+
+
+def test_student_dropping_out_of_a_full_top_list_is_replaced(mongo, evaluate, monkeypatch):
+    monkeypatch.setattr(leaderboard.Config, 'LEADERBOARD_TOP_N', 2)
+    evaluate('a', 90)
+    evaluate('b', 80)
+    evaluate('c', 70)
+    assert [entry['user_email'] for entry in board(mongo)['entries']] == ['a@x', 'b@x']
+    evaluate('a', 10)
+    assert [entry['user_email'] for entry in board(mongo)['entries']] == ['b@x', 'c@x']
+
+
+def test_rebuild_matches_incremental_updates(mongo, evaluate):
+    for user, marks in [('a', 70), ('b', 90), ('a', 40), ('c', 90)]:
+        evaluate(user, marks)
+    incremental = board(mongo)
+    leaderboard.rebuild_leaderboard('exam-1')
+    rebuilt = board(mongo)
+    assert rebuilt['entries'] == incremental['entries']
+    assert rebuilt['scores'] == incremental['scores']
+    assert rebuilt['count'] == incremental['count']
+    assert rebuilt['distribution'] == {key: count for key, count in incremental['distribution'].items() if count}
+
+
+def test_legacy_leaderboard_is_rebuilt_before_updating(mongo, evaluate):
+    evaluate('a', 70)
+    mongo.leaderboards.replace_one({'_id': 'exam-1'}, {'entries': [], 'distribution': {}})
+    evaluate('b', 80)
+    doc = board(mongo)
+    assert doc['count'] == 2
+    assert doc['distribution'] == {'8000': 1, '7000': 1}
+
+
+def test_pages_beyond_the_top_list_come_from_submissions(mongo, evaluate, monkeypatch):
+    monkeypatch.setattr(leaderboard.Config, 'LEADERBOARD_TOP_N', 2)
+    for user, marks in [('a', 90), ('b', 80), ('c', 70), ('d', 70)]:
+        evaluate(user, marks)
+    page = leaderboard.get_leaderboard('exam-1', offset=2, limit=2, total_marks=80)
+    assert [(entry['user_email'], entry['rank']) for entry in page['entries']] == [('c@x', 3), ('d@x', 3)]
+    assert page['standing'] == {'total_marks': 80, 'rank': 2, 'percentile': 62.5}
+    top = leaderboard.get_leaderboard('exam-1', offset=0, limit=1)
+    assert [entry['user_email'] for entry in top['entries']] == ['a@x']
@@ -0,0 +1,119 @@
+import datetime
+import smtplib
+from contextlib import contextmanager
+
+import pytest
+from flask import Flask
+from pymongo.errors import PyMongoError
+
+from services import mail_outbox
+
+app = Flask(__name__)
+
+class FakeConnection:
+    def __init__(self, failures):
+        # subject -> exception raised when that message is sent
+        self.failures = failures
+        self.sent = []
+
+    def send(self, msg):
+        if msg.subject in self.failures:
+            raise self.failures[msg.subject]
+        self.sent.append(msg.subject)
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    connection = FakeConnection({})
+
+    @contextmanager
+    def connect():
+        yield connection
+
+    monkeypatch.setattr(mail_outbox.mail, 'connect', connect)
+    return connection
+
+
+@pytest.fixture(autouse=True)
+def dispatcher(monkeypatch):
+    # Records dispatcher starts instead of running one; deliveries are driven by the tests
+    started = []
+    monkeypatch.setattr(mail_outbox, 'start_dispatcher', started.append)
+    with app.app_context():
+        yield started
+
+
+def enqueue(*subjects):
+    for subject in subjects:
+        mail_outbox.enqueue_mail(subject, ['student@example.com'], 'body', sender='exams@example.com')
+
+
+def test_enqueue_starts_a_dispatcher(mongo, dispatcher):
+    enqueue('a')
+    assert dispatcher == [app]
+    assert mongo.mail_outbox.find_one({'subject': 'a'})['status'] == 'pending'
+
+
+def statuses(mongo):
+    return {message['subject']: (message['status'], message['attempts']) for message in mongo.mail_outbox.find()}
+
+
+def test_batch_is_delivered_and_marked_sent(mongo, connection):
+    enqueue('a', 'b', 'c')
+    mail_outbox._deliver(mail_outbox._claim_batch('worker'))
+    assert connection.sent == ['a', 'b', 'c']
+    assert statuses(mongo) == {'a': ('sent', 1), 'b': ('sent', 1), 'c': ('sent', 1)}
+
+
+def test_rejected_message_is_retried_alone(mongo, connection):
+    connection.failures['b'] = smtplib.SMTPRecipientsRefused({'student@example.com': (550, b'no such user')})
+    enqueue('a', 'b', 'c')
+    mail_outbox._deliver(mail_outbox._claim_batch('worker'))
+    assert connection.sent == ['a', 'c']
+    assert statuses(mongo) == {'a': ('sent', 1), 'b': ('pending', 1), 'c': ('sent', 1)}
+    retry_at = mongo.mail_outbox.find_one({'subject': 'b'})['next_attempt_at']
+    assert retry_at > datetime.datetime.utcnow()
+
+
+def test_connection_error_retries_only_unsent_messages(mongo, connection):
+    connection.failures['b'] = smtplib.SMTPServerDisconnected('gone')
+    enqueue('a', 'b', 'c')
+    mail_outbox._deliver(mail_outbox._claim_batch('worker'))
+    assert connection.sent == ['a']
+    assert statuses(mongo) == {'a': ('sent', 1), 'b': ('pending', 1), 'c': ('pending', 1)}
+
+
+def test_sent_message_is_not_retried_when_marking_it_sent_fails(mongo, connection, monkeypatch):
+    mark_sent = mail_outbox._mark_sent
+
+    def flaky_mark_sent(message):
+        if message['subject'] == 'a':
+            raise PyMongoError('primary stepped down')
+        mark_sent(message)
+
+    monkeypatch.setattr(mail_outbox, '_mark_sent', flaky_mark_sent)
+    enqueue('a', 'b')
+    mail_outbox._deliver(mail_outbox._claim_batch('worker'))
+    assert connection.sent == ['a', 'b']
+    assert statuses(mongo) == {'a': ('sending', 0), 'b': ('sent', 1)}
+
+
+def test_message_fails_after_max_attempts(mongo, connection, monkeypatch):
+    monkeypatch.setattr(mail_outbox.Config, 'MAIL_MAX_ATTEMPTS', 2)
+    connection.failures['a'] = smtplib.SMTPDataError(554, b'rejected')
+    enqueue('a')
+    mail_outbox._deliver(mail_outbox._claim_batch('worker'))
+    mongo.mail_outbox.update_one({'subject': 'a'}, {'$set': {'next_attempt_at': datetime.datetime.utcnow()}})
+    mail_outbox._deliver(mail_outbox._claim_batch('worker'))
+    assert statuses(mongo) == {'a': ('failed', 2)}
+    assert mail_outbox._claim_batch('worker') == []
+
+
+def test_stale_claim_is_picked_up_again(mongo, connection):
+    enqueue('a')
+    assert len(mail_outbox._claim_batch('dead-worker')) == 1
+    assert mail_outbox._claim_batch('worker') == []
+    claimed_at = datetime.datetime.utcnow() - datetime.timedelta(seconds=mail_outbox.Config.MAIL_CLAIM_TIMEOUT + 1)
+    mongo.mail_outbox.update_one({'subject': 'a'}, {'$set': {'claimed_at': claimed_at}})
+    batch = mail_outbox._claim_batch('worker')
+    assert [message['claimed_by'] for message in batch] == ['worker']
@@ -0,0 +1,34 @@
+from services.grading import grade_submission
+from services.question_bank import MISSING_QUESTION_TYPE, resolve_questions, store_questions
+
+
+def test_identical_questions_are_stored_once(mongo, mcq):
+    first = store_questions([mcq(1), mcq(2)], 'a@x')
+    second = store_questions([mcq(2), mcq(1), mcq(1)], 'b@x')
+    assert second == [first[1], first[0], first[0]]
+    assert mongo.question_bank.count_documents({}) == 2
+
+
+def test_questions_resolve_in_exam_order(mongo, mcq, make_exam):
+    question_ids = store_questions([mcq(1), mcq(2), mcq(3)], 'a@x')
+    exam = make_exam(None, question_ids=question_ids[::-1])
+    resolve_questions([exam])
+    assert [question['correct_option'] for question in exam['questions']] == [3, 2, 1]
+    assert [question['question_id'] for question in exam['questions']] == [str(id) for id in question_ids[::-1]]
+
+
+def test_embedded_questions_are_left_alone(mongo, mcq, make_exam):
+    exam = make_exam([mcq(1)])
+    resolve_questions([exam])
+    assert exam['questions'] == [mcq(1)]
+
+
+def test_missing_question_keeps_its_slot(mongo, mcq, make_exam):
+    question_ids = store_questions([mcq(1), mcq(2), mcq(3)], 'a@x')
+    mongo.question_bank.delete_one({'_id': question_ids[1]})
+    exam = make_exam(None, question_ids=question_ids)
+    resolve_questions([exam])
+    assert [question['type'] for question in exam['questions']] == ['mcq', MISSING_QUESTION_TYPE, 'mcq']
+    assert exam['questions'][1]['question_id'] == str(question_ids[1])
+    # The third answer is still graded against the third question
+    assert grade_submission(exam, [{'answer': 1}, {'answer': 2}, {'answer': 3}]) == 2
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from services.question_import import (
+    MAX_REPORTED_ERRORS, QuestionImportError, import_csv_questions, parse_manual_questions
+)
+
+
+@pytest.mark.parametrize('correct_option', [0, 1, 3, 4])
+def test_correct_option_is_stored_as_sent(mcq, correct_option):
+    questions = parse_manual_questions([json.dumps(mcq(correct_option))])
+    assert questions[0]['correct_option'] == correct_option
+
+
+def test_correct_option_must_be_a_number(mcq):
+    with pytest.raises(QuestionImportError) as error:
+        parse_manual_questions([json.dumps(mcq('b'))])
+    assert error.value.errors == ["Question 1: correct_option 'b' is not a number"]
+
+
+HEADER = b'question,type,option1,option2,option3,option4,correct_option,difficulty\n'
+
+
+class CountingStream:
+    # Yields the upload line by line, counting how much of it was read
+    def __init__(self, lines):
+        self.lines = lines
+        self.read = 0
+
+    def __iter__(self):
+        for line in self.lines:
+            self.read += 1
+            yield line
+
+
+def test_csv_questions_are_imported():
+    stream = CountingStream([HEADER, b'Q1,mcq,a,b,c,d,1,easy\n', b'Essay,subjective,,,,,,hard\n', b',,,,,,,\n'])
+    questions = import_csv_questions(stream)
+    assert [question['type'] for question in questions] == ['mcq', 'subjective']
+    assert questions[0]['options'] == ['a', 'b', 'c', 'd']
+
+
+def test_csv_import_stops_reading_at_the_error_limit():
+    bad_row = b'Q,mcq,a,b,c,d,not-a-number,easy\n'
+    stream = CountingStream([HEADER] + [bad_row] * (MAX_REPORTED_ERRORS * 20))
+    with pytest.raises(QuestionImportError) as error:
+        import_csv_questions(stream)
+    assert len(error.value.errors) == MAX_REPORTED_ERRORS
+    assert error.value.errors[0] == "Row 2: correct_option 'not-a-number' is not a number"
+    assert stream.read <= MAX_REPORTED_ERRORS + 2
+
+
+def test_csv_errors_below_the_limit_are_all_reported():
+    rows = [b'Q,mcq,a,b,c,d,1,easy\n', b',mcq,a,b,c,d,1,easy\n', b'Q,mcq,a,b,c,d,,easy\n', b'Q,,,,,,,easy\n']
+    with pytest.raises(QuestionImportError) as error:
+        import_csv_questions(CountingStream([HEADER] + rows))
+    assert [message.split(':')[0] for message in error.value.errors] == ['Row 3', 'Row 4', 'Row 5']
+
+
+def test_csv_missing_columns_are_reported_once():
+    with pytest.raises(QuestionImportError) as error:
+        import_csv_questions(CountingStream([b'question,options\n', b'Q,a\n']))
+    assert error.value.errors == ['Missing columns: type, difficulty']
+
+
+def test_csv_mcq_rows_need_every_option_column():
+    stream = CountingStream([b'question,type,option1,option2,correct_option,difficulty\n', b'Q,mcq,a,b,1,easy\n'])
+    with pytest.raises(QuestionImportError) as error:
+        import_csv_questions(stream)
+    assert error.value.errors == ['Row 2: mcq question needs option1, option2, option3, option4']
+
+
+def test_csv_that_is_not_utf8_is_rejected():
+    with pytest.raises(QuestionImportError) as error:
+        import_csv_questions(CountingStream([HEADER, b'Q\xff\xfe,mcq,a,b,c,d,1,easy\n']))
+    assert error.value.errors[0].startswith('Row ')
@@ -0,0 +1,80 @@
+import pytest
+
+from services.grading import grade_submission
+from services.question_order import (
+    _map_option, option_index_base, present_questions, student_permutation, to_canonical_answers,
+    to_canonical_slot, to_presented_answers
+)
+
+
+@pytest.fixture(params=[0, 1], ids=['base0', 'base1'])
+def exam(request, make_exam, mcq):
+    base = request.param
+    questions = [mcq(base + i % 4, options=[f'{i}{c}' for c in 'abcd']) for i in range(6)]
+    return make_exam(questions + [{'question': 'Essay', 'type': 'subjective'}], randomized=True,
+                     option_index_base=base)
+
+
+def test_permutation_is_deterministic_per_student():
+    counts = (4, 4, 4, 0)
+    assert student_permutation('exam-1', 'a@x', counts) == student_permutation('exam-1', 'a@x', counts)
+    orders = {student_permutation('exam-1', f'{i}@x', counts)[0] for i in range(20)}
+    assert len(orders) > 1
+
+
+def test_permutation_covers_every_question_and_option():
+    question_order, option_orders = student_permutation('exam-1', 'a@x', (4, 2, 0, 3))
+    assert sorted(question_order) == [0, 1, 2, 3]
+    assert [sorted(order) for order in option_orders] == [[0, 1, 2, 3], [0, 1], [], [0, 1, 2]]
+
+
+@pytest.mark.parametrize('base', [0, 1])
+def test_map_option_uses_index_base(base):
+    order = (2, 0, 3, 1)
+    for position in range(4):
+        canonical = _map_option(position + base, order, False, base)
+        assert canonical == order[position] + base
+        assert _map_option(canonical, order, True, base) == position + base
+    assert _map_option(base - 1, order, False, base) is None
+    assert _map_option(base + 4, order, False, base) is None
+
+
+def test_exams_without_a_stored_base_number_options_from_zero(make_exam, mcq):
+    assert option_index_base(make_exam([mcq(0)])) == 0
+    assert option_index_base(make_exam([mcq(1)], option_index_base=1)) == 1
+
+
+def test_presented_and_canonical_answers_round_trip(exam):
+    base = exam['option_index_base']
+    canonical = [{'answer': base + (i * 3) % 4} for i in range(6)] + [{'answer': 'text'}]
+    presented = to_presented_answers(exam, canonical, 'a@x')
+    assert presented != canonical
+    assert to_canonical_answers(exam, presented, 'a@x') == canonical
+
+
+def test_canonical_slot_matches_whole_answer_list(exam):
+    presented = [{'answer': exam['option_index_base'] + i % 4} for i in range(7)]
+    canonical = to_canonical_answers(exam, presented, 'b@x')
+    for position, slot in enumerate(presented):
+        question, mapped = to_canonical_slot(exam, position, slot, 'b@x')
+        assert canonical[question] == mapped
+
+
+def test_correct_presented_answers_grade_full_marks(exam):
+    presented = present_questions(exam, 'c@x')
+    answers = [{'answer': question.get('correct_option')} for question in presented]
+    assert grade_submission(exam, to_canonical_answers(exam, answers, 'c@x')) == 6
+
+
+@pytest.mark.parametrize('offset', [-1, 4])
+def test_out_of_range_answers_are_kept_as_given(exam, offset):
+    presented = [{'answer': exam['option_index_base'] + offset}] * 7
+    assert to_canonical_answers(exam, presented, 'a@x') == presented
+
+
+def test_exam_in_canonical_order_is_untouched(make_exam, mcq):
+    exam = make_exam([mcq(1), mcq(2)], randomized=False)
+    answers = [{'answer': 1}, {'answer': 2}]
+    assert present_questions(exam, 'a@x') is exam['questions']
+    assert to_canonical_answers(exam, answers, 'a@x') is answers
+    assert to_presented_answers(exam, answers, 'a@x') is answers
@@ -0,0 +1,31 @@
+import datetime
+import os
+
+from services import recording
+from services.storage import LocalStorage
+
+
+def test_finished_recording_leaves_only_the_stored_copies(mongo, tmp_path, monkeypatch):
+    monkeypatch.setattr(recording.Config, 'RECORDING_DIR', str(tmp_path / 'recordings'))
+    monkeypatch.setattr(recording, 'get_storage', lambda: LocalStorage(root=str(tmp_path / 'stored')))
+    directory = tmp_path / 'recordings' / 'proctoring_s1_e1'
+    directory.mkdir(parents=True)
+    now = datetime.datetime.utcnow()
+    segments = []
+    for index in range(2):
+        path = directory / f'segment_{index}.avi'
+        path.write_bytes(b'frames' * (index + 1))
+        segments.append({'index': index, 'name': path.name, 'file_path': str(path), 'frames': 10,
+                         'started_at': now, 'ended_at': now, 'status': 'failed'})
+    recording_id = mongo.recordings.insert_one({
+        'student_id': 's1', 'exam_id': 'e1', 'fps': 10, 'segments': segments, 'status': 'recorded'
+    }).inserted_id
+
+    recording.finish_recording(recording_id)
+    assert sorted(os.listdir(tmp_path / 'recordings')) == ['proctoring_s1_e1']
+    assert recording.remove_local_files(recording_id) == 2
+    assert not (tmp_path / 'recordings' / 'proctoring_s1_e1').exists()
+    assert sorted(os.listdir(tmp_path / 'stored')) == [
+        f'proctoring_s1_e1_{recording_id}_manifest.json', 'segment_0.avi', 'segment_1.avi'
+    ]
+    assert (tmp_path / 'stored' / 'segment_1.avi').read_bytes() == b'framesframes'
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from services.storage import LocalStorage
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'segment.avi'
+    path.write_bytes(os.urandom(10 * 1024 + 7))
+    return path
+
+
+def test_interrupted_upload_resumes_to_an_identical_file(tmp_path, source):
+    storage = LocalStorage(root=str(tmp_path / 'stored'), chunk_size=1024)
+
+    def interrupt(offset, total):
+        if offset >= 4 * 1024:
+            raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        storage.upload(str(source), 'segment.avi', on_progress=interrupt)
+    target = tmp_path / 'stored' / 'segment.avi'
+    assert not target.exists()
+    assert (tmp_path / 'stored' / 'segment.avi.part').stat().st_size == 4 * 1024
+
+    offsets = []
+    assert storage.upload(str(source), 'segment.avi', on_progress=lambda offset, total: offsets.append(offset)) == str(target)
+    assert offsets[0] == 5 * 1024
+    assert target.read_bytes() == source.read_bytes()
+    assert not (tmp_path / 'stored' / 'segment.avi.part').exists()
+
+
+def test_partial_file_longer_than_the_source_starts_over(tmp_path, source):
+    storage = LocalStorage(root=str(tmp_path / 'stored'), chunk_size=1024)
+    os.makedirs(tmp_path / 'stored')
+    (tmp_path / 'stored' / 'segment.avi.part').write_bytes(b'x' * (20 * 1024))
+    target = storage.upload(str(source), 'segment.avi')
+    assert open(target, 'rb').read() == source.read_bytes()